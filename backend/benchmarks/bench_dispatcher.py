@@ -0,0 +1,53 @@
+"""
+Micro-benchmark for hero selection.
+
+    python -m benchmarks.bench_dispatcher
+"""
+import random
+import timeit
+
+import numpy as np
+
+from core.dispatcher import select_hero, select_hero_indices, select_heroes
+from core.weather_codes import WMO_WEATHER_CODES
+
+
+def sample_weather(rng: random.Random, count: int) -> list:
+    codes = list(WMO_WEATHER_CODES)
+    return [
+        {
+            'weather_code': rng.choice(codes),
+            'is_day': rng.randint(0, 1),
+            'wind_speed_10m': rng.uniform(0, 60),
+            'temperature_2m': rng.uniform(-10, 40),
+        }
+        for _ in range(count)
+    ]
+
+
+def main():
+    rng = random.Random(42)
+    samples = sample_weather(rng, 10000)
+
+    loops = 20
+    seconds = timeit.timeit(lambda: [select_hero(item) for item in samples], number=loops)
+    print(f"select_hero:            {seconds / (loops * len(samples)) * 1e9:8.1f} ns/call")
+
+    columns = {key: [item[key] for item in samples] for key in samples[0]}
+    for size in (24, 168, 10000):
+        batch = {key: values[:size] for key, values in columns.items()}
+        loops = max(10, 200000 // size)
+        seconds = timeit.timeit(lambda: select_heroes(batch), number=loops)
+        print(f"select_heroes (n={size:>5}): {seconds / (loops * size) * 1e9:8.1f} ns/item")
+
+    arrays = {key: np.asarray(values) for key, values in columns.items()}
+    loops = 200
+    seconds = timeit.timeit(
+        lambda: select_hero_indices(arrays['weather_code'], arrays['is_day'], arrays['wind_speed_10m'], arrays['temperature_2m']),
+        number=loops,
+    )
+    print(f"select_hero_indices (numpy, n={len(samples)}): {seconds / (loops * len(samples)) * 1e9:8.1f} ns/item")
+
+
+if __name__ == "__main__":
+    main()
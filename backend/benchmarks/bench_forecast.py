@@ -0,0 +1,73 @@
+"""
+Memory per cached forecast and response encoding time, dict + json vs Forecast + fastjson.
+
+    python -m benchmarks.bench_forecast
+"""
+import gc
+import json
+import timeit
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.stub_upstreams import forecast_payload
+from core.fastjson import dumps
+from core.forecast_model import Forecast
+from core.timeline import build_forecast_views
+
+
+def footprint(build, count: int) -> float:
+    """Bytes retained per item by `build`, measured over `count` items."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [build(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+
+def legacy_entry(i: int) -> dict:
+    forecast = forecast_payload(i * 0.37, i * 0.53)
+    forecast['views'] = build_forecast_views(forecast)
+    return forecast
+
+
+def compact_entry(i: int) -> Forecast:
+    forecast = Forecast.from_response(forecast_payload(i * 0.37, i * 0.53))
+    forecast.views
+    return forecast
+
+
+def dashboard(views: dict) -> dict:
+    return {
+        'location': {"name": "Gotham", "latitude": 40.7, "longitude": -74.0},
+        'currentWeather': {"temperature": 12.3, "condition": "Clear sky"},
+        'dailyForecast': views['daily'],
+        'hourlyForecast': views['hourly'],
+        'heroTimeline': views['timeline'],
+        'hero': {"name": "Batman", "dialogue": "The night is clear.", "imageUrl": "/images/batman.png"},
+    }
+
+
+def main():
+    count = 500
+    legacy = footprint(legacy_entry, count)
+    compact = footprint(compact_entry, count)
+    print(f"cached forecast, dict + views:     {legacy / 1024:8.1f} KiB")
+    print(f"cached forecast, Forecast + views: {compact / 1024:8.1f} KiB  ({legacy / compact:.1f}x smaller)")
+
+    legacy_body = dashboard(legacy_entry(1)['views'])
+    compact_body = dashboard(compact_entry(1).views)
+    assert json.loads(dumps(compact_body)) == json.loads(json.dumps(legacy_body))
+
+    loops = 500
+    seconds = timeit.timeit(lambda: json.dumps(jsonable_encoder(legacy_body)).encode(), number=loops)
+    print(f"encode, jsonable_encoder + json:   {seconds / loops * 1e6:8.1f} us/response")
+    seconds = timeit.timeit(lambda: dumps(compact_body), number=loops)
+    print(f"encode, fastjson + RawJSON:        {seconds / loops * 1e6:8.1f} us/response")
+
+
+if __name__ == "__main__":
+    main()
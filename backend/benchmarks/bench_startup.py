@@ -0,0 +1,132 @@
+"""
+Cold start: import time and time to first request, single process vs gunicorn workers.
+
+    python -m benchmarks.bench_startup --runs 5 --workers 1,4
+
+Each configuration is started `runs` times in a fresh scratch directory against the stub
+upstreams. Reports the app module's import time, the time from spawning the server to its
+first successful response, the first dashboard request (cold caches) and repeats of it,
+which with several workers are served from the cache another worker filled.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_test import BACKEND_DIR, app_command, app_environment, start_stub, wait_for
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def import_seconds(env: dict, scratch: str) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=scratch, capture_output=True, text=True, check=True,
+                            env=dict(env, PYTHONPATH=BACKEND_DIR, PREFETCH_ENABLED="0")).stdout
+    return float(output.split()[-1])
+
+
+def slowest_imports(env: dict, scratch: str, count: int = 8) -> list:
+    """(module, cumulative seconds) for the slowest top-level imports of main."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=scratch, capture_output=True,
+                            text=True, env=dict(env, PYTHONPATH=BACKEND_DIR, PREFETCH_ENABLED="0")).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line[13:]:
+            continue
+        _, cumulative, name = line[13:].split("|")
+        # Only direct imports of the app modules (two spaces of nesting) and main itself
+        if name.startswith("   ") and not name.startswith("    ") or name.strip() == "main":
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(modules, key=lambda item: -item[1])[:count]
+
+
+def first_response(url: str, process: subprocess.Popen, timeout: float = 60.0) -> float:
+    """Poll `url` every 10ms; seconds until it first answers."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def run_once(args, workers: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="dc-weather-startup-") as scratch:
+        args.workers = workers
+        env = app_environment(args, scratch)
+        base = f"http://127.0.0.1:{args.port}"
+        spawned = time.perf_counter()
+        app = subprocess.Popen(app_command(args), cwd=scratch, env=env)
+        try:
+            ttfr = first_response(base + "/health", app)
+            with httpx.Client(base_url=base, timeout=30.0) as client:
+                startup = client.get("/api/cache/stats").json().get("startup", {})
+                timings = []
+                for _ in range(args.repeats + 1):
+                    started = time.perf_counter()
+                    client.post("/api/get-weather-dashboard", json={"location": "London"}).raise_for_status()
+                    timings.append(time.perf_counter() - started)
+            return {
+                "ttfr": ttfr,
+                "spawn_to_dashboard": time.perf_counter() - spawned,
+                "imported": startup.get("imported_seconds"),
+                "ready": startup.get("ready_seconds"),
+                "first_dashboard": timings[0],
+                "repeat_dashboard": statistics.median(timings[1:]),
+            }
+        finally:
+            app.terminate()
+            try:
+                app.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                app.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", default="1,2", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--repeats", type=int, default=8, help="dashboard requests after the first")
+    parser.add_argument("--port", type=int, default=8810)
+    parser.add_argument("--stub-port", type=int, default=8910)
+    parser.add_argument("--env", action="append", default=[], help="extra app environment")
+    args = parser.parse_args()
+    args.latency, args.error_rate, args.seed = "", "", 42
+
+    stub = start_stub(args)
+    try:
+        wait_for(f"http://127.0.0.1:{args.stub_port}/docs", stub)
+        with tempfile.TemporaryDirectory() as scratch:
+            env = app_environment(args, scratch)
+            imports = [import_seconds(env, scratch) for _ in range(args.runs)]
+            print(f"import main: median {statistics.median(imports) * 1000:.0f} ms over {args.runs} runs; slowest imports:")
+            for name, seconds in slowest_imports(env, scratch):
+                print(f"  {name:<28} {seconds * 1000:7.1f} ms")
+        print()
+        header = f"{'workers':>7} {'first resp ms':>13} {'imported ms':>11} {'ready ms':>9} {'1st dash ms':>11} {'repeat ms':>9}"
+        print(header)
+        print("-" * len(header))
+        for workers in args.workers:
+            runs = [run_once(args, workers) for _ in range(args.runs)]
+
+            def median(key):
+                values = [run[key] for run in runs if run[key] is not None]
+                return statistics.median(values) * 1000 if values else float("nan")
+            print(f"{workers:>7} {median('ttfr'):>13.0f} {median('imported'):>11.0f} {median('ready'):>9.0f} "
+                  f"{median('first_dashboard'):>11.1f} {median('repeat_dashboard'):>9.1f}")
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Autocomplete latency and memory for the geocoder prefix index, on a synthetic dump sized
+like cities15000 (or a real one passed as the first argument).
+
+    python -m benchmarks.bench_suggest [cities15000.txt]
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+from core.geocoder import GeoIndex, PrefixIndex, build_index
+
+SYLLABLES = ["san", "ta", "ber", "lin", "mo", "ro", "ka", "ville", "burg", "port", "ão", "é", "ne", "wa", "sto",
+             "ham", "ton", "do", "ri", "chi", "go", "pa", "ris", "lon", "mü", "nich"]
+
+
+def synthetic_cities(path: str, count: int = 26000, seed: int = 42):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for geoname_id in range(count):
+            name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            if rng.random() < 0.2:
+                name += " " + rng.choice(SYLLABLES).capitalize()
+            population = int(15000 * rng.paretovariate(1.2))
+            cols = [""] * 19
+            cols[0], cols[1], cols[2] = str(geoname_id), name, name
+            cols[4], cols[5] = f"{rng.uniform(-60, 70):.5f}", f"{rng.uniform(-180, 180):.5f}"
+            cols[8], cols[10], cols[14] = rng.choice(["US", "DE", "FR", "BR", "IN", "JP"]), "01", str(population)
+            f.write("\t".join(cols) + "\n")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as scratch:
+        cities = sys.argv[1] if len(sys.argv) > 1 else os.path.join(scratch, "cities.txt")
+        if len(sys.argv) <= 1:
+            synthetic_cities(cities)
+        path = os.path.join(scratch, "geonames.idx")
+        records = build_index(cities, path)
+        index = GeoIndex(path)
+
+        tracemalloc.start()
+        prefix_index = PrefixIndex(index)
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        seconds = timeit.timeit(lambda: PrefixIndex(index), number=3) / 3
+        print(f"{records} places, {index.n_keys} names")
+        print(f"build:                {seconds * 1e3:8.1f} ms")
+        print(f"memory:               {traced / 1024:8.1f} KiB traced, {prefix_index.nbytes / 1024:.1f} KiB counted")
+
+        rng = random.Random(7)
+        keys = prefix_index.keys
+        for length in (1, 2, 3, 4, 6):
+            prefixes = [key[:length] for key in rng.sample(keys, 1000)]
+            loops = 10
+            seconds = timeit.timeit(lambda: [prefix_index.lookup(prefix, 10) for prefix in prefixes], number=loops)
+            print(f"lookup, {length}-char prefix: {seconds / (loops * len(prefixes)) * 1e6:8.1f} us")
+        prefixes = [key[:length] for key in rng.sample(keys, 1000) for length in (2, 4)]
+        seconds = timeit.timeit(lambda: [index.prefix_range(prefix) for prefix in prefixes], number=1)
+        print(f"mmap prefix_range:    {seconds / len(prefixes) * 1e6:8.1f} us (range only, unranked)")
+
+        del prefix_index, keys
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Offline load test: starts the stub upstreams and the app, then drives the dashboard,
+chat and geocode endpoints at each concurrency level.
+
+    python -m benchmarks.load_test --concurrency 1,10,50 --requests 300
+    python -m benchmarks.load_test --latency chat=1.0 --error-rate forecast=0.05 --compare benchmarks/results/<file>.json
+
+Reports throughput, p50/p95/p99 latency, errors and the app's memory (RSS) per level.
+With --workers N the app runs under gunicorn (gunicorn.conf.py) with N workers sharing
+their caches; memory then covers the master, the workers and the cache server.
+Results are written to benchmarks/results/<timestamp>-<commit>.json so runs on different
+commits can be compared with --compare. The app runs in a scratch directory, so every
+run starts with empty caches.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+CITIES = (
+    "London", "Paris", "New York", "Tokyo", "Sydney", "Berlin", "Madrid", "Rome", "Toronto", "Chicago",
+    "Mumbai", "Cairo", "Lagos", "Lima", "Seoul", "Oslo", "Dublin", "Vienna", "Prague", "Lisbon",
+    "Boston", "Denver", "Miami", "Seattle", "Austin", "Phoenix", "Atlanta", "Dallas", "Houston", "Detroit",
+    "Nairobi", "Bogota", "Santiago", "Jakarta", "Manila", "Hanoi", "Bangkok", "Dubai", "Doha", "Athens",
+    "Warsaw", "Budapest", "Helsinki", "Stockholm", "Copenhagen", "Brussels", "Amsterdam", "Zurich", "Geneva", "Milan",
+)
+HEROES = ("batman", "superman", "wonderwoman", "aquaman", "flash")
+QUESTIONS = ("What's the weather like?", "Should I bring an umbrella?", "Is it a good day to fly?", "How windy is it?")
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> list:
+    """A few very popular cities and a long tail, like real traffic."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def dashboard_request(rng: random.Random, weights: list) -> tuple:
+    city = rng.choices(CITIES, weights)[0]
+    return "POST", "/api/get-weather-dashboard", {"json": {"location": city}}
+
+
+def chat_request(rng: random.Random, weights: list) -> tuple:
+    city = rng.choices(CITIES, weights)[0]
+    body = {
+        "message": rng.choice(QUESTIONS),
+        "currentHero": rng.choice(HEROES),
+        "weatherData": {"temperature": rng.randint(-5, 35), "condition": "Clear sky"},
+        "locationData": {"name": city},
+    }
+    return "POST", "/api/chat", {"json": body}
+
+
+def geocode_request(rng: random.Random, weights: list) -> tuple:
+    return "GET", "/geocode", {"params": {"location": rng.choices(CITIES, weights)[0]}}
+
+
+SCENARIOS = {
+    "dashboard": dashboard_request,
+    "chat": chat_request,
+    "geocode": geocode_request,
+}
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def process_tree(pid: int) -> list:
+    """`pid` and all its descendants (Linux /proc only)."""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def process_memory(pid: int) -> dict:
+    """Current and peak resident memory of a process and its children in MiB (Linux /proc only)."""
+    memory = {"rss_mib": None, "peak_rss_mib": None}
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        memory["rss_mib"] = round((memory["rss_mib"] or 0) + int(line.split()[1]) / 1024, 1)
+                    elif line.startswith("VmHWM:"):
+                        memory["peak_rss_mib"] = round((memory["peak_rss_mib"] or 0) + int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+    return memory
+
+
+async def run_level(client: httpx.AsyncClient, scenario: str, concurrency: int, total: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    weights = zipf_weights(len(CITIES))
+    requests = [SCENARIOS[scenario](rng, weights) for _ in range(total)]
+    latencies = []
+    errors = 0
+    position = 0
+
+    async def worker():
+        nonlocal errors, position
+        while position < len(requests):
+            method, path, kwargs = requests[position]
+            position += 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def git_revision() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {"commit": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def start_stub(args) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_upstreams", "--port", str(args.stub_port),
+         "--latency", args.latency, "--error-rate", args.error_rate, "--seed", str(args.seed)],
+        cwd=BACKEND_DIR,
+    )
+
+
+def app_environment(args, scratch: str) -> dict:
+    stub_url = "http://127.0.0.1:{}"
+    env = dict(
+        os.environ,
+        WEATHER_API_BASE=stub_url.format(args.stub_port) + "/v1/forecast",
+        GEOCODING_API_BASE=stub_url.format(args.stub_port + 1) + "/v1/search",
+        REVERSE_GEOCODING_API_BASE=stub_url.format(args.stub_port + 2) + "/data/reverse-geocode-client",
+        OPENAI_BASE_URL=stub_url.format(args.stub_port + 3) + "/v1",
+        OPENAI_API_KEY="stub",
+        GEOCODER_INDEX_PATH=os.path.join(scratch, "geonames.idx"),
+        GEOCODER_LEARNED_PATH=os.path.join(scratch, "learned.jsonl"),
+        TTS_CACHE_INDEX=os.path.join(scratch, "tts_index.json"),
+        # All load comes from one address; measure capacity, not the per-client limit
+        ADMISSION_CLIENT_RATE="100000",
+        ADMISSION_CLIENT_BURST="100000",
+    )
+    env.update(dict(item.split("=", 1) for item in args.env))
+    return env
+
+
+def app_command(args) -> list:
+    if args.workers > 1:
+        return [sys.executable, "-m", "gunicorn", "-c", os.path.join(BACKEND_DIR, "gunicorn.conf.py"),
+                "--pythonpath", BACKEND_DIR, "--bind", f"127.0.0.1:{args.port}", "--workers", str(args.workers),
+                "--log-level", "warning", "main:app"]
+    return [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--host", "127.0.0.1",
+            "--port", str(args.port), "--log-level", "warning", "--no-access-log"]
+
+
+def start_processes(args, scratch: str):
+    stub = start_stub(args)
+    app = subprocess.Popen(app_command(args), cwd=scratch, env=app_environment(args, scratch))
+    return stub, app
+
+
+def print_table(results: list, baseline: dict):
+    header = f"{'scenario':<10} {'conc':>5} {'req':>6} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MiB':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        line = (f"{row['scenario']:<10} {row['concurrency']:>5} {row['requests']:>6} {row['errors']:>5} "
+                f"{row['throughput_rps']:>9.1f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} "
+                f"{row['rss_mib'] or 0:>8.1f}")
+        previous = baseline.get((row["scenario"], row["concurrency"]))
+        if previous:
+            def change(key):
+                return (row[key] - previous[key]) / previous[key] * 100 if previous[key] else 0.0
+            line += f"   vs baseline: rps {change('throughput_rps'):+.1f}%  p95 {change('p95_ms'):+.1f}%  p99 {change('p99_ms'):+.1f}%"
+        print(line)
+
+
+async def drive(args) -> list:
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2, max_keepalive_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=args.timeout) as client:
+        for scenario in args.scenarios:
+            if args.warmup:
+                await run_level(client, scenario, 1, args.warmup, args.seed + 1)
+            for concurrency in args.concurrency:
+                row = await run_level(client, scenario, concurrency, args.requests, args.seed)
+                row.update(process_memory(args.app_pid))
+                results.append(row)
+                print(f"  {scenario} x{concurrency}: {row['throughput_rps']} rps, p95 {row['p95_ms']} ms, {row['errors']} errors", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="dashboard,chat,geocode", type=lambda s: [x for x in s.split(",") if x])
+    parser.add_argument("--concurrency", default="1,10,50", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=0, help="sequential requests per scenario before measuring")
+    parser.add_argument("--latency", default="", help="stub latency, passed to benchmarks.stub_upstreams")
+    parser.add_argument("--error-rate", default="", help="stub error rate, passed to benchmarks.stub_upstreams")
+    parser.add_argument("--env", action="append", default=[], help="extra app environment, e.g. --env TTS_WORKERS=8")
+    parser.add_argument("--workers", type=int, default=1, help="run the app under gunicorn with this many workers")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=RESULTS_DIR, help="directory for the JSON results ('' to skip)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="dc-weather-bench-") as scratch:
+        stub, app = start_processes(args, scratch)
+        try:
+            wait_for(f"http://127.0.0.1:{args.stub_port}/docs", stub)
+            wait_for(f"http://127.0.0.1:{args.port}/health", app)
+            args.app_pid = app.pid
+            idle_memory = process_memory(app.pid)
+            results = asyncio.run(drive(args))
+        finally:
+            for process in (app, stub):
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    report = {
+        **git_revision(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": {key: getattr(args, key) for key in ("scenarios", "concurrency", "requests", "warmup", "latency", "error_rate", "env", "workers", "seed")},
+        "idle_memory": idle_memory,
+        "results": results,
+    }
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(row["scenario"], row["concurrency"]): row for row in json.load(f)["results"]}
+    print()
+    print_table(results, baseline)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(args.output, f"{stamp}-{report['commit']}{'-dirty' if report['dirty'] else ''}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Local stand-ins for the upstream APIs, for offline load tests.
+
+Each service listens on its own port (so the app's per-host connection limits behave as
+in production), starting at --port:
+
+    port+0  Open-Meteo forecast     /v1/forecast
+    port+1  Open-Meteo geocoding    /v1/search
+    port+2  BigDataCloud reverse    /data/reverse-geocode-client
+    port+3  OpenAI chat and TTS     /v1/chat/completions, /v1/audio/speech
+
+Latency and error rate are set per service, e.g.
+
+    python -m benchmarks.stub_upstreams --port 8900 --latency chat=0.8,tts=0.5 --error-rate forecast=0.02
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import zlib
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SERVICES = ("forecast", "geocode", "reverse", "chat", "tts")
+
+DEFAULT_LATENCY = {"forecast": 0.08, "geocode": 0.03, "reverse": 0.03, "chat": 0.6, "tts": 0.4}
+
+# One silent MPEG-1 Layer III frame (~26 ms)
+SILENT_MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+
+CANNED_REPLIES = (
+    "The skies are clear, citizen. Stay alert anyway.",
+    "Looks like rain. Even the sea approves of this forecast.",
+    "Fast winds today. Try to keep up.",
+    "Clouds gather, but truth always breaks through.",
+    "A fine day to fly. Remember your sunscreen.",
+)
+
+
+def parse_service_values(text: str, defaults: dict) -> dict:
+    """Parse "0.1" (every service) or "chat=0.8,tts=0.5" into a per-service dict."""
+    values = dict(defaults)
+    if not text:
+        return values
+    for part in text.split(","):
+        if "=" in part:
+            service, value = part.split("=", 1)
+            if service not in SERVICES:
+                raise ValueError(f"Unknown service '{service}'; expected one of {', '.join(SERVICES)}")
+            values[service] = float(value)
+        else:
+            values = {service: float(part) for service in SERVICES}
+    return values
+
+
+class Faults:
+    def __init__(self, latency: dict, error_rate: dict, jitter: float, seed: int):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+
+    async def delay(self, service: str, fraction: float = 1.0):
+        base = self.latency.get(service, 0.0) * fraction
+        if base > 0:
+            await asyncio.sleep(base * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def failed(self, service: str) -> bool:
+        return self.rng.random() < self.error_rate.get(service, 0.0)
+
+
+def forecast_payload(lat: float, lon: float) -> dict:
+    """A deterministic 7-day forecast; the coordinates seed the weather so heroes vary by place."""
+    rng = random.Random(zlib.crc32(f"{lat:.2f},{lon:.2f}".encode()))
+    start = datetime.datetime(2026, 1, 1, 0, 0) + datetime.timedelta(days=rng.randint(0, 364))
+    codes = (0, 1, 2, 3, 45, 61, 63, 71, 80, 95)
+    base = rng.uniform(-5, 32)
+    hours = 168
+    hourly_codes = [rng.choice(codes) for _ in range(hours)]
+    hourly_temps = [round(base + 6 * ((i % 24) in range(10, 18)) + rng.uniform(-2, 2), 1) for i in range(hours)]
+    hourly_wind = [round(rng.uniform(0, 55), 1) for _ in range(hours)]
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "utc_offset_seconds": 0,
+        "timezone": "GMT",
+        "current": {
+            "time": start.strftime("%Y-%m-%dT%H:%M"),
+            "interval": 900,
+            "temperature_2m": hourly_temps[12],
+            "is_day": rng.randint(0, 1),
+            "weather_code": hourly_codes[12],
+            "wind_speed_10m": hourly_wind[12],
+            "relative_humidity_2m": rng.randint(30, 95),
+            "apparent_temperature": hourly_temps[12] - 1,
+            "pressure_msl": rng.randint(990, 1030),
+            "precipitation": 0.0,
+            "cloud_cover": rng.randint(0, 100),
+        },
+        "hourly": {
+            "time": [(start + datetime.timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(hours)],
+            "temperature_2m": hourly_temps,
+            "weather_code": hourly_codes,
+            "relative_humidity_2m": [rng.randint(30, 95) for _ in range(hours)],
+            "apparent_temperature": [t - 1 for t in hourly_temps],
+            "precipitation_probability": [rng.randint(0, 100) for _ in range(hours)],
+            "windspeed_10m": hourly_wind,
+            "is_day": [1 if 6 <= i % 24 < 18 else 0 for i in range(hours)],
+        },
+        "daily": {
+            "time": [(start + datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)],
+            "weather_code": [rng.choice(codes) for _ in range(7)],
+            "temperature_2m_max": [round(base + rng.uniform(4, 8), 1) for _ in range(7)],
+            "temperature_2m_min": [round(base - rng.uniform(2, 6), 1) for _ in range(7)],
+            "precipitation_sum": [round(rng.uniform(0, 10), 1) for _ in range(7)],
+            "precipitation_probability_max": [rng.randint(0, 100) for _ in range(7)],
+            "windspeed_10m_max": [round(rng.uniform(5, 60), 1) for _ in range(7)],
+            "winddirection_10m_dominant": [rng.randint(0, 359) for _ in range(7)],
+        },
+    }
+
+
+def place_for(name: str) -> dict:
+    rng = random.Random(zlib.crc32(name.casefold().encode()))
+    return {
+        "name": name.title(),
+        "latitude": round(rng.uniform(-60, 70), 4),
+        "longitude": round(rng.uniform(-180, 180), 4),
+        "country": "Stubland",
+        "population": rng.randint(1000, 10000000),
+    }
+
+
+def create_stub_app(faults: Faults) -> FastAPI:
+    app = FastAPI(title="Upstream stand-ins")
+
+    def unavailable() -> Response:
+        return JSONResponse({"error": True, "reason": "injected failure"}, status_code=503)
+
+    @app.get("/v1/forecast")
+    async def forecast(latitude: str, longitude: str):
+        await faults.delay("forecast")
+        if faults.failed("forecast"):
+            return unavailable()
+        points = [forecast_payload(float(lat), float(lon)) for lat, lon in zip(latitude.split(","), longitude.split(","))]
+        return points[0] if len(points) == 1 else points
+
+    @app.get("/v1/search")
+    async def search(name: str, count: int = 1):
+        await faults.delay("geocode")
+        if faults.failed("geocode"):
+            return unavailable()
+        return {"results": [place_for(name)]}
+
+    @app.get("/data/reverse-geocode-client")
+    async def reverse(latitude: float, longitude: float):
+        await faults.delay("reverse")
+        if faults.failed("reverse"):
+            return unavailable()
+        return {"city": f"Stub City {abs(round(latitude)) % 97}", "countryName": "Stubland"}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        reply = faults.rng.choice(CANNED_REPLIES)
+        usage = {"prompt_tokens": sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4,
+                 "completion_tokens": len(reply) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not body.get("stream"):
+            await faults.delay("chat")
+            if faults.failed("chat"):
+                return unavailable()
+            return {
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+        # Streaming: time to first token is a third of the latency, the rest is spread over the words
+        await faults.delay("chat", 1 / 3)
+        if faults.failed("chat"):
+            return unavailable()
+        words = reply.split(" ")
+
+        async def events():
+            for i, word in enumerate(words):
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await faults.delay("chat", 2 / 3 / len(words))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': body.get('model'), 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        body = await request.json()
+        await faults.delay("tts")
+        if faults.failed("tts"):
+            return unavailable()
+        seconds = max(1.0, len(body.get("input", "")) / 15)
+        return Response(SILENT_MP3_FRAME * int(seconds / 0.026), media_type="audio/mpeg")
+
+    return app
+
+
+async def serve(port: int, faults: Faults):
+    app = create_stub_app(faults)
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port + offset, log_level="warning", access_log=False))
+        for offset in range(4)
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="", help="seconds, e.g. 0.05 or chat=0.8,tts=0.5")
+    parser.add_argument("--error-rate", default="", help="fraction of 503s, e.g. 0.01 or forecast=0.05")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency jitter as a fraction of the latency")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    faults = Faults(
+        parse_service_values(args.latency, DEFAULT_LATENCY),
+        parse_service_values(args.error_rate, {service: 0.0 for service in SERVICES}),
+        args.jitter,
+        args.seed,
+    )
+    asyncio.run(serve(args.port, faults))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Admission control for the API.
+
+Every client (an API key from API_KEYS, otherwise the client address, see ClientLimiter)
+gets a token bucket; buckets and pools are per process, so under gunicorn each worker
+enforces them separately. Admitted work then runs in one of two concurrency pools: `cheap` (forecast and
+geocode) or `expensive` (GPT and TTS), each with a bounded wait queue. A request that
+would not get a slot before its deadline is shed at once instead of queueing, so callers
+can fall back (e.g. to a weather-only dashboard) while there is still time to answer.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from .metrics import registry
+from .ratelimit import TokenBucket
+
+ADMISSION_REJECTED = registry.counter("admission_rejected_total", "Requests turned away by admission control.", ["lane", "reason"])
+
+
+class Rejected(Exception):
+    """A request that was not admitted: 429 when rate limited, 503 when the pool is saturated."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Pool:
+    """
+    At most `limit` concurrent holders and `max_queue` waiters. Waiters give up at their
+    deadline, and a request is shed immediately when the expected wait (from a moving
+    average of how long slots are held) already exceeds its deadline.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.shed = 0
+        self.hold_seconds = 0.0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def expected_wait(self) -> float:
+        if not self._semaphore.locked():
+            return 0.0
+        return (self.queued + 1) / max(1, self.limit) * self.hold_seconds
+
+    def _reject(self, reason: str) -> Rejected:
+        ADMISSION_REJECTED.inc(lane=self.name, reason=reason)
+        return Rejected(503, f"Server busy ({self.name} pool {reason.replace('_', ' ')})", max(1.0, self.expected_wait()))
+
+    @asynccontextmanager
+    async def slot(self, timeout: float):
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise self._reject("queue_full")
+            if self.expected_wait() > timeout:
+                self.shed += 1
+                raise self._reject("deadline")
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise self._reject("deadline") from None
+            finally:
+                self.queued -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self.hold_seconds += 0.1 * (time.monotonic() - started - self.hold_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "hold_seconds": self.hold_seconds,
+        }
+
+
+class ClientLimiter:
+    """
+    Token bucket per client, keeping the `max_clients` most recent. Requests with a known
+    X-API-Key get the key's (higher) rate; others are limited per address unless
+    `per_address` is off. The address is the socket peer; only behind `trusted_proxies`
+    reverse proxies is it read from X-Forwarded-For, counting hops from the right so
+    clients cannot spoof it. Behind an untrusted proxy every request shares the proxy's
+    address, so deployments there set the hops, give callers API keys, or turn
+    `per_address` off (the concurrency pools still apply).
+    """
+
+    def __init__(self, rate: float, burst: float, key_rate: float, key_burst: float, api_keys: frozenset = frozenset(),
+                 trusted_proxies: int = 0, max_clients: int = 10000, per_address: bool = True):
+        self.rate = rate
+        self.burst = burst
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.api_keys = api_keys
+        self.trusted_proxies = trusted_proxies
+        self.max_clients = max_clients
+        self.per_address = per_address
+        self.limited = 0
+        self._buckets: OrderedDict = OrderedDict()
+
+    def client_id(self, request) -> str:
+        api_key = request.headers.get("x-api-key")
+        if api_key and api_key in self.api_keys:
+            return "key:" + api_key
+        address = request.client.host if request.client else "unknown"
+        if self.trusted_proxies:
+            hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+            if len(hops) >= self.trusted_proxies:
+                address = hops[-self.trusted_proxies]
+        return "addr:" + address
+
+    def check(self, request, cost: float = 1) -> Optional[float]:
+        """None if the request may proceed, otherwise the seconds until it could."""
+        client = self.client_id(request)
+        if not self.per_address and client.startswith("addr:"):
+            return None
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            keyed = client.startswith("key:")
+            bucket = self._buckets[client] = TokenBucket(self.key_rate if keyed else self.rate,
+                                                         self.key_burst if keyed else self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        if bucket.try_acquire(cost):
+            return None
+        self.limited += 1
+        return bucket.retry_after(cost)
+
+    def stats(self) -> dict:
+        return {"clients": len(self._buckets), "limited": self.limited, "per_address": self.per_address}
+
+
+class Admission:
+    """Rate limit, then a slot in the lane's pool: `async with admission.admit(request, "expensive")`."""
+
+    def __init__(self, limiter: ClientLimiter, pools: dict, wait_seconds: dict):
+        self.limiter = limiter
+        self.pools = pools
+        self.wait_seconds = wait_seconds
+
+    def check_rate(self, request, lane: str, cost: float = 1):
+        retry_after = self.limiter.check(request, cost)
+        if retry_after is not None:
+            ADMISSION_REJECTED.inc(lane=lane, reason="rate_limited")
+            raise Rejected(429, "Too many requests", retry_after)
+
+    def slot(self, lane: str, timeout: Optional[float] = None):
+        """A slot in `lane`'s pool without rate limiting (e.g. for a fallback path)."""
+        return self.pools[lane].slot(self.wait_seconds[lane] if timeout is None else timeout)
+
+    @asynccontextmanager
+    async def admit(self, request, lane: str, cost: float = 1):
+        self.check_rate(request, lane, cost)
+        async with self.slot(lane):
+            yield
+
+    def stats(self) -> dict:
+        return {**{name: pool.stats() for name, pool in self.pools.items()}, "clients": self.limiter.stats()}
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+admission = Admission(
+    ClientLimiter(
+        rate=float(os.getenv("ADMISSION_CLIENT_RATE", "2")),
+        burst=float(os.getenv("ADMISSION_CLIENT_BURST", "20")),
+        key_rate=float(os.getenv("ADMISSION_API_KEY_RATE", "20")),
+        key_burst=float(os.getenv("ADMISSION_API_KEY_BURST", "100")),
+        api_keys=frozenset(key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()),
+        trusted_proxies=int(os.getenv("TRUSTED_PROXY_HOPS", "0")),
+        per_address=os.getenv("ADMISSION_PER_ADDRESS", "1") == "1",
+    ),
+    {
+        "cheap": Pool("cheap", int(os.getenv("ADMISSION_CHEAP_CONCURRENCY", "256")), int(os.getenv("ADMISSION_CHEAP_QUEUE", "512"))),
+        "expensive": Pool("expensive", int(os.getenv("ADMISSION_EXPENSIVE_CONCURRENCY", "32")), int(os.getenv("ADMISSION_EXPENSIVE_QUEUE", "64"))),
+    },
+    {
+        "cheap": float(os.getenv("ADMISSION_CHEAP_WAIT_SECONDS", "5")),
+        "expensive": float(os.getenv("ADMISSION_EXPENSIVE_WAIT_SECONDS", "2")),
+    },
+)
@@ -0,0 +1,32 @@
+import os
+
+from starlette.staticfiles import StaticFiles
+
+from .tts_cache import TTSCache
+
+# Rendered lines are content-addressed, so a URL never changes meaning
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+
+class AudioStaticFiles(StaticFiles):
+    """
+    StaticFiles for generated audio. Adds Cache-Control on top of Starlette's ETag,
+    Last-Modified and Range handling, and tells the TTS cache when one of its files is
+    served so it is kept while clients still fetch it.
+    """
+
+    def __init__(self, *args, tts_cache: TTSCache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tts_cache = tts_cache
+        self.tts_prefix = os.path.relpath(tts_cache.directory, self.directory).replace(os.sep, "/") + "/"
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        path = self.get_path(scope)
+        if path.startswith(self.tts_prefix):
+            self.tts_cache.touch(os.path.splitext(path[len(self.tts_prefix):])[0])
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = DEFAULT_CACHE_CONTROL
+        return response
@@ -0,0 +1,219 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional (see core/fastjson.py)
+    orjson = None
+
+
+def _json_default(obj: Any) -> Any:
+    # Compact models (e.g. Forecast) serialize through their dict form
+    return obj.to_dict() if hasattr(obj, "to_dict") else str(obj)
+
+
+def _dumps(value: Any):
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_json_default)
+
+
+def _loads(raw) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a JSON-compatible value, in bytes."""
+    extra = 0
+
+    def default(obj):
+        nonlocal extra
+        if hasattr(obj, "nbytes"):
+            # Objects that know their own size are counted as such, not as JSON
+            extra += obj.nbytes
+            return None
+        return str(obj)
+
+    return len(json.dumps(value, separators=(",", ":"), default=default)) + extra
+
+
+class MemoryBackend:
+    """In-process LRU cache bounded by an approximate memory budget."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[Any]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        value, size, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        size = estimate_size(value)
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + ttl if ttl is not None else None
+        self._entries[key] = (value, size, expires_at)
+        self.current_bytes += size
+        self._evict()
+
+    async def append(self, key: str, item: Any, ttl: Optional[float] = None) -> int:
+        """
+        Append `item` to the list at `key`, creating it (to expire after `ttl`) if needed;
+        later appends keep the original expiry. Returns the list's new length.
+        """
+        items = await self.get(key)
+        if items is None:
+            await self.set(key, [item], ttl)
+            return 1
+        items.append(item)
+        _, size, expires_at = self._entries[key]
+        new_size = estimate_size(items)
+        self._entries[key] = (items, new_size, expires_at)
+        self.current_bytes += new_size - size
+        self._evict()
+        return len(items)
+
+    async def get_list(self, key: str) -> Optional[list]:
+        """The list built by `append` at `key`, or None."""
+        return await self.get(key)
+
+    async def delete(self, key: str):
+        if key in self._entries:
+            self._remove(key)
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes or (self.max_entries and len(self._entries) > self.max_entries):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+
+class RedisBackend:
+    """
+    Cache backend for any Redis-compatible async client.
+
+    Values are stored as JSON under a key prefix, and `append` lists as Redis lists of
+    JSON items. The client only needs async `get`, `set(key, value, px=...)`, `delete`,
+    `rpush`, `pexpire` and `lrange`, so LocalRedis, the shared cache client (or another
+    Redis-speaking stand-in) can replace a real server.
+    """
+
+    def __init__(self, client, prefix: str = ""):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return _loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        px = max(1, int(ttl * 1000)) if ttl is not None else None
+        await self.client.set(self.prefix + key, _dumps(value), px=px)
+
+    async def append(self, key: str, item: Any, ttl: Optional[float] = None) -> int:
+        """Atomic across workers (RPUSH); the expiry is set by the append that creates the list."""
+        length = await self.client.rpush(self.prefix + key, _dumps(item)) or 0
+        if length == 1 and ttl is not None:
+            await self.client.pexpire(self.prefix + key, max(1, int(ttl * 1000)))
+        return length
+
+    async def get_list(self, key: str) -> Optional[list]:
+        raw = await self.client.lrange(self.prefix + key, 0, -1)
+        return [_loads(item) for item in raw] if raw else None
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+
+class LocalRedis:
+    """Minimal in-process stand-in for the subset of the Redis API the caches use."""
+
+    def __init__(self):
+        self._data = {}
+
+    async def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value, px: Optional[int] = None):
+        expires_at = time.time() + px / 1000 if px is not None else None
+        self._data[key] = (value, expires_at)
+        return True
+
+    async def rpush(self, key: str, *values) -> int:
+        items = await self.get(key)
+        if items is None:
+            items = []
+            self._data[key] = (items, None)
+        items.extend(values)
+        return len(items)
+
+    async def pexpire(self, key: str, px: int) -> bool:
+        items = await self.get(key)
+        if items is None:
+            return False
+        self._data[key] = (items, time.time() + px / 1000)
+        return True
+
+    async def lrange(self, key: str, start: int, stop: int) -> list:
+        items = await self.get(key) or []
+        return items[start:None if stop == -1 else stop + 1]
+
+    async def delete(self, *keys: str):
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+
+def create_backend(prefix: str, max_bytes: int):
+    """
+    Build a cache backend from the CACHE_BACKEND / REDIS_URL environment settings.
+
+    `memory` (default) keeps entries in process, `redis` uses REDIS_URL, `shared` uses
+    the host's shared cache server (SHARED_CACHE_SOCKET, see core/shared_cache.py) and
+    `local-redis` uses the in-process LocalRedis stand-in. Client libraries are imported
+    only for the backend in use, to keep them off the startup path.
+    """
+    kind = os.getenv("CACHE_BACKEND", "memory").lower()
+    if kind == "redis":
+        try:
+            import redis.asyncio as redis
+        except ImportError:  # Redis support is optional
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from None
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return RedisBackend(client, prefix=prefix)
+    if kind == "shared":
+        from .shared_cache import shared_client
+        return RedisBackend(shared_client(), prefix=prefix)
+    if kind == "local-redis":
+        return RedisBackend(LocalRedis(), prefix=prefix)
+    return MemoryBackend(max_bytes=max_bytes)
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = registry.gauge("circuit_breaker_state", "0 closed, 1 half-open, 2 open.", ["breaker"])
+BREAKER_REJECTED = registry.counter("circuit_breaker_rejected_total", "Calls failed fast by an open circuit.", ["breaker"])
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit '{name}' is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker over a rolling window of recent calls.
+
+    The circuit opens when, with at least `min_calls` calls in the last `window` seconds,
+    the share of failures reaches `error_rate` or the share of calls slower than
+    `slow_call_seconds` reaches `slow_rate`. While open, calls fail immediately with
+    CircuitOpenError. After `open_seconds` up to `half_open_probes` calls are let through:
+    a healthy probe closes the circuit, a failed or slow one opens it again.
+    """
+
+    def __init__(self, name: str, window: float = 30.0, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_call_seconds: Optional[float] = None, slow_rate: float = 0.8, open_seconds: float = 15.0,
+                 half_open_probes: int = 1):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._calls: deque = deque()  # (monotonic time, failed, slow)
+        self._failures = 0
+        self._slow = 0
+        self._probes = 0
+        BREAKER_STATE.set(0, breaker=name)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit '{self.name}' {self.state} -> {state}")
+            self.state = state
+            BREAKER_STATE.set(_STATE_VALUES[state], breaker=self.name)
+
+    def _trip(self):
+        self.trips += 1
+        self.opened_at = time.monotonic()
+        self._probes = 0
+        self._calls.clear()
+        self._failures = self._slow = 0
+        self._set_state(OPEN)
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead. Every allowed call must end in `record` or `release`."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                BREAKER_REJECTED.inc(breaker=self.name)
+                return False
+            self._probes = 0
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                BREAKER_REJECTED.inc(breaker=self.name)
+                return False
+            self._probes += 1
+        return True
+
+    def release(self):
+        """An allowed call ended without a verdict (e.g. it was cancelled)."""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record(self, ok: bool, duration: float):
+        slow = self.slow_call_seconds is not None and duration > self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            if self._probes > 0:
+                self._probes -= 1
+                if ok and not slow:
+                    self._set_state(CLOSED)
+                else:
+                    self._trip()
+            return
+        if self.state == OPEN:
+            # A call that started before the circuit opened
+            return
+        now = time.monotonic()
+        self._calls.append((now, not ok, slow))
+        self._failures += not ok
+        self._slow += slow
+        while self._calls and self._calls[0][0] < now - self.window:
+            _, failed, was_slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= was_slow
+        calls = len(self._calls)
+        if calls >= self.min_calls and (self._failures / calls >= self.error_rate or self._slow / calls >= self.slow_rate):
+            self._trip()
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Run `func` through the breaker; any exception it raises counts as a failure."""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        started = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception:
+            self.record(False, time.perf_counter() - started)
+            raise
+        self.record(True, time.perf_counter() - started)
+        return result
+
+    def stats(self) -> dict:
+        calls = len(self._calls)
+        return {
+            "state": self.state,
+            "calls_in_window": calls,
+            "error_rate": self._failures / calls if calls else 0.0,
+            "slow_rate": self._slow / calls if calls else 0.0,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+_breakers: dict = {}
+
+
+def get_breaker(name: str, slow_call_seconds: Optional[float] = None) -> CircuitBreaker:
+    """The shared breaker for an upstream, created from the BREAKER_* settings on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(
+            name,
+            window=float(os.getenv("BREAKER_WINDOW_SECONDS", "30")),
+            min_calls=int(os.getenv("BREAKER_MIN_CALLS", "10")),
+            error_rate=float(os.getenv("BREAKER_ERROR_RATE", "0.5")),
+            slow_call_seconds=slow_call_seconds,
+            slow_rate=float(os.getenv("BREAKER_SLOW_RATE", "0.8")),
+            open_seconds=float(os.getenv("BREAKER_OPEN_SECONDS", "15")),
+        )
+    return breaker
+
+
+def breaker_states() -> dict:
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
@@ -0,0 +1,99 @@
+import logging
+import math
+import os
+import random
+from typing import Awaitable, Callable, Optional
+
+from .cache_backends import create_backend
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace so equivalent questions match."""
+    cleaned = "".join(c if c.isalnum() else " " for c in (text or "").casefold())
+    return " ".join(cleaned.split())
+
+
+class DialogueCache:
+    """
+    Cache of generated hero dialogue.
+
+    Keys combine the hero, location, a temperature bucket, the weather condition and the
+    normalized user query. Each key collects `variants` completions before it starts
+    serving them, so repeated requests still get some variety. Completions are appended
+    to the key's list atomically, so workers filling a key concurrently (shared or redis
+    backend) never drop each other's. Entries expire `ttl` seconds after the first
+    completion; memory is bounded by the backend's LRU limit. Backend errors are logged and
+    treated as a miss (or a dropped write), so a failing cache never keeps callers from the LLM.
+    """
+
+    def __init__(self, backend=None, ttl: float = 3600, variants: int = 3, temperature_bucket: float = 2.0):
+        self.backend = backend if backend is not None else create_backend("dialogue-list:", 16 * 1024 * 1024)
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.temperature_bucket = temperature_bucket
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def key(self, hero: str, location: str, temperature: Optional[float], condition, query: str) -> str:
+        if temperature is None:
+            bucket = "na"
+        else:
+            bucket = str(int(math.floor(float(temperature) / self.temperature_bucket) * self.temperature_bucket))
+        return "|".join((normalize_query(hero), normalize_query(location), bucket, str(condition), normalize_query(query)))
+
+    async def lookup(self, key: str) -> Optional[str]:
+        """A cached variant for `key`, once enough variants have been collected."""
+        variants = await self._variants(key)
+        if variants and len(variants) >= self.variants:
+            self.hits += 1
+            return random.choice(variants)
+        self.misses += 1
+        return None
+
+    async def missing_variants(self, key: str) -> int:
+        """How many more completions `key` needs before it is served from the cache."""
+        return max(0, self.variants - len(await self._variants(key) or ()))
+
+    async def _variants(self, key: str) -> Optional[list]:
+        try:
+            return await self.backend.get_list(key)
+        except Exception as e:
+            logger.error(f"Reading dialogue for {key!r} failed: {e!r}")
+            return None
+
+    async def add(self, key: str, text: str):
+        # Duplicates are kept too, so a model that keeps giving the same answer still fills the key
+        try:
+            await self.backend.append(key, text, ttl=self.ttl)
+        except Exception as e:
+            logger.error(f"Storing dialogue for {key!r} failed: {e!r}")
+            return
+        self.stored += 1
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        """Serve a cached variant, or generate (and remember) a new one. Errors from `generate` propagate."""
+        cached = await self.lookup(key)
+        if cached is not None:
+            return cached
+        text = await generate()
+        await self.add(key, text)
+        return text
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stored": self.stored,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+dialogue_cache = DialogueCache(
+    backend=create_backend("dialogue-list:", int(os.getenv("DIALOGUE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))),
+    ttl=float(os.getenv("DIALOGUE_CACHE_TTL", "3600")),
+    variants=int(os.getenv("DIALOGUE_CACHE_VARIANTS", "3")),
+)
@@ -1,48 +1,184 @@
-from datetime import datetime
+import logging
+import math
+from bisect import bisect_left
+
+import numpy as np
+
 from .hero_profiles import HERO_PROFILES
+from .metrics import registry
+from .weather_codes import WMO_WEATHER_CODES
+
+logger = logging.getLogger(__name__)
+
+HERO_SELECTIONS = registry.counter("hero_selections_total", "Heroes chosen by select_hero.", ["hero"])
+
+# Heroes in the order their triggers are tried
+HERO_KEYS = tuple(sorted(HERO_PROFILES, key=lambda key: HERO_PROFILES[key]['triggers'].get('priority', 99)))
+HERO_INDEX = {key: i for i, key in enumerate(HERO_KEYS)}
+
+# Row for codes we have no description for; only time of day and wind can match there
+WMO_CODES = tuple(sorted(WMO_WEATHER_CODES))
+UNKNOWN_CODE_ROW = len(WMO_CODES)
+MAX_WMO_CODE = 99
+CODE_ROWS = np.full(MAX_WMO_CODE + 1, UNKNOWN_CODE_ROW, dtype=np.intp)
+for _row, _code in enumerate(WMO_CODES):
+    CODE_ROWS[_code] = _row
+_CODE_ROW_LIST = CODE_ROWS.tolist()
+CONDITION_TEXT_CODES = {text.lower(): code for code, text in WMO_WEATHER_CODES.items()}
+
+# Wind buckets are delimited by every `wind_speed_kmh_above` threshold in the triggers
+WIND_THRESHOLDS = tuple(sorted({
+    profile['triggers']['wind_speed_kmh_above']
+    for profile in HERO_PROFILES.values() if 'wind_speed_kmh_above' in profile['triggers']
+}))
+WIND_BUCKETS = len(WIND_THRESHOLDS) + 1
+
+
+def _hero_matches(triggers: dict, condition_text: str, time_of_day: str, wind_bucket: int) -> bool:
+    if 'time_of_day' in triggers and time_of_day not in triggers['time_of_day']:
+        return False
+    if any(condition in condition_text for condition in triggers.get('conditions', ())):
+        return True
+    threshold = triggers.get('wind_speed_kmh_above')
+    return threshold is not None and wind_bucket > WIND_THRESHOLDS.index(threshold)
+
+
+def _default_hero(time_of_day: str) -> str:
+    for key in HERO_KEYS:
+        if HERO_PROFILES[key]['triggers'].get(f'is_default_{time_of_day}'):
+            return key
+    return 'batman'
+
+
+def _compile_cell(condition_text: str, time_of_day: str, wind_bucket: int) -> tuple:
+    """Ordered (hero, min temp, max temp) candidates; the last one always applies."""
+    candidates = []
+    for key in HERO_KEYS:
+        triggers = HERO_PROFILES[key]['triggers']
+        if not _hero_matches(triggers, condition_text, time_of_day, wind_bucket):
+            continue
+        if 'temp_celsius_range' in triggers:
+            low, high = triggers['temp_celsius_range']
+            candidates.append((key, float(low), float(high)))
+        else:
+            candidates.append((key, -math.inf, math.inf))
+            return tuple(candidates)
+    candidates.append((_default_hero(time_of_day), -math.inf, math.inf))
+    return tuple(candidates)
+
+
+def _compile_table() -> list:
+    """One candidate tuple per WMO code row x day/night x wind bucket."""
+    table = []
+    for row in range(UNKNOWN_CODE_ROW + 1):
+        condition_text = WMO_WEATHER_CODES[WMO_CODES[row]].lower() if row < UNKNOWN_CODE_ROW else ''
+        for is_day in (0, 1):
+            for wind_bucket in range(WIND_BUCKETS):
+                table.append(_compile_cell(condition_text, 'day' if is_day else 'night', wind_bucket))
+    return table
+
+
+HERO_TABLE = _compile_table()
+
+# Array form of the table for select_heroes: candidate heroes and temperature bounds,
+# padded with the always-applicable last candidate.
+_MAX_CANDIDATES = max(len(cell) for cell in HERO_TABLE)
+_padded = [cell + (cell[-1],) * (_MAX_CANDIDATES - len(cell)) for cell in HERO_TABLE]
+CANDIDATE_HEROES = np.array([[HERO_INDEX[key] for key, _, _ in cell] for cell in _padded], dtype=np.intp)
+CANDIDATE_LOW = np.array([[low for _, low, _ in cell] for cell in _padded])
+CANDIDATE_HIGH = np.array([[high for _, _, high in cell] for cell in _padded])
+CANDIDATE_UNBOUNDED = np.isinf(CANDIDATE_LOW) & np.isinf(CANDIDATE_HIGH)
+del _padded
+
+
+def _weather_code(weather_data: dict):
+    code = weather_data.get('weather_code')
+    if code is None:
+        code = CONDITION_TEXT_CODES.get((weather_data.get('condition_text') or '').lower())
+    return code
+
+
+def _code_row(weather_data: dict) -> int:
+    code = _weather_code(weather_data)
+    if code is None or not 0 <= code <= MAX_WMO_CODE:
+        return UNKNOWN_CODE_ROW
+    return _CODE_ROW_LIST[int(code)]
+
 
 def select_hero(weather_data: dict) -> dict:
     """
     Selects the most appropriate hero based on weather conditions.
-    
+
     Args:
-        weather_data (dict): A dictionary containing keys like 'temperature', 
-                             'condition_text', 'wind_speed_kmh', 'is_day'.
+        weather_data (dict): A dictionary containing keys like 'weather_code' (or
+                             'condition_text'), 'is_day', 'wind_speed_10m' and
+                             'temperature_2m'.
 
     Returns:
         dict: The profile of the selected hero.
     """
-    time_of_day = 'day' if weather_data.get('is_day', 1) == 1 else 'night'
-    condition_text = weather_data.get('condition_text', '').lower()
-    wind_speed = weather_data.get('wind_speed_10m', 0) or weather_data.get('wind_speed_kmh', 0)
-    
-    print(f"Hero Selection Debug - Backend: time_of_day={time_of_day}, condition={condition_text}, wind_speed={wind_speed}")
-    
-    # Aquaman for water-related weather (highest priority)
-    if any(water_condition in condition_text for water_condition in ['rain', 'drizzle', 'shower', 'storm']):
-        print("Selected Hero: Aquaman (water weather)")
-        return HERO_PROFILES['aquaman']
-    
-    # Flash for windy conditions (second priority)
-    if 'wind' in condition_text or (wind_speed and wind_speed > 25):
-        print("Selected Hero: The Flash (windy conditions)")
-        return HERO_PROFILES['the_flash']
-    
-    # Superman for clear weather during the day
-    if time_of_day == 'day' and 'clear' in condition_text:
-        print("Selected Hero: Superman (daytime & clear weather)")
-        return HERO_PROFILES['superman']
-    
-    # Wonder Woman for cloudy conditions during the day (no rain)
-    if time_of_day == 'day' and any(cloud_condition in condition_text for cloud_condition in ['overcast', 'partly cloud', 'cloud', 'fog']) and not any(rain_condition in condition_text for rain_condition in ['rain', 'drizzle', 'shower', 'storm']):
-        print("Selected Hero: Wonder Woman (cloudy day, no rain)")
-        return HERO_PROFILES['wonder_woman']
-    
-    # Batman for night conditions (default for night)
-    if time_of_day == 'night':
-        print("Selected Hero: Batman (night time)")
-        return HERO_PROFILES['batman']
-    
-    # Default to Batman
-    print("Selected Hero: Batman (default)")
-    return HERO_PROFILES['batman']
\ No newline at end of file
+    is_day = 1 if weather_data.get('is_day', 1) == 1 else 0
+    wind_speed = weather_data.get('wind_speed_10m', 0) or weather_data.get('wind_speed_kmh', 0) or 0
+    temperature = weather_data.get('temperature_2m', weather_data.get('temperature'))
+
+    cell = (_code_row(weather_data) * 2 + is_day) * WIND_BUCKETS + bisect_left(WIND_THRESHOLDS, wind_speed)
+    for key, low, high in HERO_TABLE[cell]:
+        if low == -math.inf and high == math.inf:
+            break
+        if temperature is not None and low <= temperature <= high:
+            break
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Hero selection: cell={cell} is_day={is_day} wind={wind_speed} temp={temperature} -> {key}")
+    HERO_SELECTIONS.inc(hero=key)
+    return HERO_PROFILES[key]
+
+
+def select_hero_indices(weather_code, is_day, wind_speed, temperature) -> np.ndarray:
+    """
+    Vectorized hero selection over parallel arrays (e.g. the hourly forecast).
+
+    Returns indices into HERO_KEYS. Missing values may be given as NaN (or None in lists).
+    """
+    codes = np.asarray(weather_code, dtype=float)
+    codes = np.where(np.isnan(codes), -1, codes).astype(np.intp)
+    rows = np.full(codes.shape, UNKNOWN_CODE_ROW, dtype=np.intp)
+    known = (codes >= 0) & (codes <= MAX_WMO_CODE)
+    rows[known] = CODE_ROWS[codes[known]]
+
+    day = np.asarray(is_day, dtype=float)
+    day = np.where(np.isnan(day), 1, day) == 1
+    wind = np.nan_to_num(np.asarray(wind_speed, dtype=float), nan=0.0)
+    buckets = np.searchsorted(np.asarray(WIND_THRESHOLDS, dtype=float), wind, side='left')
+    cells = (rows * 2 + day) * WIND_BUCKETS + buckets
+
+    temps = np.asarray(temperature, dtype=float)[:, None]
+    applicable = CANDIDATE_UNBOUNDED[cells] | ((CANDIDATE_LOW[cells] <= temps) & (temps <= CANDIDATE_HIGH[cells]))
+    first = applicable.argmax(axis=1)
+    return CANDIDATE_HEROES[cells, first]
+
+
+def select_heroes(batch) -> list:
+    """
+    Selects heroes for many forecasts at once.
+
+    `batch` is either a list of weather dicts (as accepted by select_hero) or a dict of
+    parallel columns: 'weather_code', 'is_day', 'wind_speed_10m' and 'temperature_2m'.
+    """
+    if isinstance(batch, dict):
+        columns = batch
+    else:
+        columns = {
+            'weather_code': [_weather_code(item) for item in batch],
+            'is_day': [item.get('is_day', 1) for item in batch],
+            'wind_speed_10m': [item.get('wind_speed_10m', 0) or item.get('wind_speed_kmh', 0) or 0 for item in batch],
+            'temperature_2m': [item.get('temperature_2m', item.get('temperature')) for item in batch],
+        }
+    size = len(columns['weather_code'])
+    indices = select_hero_indices(
+        columns['weather_code'],
+        columns.get('is_day', [1] * size),
+        columns.get('wind_speed_10m', [0] * size),
+        columns.get('temperature_2m', [None] * size),
+    )
+    return [HERO_PROFILES[HERO_KEYS[i]] for i in indices]
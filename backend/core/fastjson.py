@@ -0,0 +1,70 @@
+"""
+JSON encoding for hot responses.
+
+Uses orjson when installed (falling back to the standard library), and lets callers embed
+already-encoded JSON with RawJSON, so cached fragments such as a forecast's hourly rows
+are spliced into responses without being decoded and re-encoded.
+"""
+import json
+import secrets
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library is slower but equivalent
+    orjson = None
+
+
+class RawJSON:
+    """Pre-encoded JSON to embed as-is."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    @classmethod
+    def encode(cls, value: Any) -> "RawJSON":
+        """Encode `value` for long-lived storage (e.g. a cache entry)."""
+        # orjson's output keeps its growth headroom; an exact-size copy halves what a cached fragment holds
+        return cls(bytes(bytearray(dumps(value))))
+
+
+# NUL plus a per-process nonce, so no real string can be mistaken for a placeholder
+_NONCE = secrets.token_hex(8)
+_PLACEHOLDER = "\x00" + _NONCE + ":{}"
+_ENCODED_PLACEHOLDER = b'"\\u0000' + _NONCE.encode() + b':%d"'
+
+
+def dumps(value: Any) -> bytes:
+    """Encode `value` (which may contain RawJSON fragments) to compact JSON bytes."""
+    fragments = []
+
+    def default(obj):
+        if isinstance(obj, RawJSON):
+            fragments.append(obj.data)
+            return _PLACEHOLDER.format(len(fragments) - 1)
+        if hasattr(obj, "tolist"):  # NumPy scalars and arrays
+            return obj.tolist()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    if orjson is not None:
+        encoded = orjson.dumps(value, default=default)
+    else:
+        encoded = json.dumps(value, default=default, separators=(",", ":")).encode()
+    # Both encoders escape the NUL as \u0000
+    for index, data in enumerate(fragments):
+        encoded = encoded.replace(_ENCODED_PLACEHOLDER % index, data, 1)
+    return encoded
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
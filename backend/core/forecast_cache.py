@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, List, Optional
+
+from .cache_backends import MemoryBackend, create_backend
+
+logger = logging.getLogger(__name__)
+
+# Open-Meteo refreshes the `current` block every 15 minutes.
+DEFAULT_UPDATE_INTERVAL = 900
+
+
+class ForecastCache:
+    """
+    Forecast cache keyed on coordinates snapped to a grid.
+
+    Entries stay fresh until the forecast's next update (`current.time` + `current.interval`),
+    are then served stale for `stale_window` seconds while a background refresh runs, and
+    concurrent misses for the same grid cell share a single upstream fetch. If a refresh
+    fails, the last known forecast is served for up to `fallback_window` more seconds.
+    `decode` restores forecasts read back from backends that store them as JSON.
+
+    With a shared backend, fresh entries are also kept in a small per-worker LRU
+    (`local_entries` cells, each for at most `local_ttl` seconds) so repeated hits skip the
+    socket round trip and the decode. Only fresh entries are served from it; anything
+    stale goes back to the shared tier, where another worker may already have refreshed it.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[float, float], Awaitable[Optional[dict]]],
+        backend=None,
+        grid: float = 0.05,
+        stale_window: float = 600,
+        min_ttl: float = 60,
+        max_ttl: float = 3600,
+        fetch_many: Optional[Callable[[List[tuple]], Awaitable[List[Optional[dict]]]]] = None,
+        batch_size: int = 50,
+        fallback_window: float = 6 * 3600,
+        decode: Optional[Callable[[Any], Any]] = None,
+        local_ttl: float = 0,
+        local_entries: int = 512,
+    ):
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self.batch_size = batch_size
+        self.backend = backend if backend is not None else create_backend("forecast:", 64 * 1024 * 1024)
+        self.grid = grid
+        self.stale_window = stale_window
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.fallback_window = fallback_window
+        self.decode = decode
+        self.local_ttl = local_ttl
+        self.local_entries = local_entries
+        self.hits = 0
+        self.local_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self._inflight: dict = {}
+        self._local: OrderedDict = OrderedDict()  # key -> (expires_at, entry)
+
+    def snap(self, lat: float, lon: float) -> tuple:
+        """Snap coordinates to the centre of their grid cell."""
+        return (
+            round(round(lat / self.grid) * self.grid, 4),
+            round(round(lon / self.grid) * self.grid, 4),
+        )
+
+    def key(self, lat: float, lon: float) -> str:
+        lat, lon = self.snap(lat, lon)
+        return f"{lat:.4f},{lon:.4f}"
+
+    def fresh_until(self, forecast: dict, now: float) -> float:
+        """Expiry time for a forecast, derived from its `current.time` and update interval."""
+        current = forecast.get("current") or {}
+        interval = current.get("interval") or DEFAULT_UPDATE_INTERVAL
+        try:
+            local_time = datetime.fromisoformat(current["time"])
+            offset = timedelta(seconds=forecast.get("utc_offset_seconds", 0))
+            issued_at = (local_time - offset).replace(tzinfo=timezone.utc).timestamp()
+            expires_at = issued_at + interval
+        except (KeyError, TypeError, ValueError):
+            expires_at = now + interval
+        return min(max(expires_at, now + self.min_ttl), now + self.max_ttl)
+
+    async def _entry(self, key: str) -> Optional[dict]:
+        local = self._local.get(key)
+        if local is not None:
+            expires_at, entry = local
+            if time.time() < min(expires_at, entry["fresh_until"]):
+                self._local.move_to_end(key)
+                self.local_hits += 1
+                return entry
+            del self._local[key]
+        entry = await self.backend.get(key)
+        if entry is not None:
+            if self.decode is not None:
+                entry["forecast"] = self.decode(entry["forecast"])
+            self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: dict):
+        if self.local_ttl <= 0:
+            return
+        self._local[key] = (time.time() + self.local_ttl, entry)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_entries:
+            self._local.popitem(last=False)
+
+    async def get(self, lat: float, lon: float) -> Optional[dict]:
+        key = self.key(lat, lon)
+        entry = await self._entry(key)
+        now = time.time()
+        if entry is not None:
+            if now < entry["fresh_until"]:
+                self.hits += 1
+                return entry["forecast"]
+            if now < entry["stale_until"]:
+                self.stale += 1
+                self._refresh(key)
+                return entry["forecast"]
+        self.misses += 1
+        forecast = await asyncio.shield(self._refresh(key))
+        return self._fallback(entry) if forecast is None else forecast
+
+    async def warm(self, lat: float, lon: float, ahead: float = 0.0, limiter=None) -> Optional[dict]:
+        """
+        Refresh a cell unless its forecast stays fresh for another `ahead` seconds; for
+        prefetching. `limiter.acquire()` is awaited before going upstream.
+        """
+        key = self.key(lat, lon)
+        entry = await self._entry(key)
+        if entry is not None and time.time() + ahead < entry["fresh_until"]:
+            return entry["forecast"]
+        if limiter is not None:
+            await limiter.acquire()
+        forecast = await asyncio.shield(self._refresh(key))
+        if forecast is None and entry is not None:
+            return entry["forecast"]
+        return forecast
+
+    def _fallback(self, entry: Optional[dict]) -> Optional[dict]:
+        """The last known forecast, when the upstream cannot provide a new one."""
+        if entry is None:
+            return None
+        self.fallbacks += 1
+        return entry["forecast"]
+
+    async def get_many(self, points: List[tuple]) -> List[Optional[dict]]:
+        """
+        Forecasts for many (lat, lon) points. Misses are grouped into multi-location
+        upstream requests of up to `batch_size` cells (when `fetch_many` is set).
+        """
+        keys = [self.key(lat, lon) for lat, lon in points]
+        found = {}
+        expired = {}
+        missing = []
+        now = time.time()
+        for key in dict.fromkeys(keys):
+            entry = await self._entry(key)
+            if entry is not None and now < entry["fresh_until"]:
+                self.hits += 1
+                found[key] = entry["forecast"]
+            elif entry is not None and now < entry["stale_until"]:
+                self.stale += 1
+                self._refresh(key)
+                found[key] = entry["forecast"]
+            else:
+                self.misses += 1
+                expired[key] = entry
+                if key in self._inflight or self.fetch_many is None:
+                    found[key] = self._refresh(key)
+                else:
+                    missing.append(key)
+
+        for start in range(0, len(missing), self.batch_size):
+            chunk = missing[start:start + self.batch_size]
+            batch_task = asyncio.ensure_future(self._fetch_many_and_store(chunk))
+            for key in chunk:
+                found[key] = self._track(key, self._pick(batch_task, key))
+
+        pending = {key: value for key, value in found.items() if isinstance(value, asyncio.Future)}
+        if pending:
+            results = await asyncio.gather(*(asyncio.shield(task) for task in pending.values()))
+            found.update(zip(pending, results))
+        for key, entry in expired.items():
+            if found[key] is None:
+                found[key] = self._fallback(entry)
+        return [found[key] for key in keys]
+
+    @staticmethod
+    async def _pick(batch_task: asyncio.Task, key: str) -> Optional[dict]:
+        return (await batch_task).get(key)
+
+    async def _fetch_many_and_store(self, keys: List[str]) -> dict:
+        points = [tuple(float(part) for part in key.split(",")) for key in keys]
+        self.refreshes += 1
+        try:
+            forecasts = await self.fetch_many(points)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Batch forecast refresh for {len(keys)} cells failed: {e!r}")
+            return {}
+        results = {}
+        for key, forecast in zip(keys, forecasts or []):
+            if forecast is None:
+                self.errors += 1
+                continue
+            results[key] = forecast
+            await self._store(key, forecast)
+        return results
+
+    def _track(self, key: str, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _refresh(self, key: str) -> asyncio.Task:
+        """Start (or join) the upstream fetch for a grid cell."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        return self._track(key, self._fetch_and_store(key))
+
+    async def _fetch_and_store(self, key: str) -> Optional[dict]:
+        lat, lon = (float(part) for part in key.split(","))
+        self.refreshes += 1
+        try:
+            forecast = await self.fetch(lat, lon)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Forecast refresh for {key} failed: {e!r}")
+            return None
+        if forecast is None:
+            self.errors += 1
+            return None
+        await self._store(key, forecast)
+        return forecast
+
+    async def _store(self, key: str, forecast: dict):
+        now = time.time()
+        fresh_until = self.fresh_until(forecast, now)
+        entry = {"forecast": forecast, "fresh_until": fresh_until, "stale_until": fresh_until + self.stale_window}
+        try:
+            # Kept past stale_until as the fallback for failed refreshes
+            await self.backend.set(key, entry, ttl=entry["stale_until"] + self.fallback_window - now)
+        except Exception as e:
+            logger.error(f"Storing forecast for {key} failed: {e!r}")
+        self._remember(key, entry)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "hits": self.hits,
+            "local_hits": self.local_hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+            "hit_ratio": (self.hits + self.stale) / lookups if lookups else 0.0,
+        }
+
+
+def forecast_cache_from_env(fetch, fetch_many=None, decode=None) -> ForecastCache:
+    backend = create_backend("forecast:", int(os.getenv("FORECAST_CACHE_MAX_BYTES", str(64 * 1024 * 1024))))
+    return ForecastCache(
+        fetch,
+        fetch_many=fetch_many,
+        decode=decode,
+        backend=backend,
+        # An in-process backend already holds decoded forecasts; a shared one gets a per-worker L1
+        local_ttl=0 if isinstance(backend, MemoryBackend) else float(os.getenv("FORECAST_LOCAL_SECONDS", "10")),
+        grid=float(os.getenv("FORECAST_GRID_DEGREES", "0.05")),
+        stale_window=float(os.getenv("FORECAST_STALE_SECONDS", "600")),
+        fallback_window=float(os.getenv("FORECAST_FALLBACK_SECONDS", str(6 * 3600))),
+    )
@@ -0,0 +1,144 @@
+"""
+Compact in-memory forecast.
+
+Open-Meteo responses arrive as nested dicts of lists (168 hourly rows x 7 variables plus
+daily data). A Forecast keeps each variable as one typed NumPy column and the timestamps
+as datetime64, and encodes the derived views (hourly and daily rows, hero timeline) to
+JSON bytes once, so cached forecasts hold a few compact buffers instead of thousands of
+Python objects and responses embed the bytes directly.
+"""
+from typing import Any, Optional
+
+import numpy as np
+
+from .fastjson import RawJSON
+from .timeline import build_forecast_views
+
+_META_KEYS = ("latitude", "longitude", "timezone", "utc_offset_seconds", "elevation")
+
+
+def _to_column(values: list) -> np.ndarray:
+    """Integers (the codes, humidity, is_day) stay integers; anything with gaps becomes float with NaN."""
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        array = np.asarray(values, dtype=np.int64)
+        if array.size and -32768 <= array.min() and array.max() <= 32767:
+            return array.astype(np.int16)
+        return array
+    return np.asarray([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _from_column(array: np.ndarray) -> list:
+    if array.dtype.kind == "f":
+        values = array.tolist()
+        return [None if value != value else value for value in values]
+    return array.tolist()
+
+
+def _block(data: Optional[dict], unit: str) -> tuple:
+    data = data or {}
+    times = data.get("time") or []
+    try:
+        time_column = np.asarray(times, dtype=f"datetime64[{unit}]")
+    except ValueError:
+        # Unexpected time format; keep the strings
+        time_column = np.asarray(times, dtype=object)
+    columns = {
+        name: _to_column(values)
+        for name, values in data.items()
+        if name != "time" and isinstance(values, list) and len(values) == len(times)
+    }
+    return time_column, columns
+
+
+class Forecast:
+    """
+    One location's forecast. Behaves like the response dict for the fields the app reads
+    (`get`, `[]`), and round-trips through `to_dict` for backends that serialize to JSON,
+    encoded views included, so a forecast read back from a shared cache is not re-formatted.
+    """
+
+    __slots__ = ("meta", "current", "hourly_time", "hourly", "daily_time", "daily", "_views")
+
+    def __init__(self, meta: dict, current: dict, hourly_time: np.ndarray, hourly: dict,
+                 daily_time: np.ndarray, daily: dict):
+        self.meta = meta
+        self.current = current
+        self.hourly_time = hourly_time
+        self.hourly = hourly
+        self.daily_time = daily_time
+        self.daily = daily
+        self._views = None
+
+    @classmethod
+    def from_response(cls, data: dict) -> "Forecast":
+        hourly_time, hourly = _block(data.get("hourly"), "m")
+        daily_time, daily = _block(data.get("daily"), "D")
+        meta = {key: data[key] for key in _META_KEYS if key in data}
+        return cls(meta, dict(data.get("current") or {}), hourly_time, hourly, daily_time, daily)
+
+    @classmethod
+    def coerce(cls, value: Any) -> Any:
+        """A Forecast from a Forecast or a (deserialized) `to_dict`/response dict; None stays None."""
+        if value is None or isinstance(value, cls):
+            return value
+        forecast = cls.from_response(value)
+        views = value.get("views")
+        if views:
+            # Encoded by the worker that fetched it; reused as-is rather than re-derived
+            forecast._views = {name: RawJSON(view.encode("utf-8")) for name, view in views.items()}
+        return forecast
+
+    @staticmethod
+    def _times(column: np.ndarray, unit: str) -> list:
+        if column.dtype.kind == "M":
+            return np.datetime_as_string(column, unit=unit).tolist()
+        return column.tolist()
+
+    def hourly_block(self) -> dict:
+        block = {"time": self._times(self.hourly_time, "m")}
+        block.update((name, _from_column(column)) for name, column in self.hourly.items())
+        return block
+
+    def daily_block(self) -> dict:
+        block = {"time": self._times(self.daily_time, "D")}
+        block.update((name, _from_column(column)) for name, column in self.daily.items())
+        return block
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "current":
+            return self.current
+        if key == "hourly":
+            return self.hourly_block()
+        if key == "daily":
+            return self.daily_block()
+        return self.meta.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def to_dict(self) -> dict:
+        """The response dict, plus the encoded views (as JSON text) once they are computed."""
+        data = {**self.meta, "current": self.current, "hourly": self.hourly_block(), "daily": self.daily_block()}
+        if self._views is not None:
+            data["views"] = {name: view.data.decode("utf-8") for name, view in self._views.items()}
+        return data
+
+    @property
+    def views(self) -> dict:
+        """Hourly rows, daily rows and the hero timeline as pre-encoded JSON (computed once)."""
+        if self._views is None:
+            self._views = {name: RawJSON.encode(view) for name, view in build_forecast_views(self).items()}
+        return self._views
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate footprint of the columns and encoded views."""
+        size = self.hourly_time.nbytes + self.daily_time.nbytes
+        size += sum(column.nbytes for column in self.hourly.values())
+        size += sum(column.nbytes for column in self.daily.values())
+        if self._views is not None:
+            size += sum(len(view) for view in self._views.values())
+        return size + 1024  # metadata and the current block
@@ -0,0 +1,591 @@
+"""
+Offline geocoding backed by a memory-mapped index built from a GeoNames cities dump.
+
+Build the index once (e.g. from https://download.geonames.org/export/dump/cities15000.zip):
+
+    python -m core.geocoder build cities15000.txt data/geonames.idx --countries countryInfo.txt
+
+The index holds fixed-width record arrays, a sorted normalized-name table for exact and
+prefix lookups, a trigram table for fuzzy matches and a grid of cells for nearest-city
+reverse lookups. Everything is read straight from the mmap, so the resident memory stays
+small and multiple workers share the same pages. Autocomplete builds a compact in-memory
+prefix index (PrefixIndex) from the same file, in a thread (`load_prefix_index`).
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict, defaultdict
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DCGEO001"
+HEADER = struct.Struct("<8s8I")
+EARTH_RADIUS_KM = 6371.0
+
+# GeoNames dump columns we use
+COL_NAME, COL_ASCIINAME, COL_LAT, COL_LON, COL_COUNTRY, COL_ADMIN1, COL_POPULATION = 1, 2, 4, 5, 8, 10, 14
+
+
+def normalize_name(text: str) -> str:
+    """Case-fold, strip accents and punctuation, and collapse whitespace."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    cleaned = "".join(c if c.isalnum() else " " for c in stripped)
+    return " ".join(cleaned.split())
+
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_code(trigram: str) -> int:
+    # Keys are mostly ASCII; fold anything else into a stable 8-bit bucket
+    return (min(ord(trigram[0]), 255) << 16) | (min(ord(trigram[1]), 255) << 8) | min(ord(trigram[2]), 255)
+
+
+def _cell_code(lat: float, lon: float, cell_deg: float) -> int:
+    columns = int(math.ceil(360 / cell_deg))
+    row = min(int((lat + 90) / cell_deg), int(180 / cell_deg))
+    col = int((lon + 180) / cell_deg) % columns
+    return row * columns + col
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _layout(n_records, n_keys, n_trigrams, n_postings, n_cells):
+    """Byte offsets of each section. All numeric sections are 4-byte aligned."""
+    sizes = [
+        ("lat", n_records), ("lon", n_records), ("population", n_records), ("strings_off", n_records + 1),
+        ("key_off", n_keys + 1), ("key_record", n_keys),
+        ("tri_code", n_trigrams), ("tri_off", n_trigrams + 1), ("postings", n_postings),
+        ("cell_code", n_cells), ("cell_start", n_cells + 1),
+    ]
+    offsets, position = {}, HEADER.size
+    for name, count in sizes:
+        offsets[name] = (position, count)
+        position += 4 * count
+    return offsets, position
+
+
+def build_index(cities_path: str, out_path: str, countries_path: Optional[str] = None, cell_deg: float = 1.0) -> int:
+    """Convert a GeoNames cities dump into an on-disk index. Returns the number of records."""
+    country_names = {}
+    if countries_path:
+        with open(countries_path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) > 4:
+                    country_names[cols[0]] = cols[4]
+
+    rows = []
+    with open(cities_path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15:
+                continue
+            lat, lon = float(cols[COL_LAT]), float(cols[COL_LON])
+            rows.append((
+                _cell_code(lat, lon, cell_deg), lat, lon, int(cols[COL_POPULATION] or 0),
+                cols[COL_NAME], cols[COL_ASCIINAME], cols[COL_ADMIN1], cols[COL_COUNTRY],
+            ))
+    # Records are ordered by grid cell so each cell is one contiguous range
+    rows.sort(key=lambda row: (row[0], -row[3]))
+
+    lat_arr, lon_arr, pop_arr = array("f"), array("f"), array("I")
+    strings, strings_off = bytearray(), array("I", [0])
+    cell_code, cell_start = array("I"), array("I")
+    keys = []
+    for record_id, (cell, lat, lon, population, name, asciiname, admin1, country_code) in enumerate(rows):
+        lat_arr.append(lat)
+        lon_arr.append(lon)
+        pop_arr.append(min(population, 0xFFFFFFFF))
+        country = country_names.get(country_code, country_code)
+        strings += "\t".join((name, admin1, country_code, country)).encode("utf-8")
+        strings_off.append(len(strings))
+        if not cell_code or cell_code[-1] != cell:
+            cell_code.append(cell)
+            cell_start.append(record_id)
+        for key in {normalize_name(name), normalize_name(asciiname)} - {""}:
+            keys.append((key, record_id))
+    cell_start.append(len(rows))
+
+    keys.sort()
+    key_blob, key_off, key_record = bytearray(), array("I", [0]), array("I")
+    postings_by_trigram = defaultdict(set)
+    for key, record_id in keys:
+        key_blob += key.encode("utf-8")
+        key_off.append(len(key_blob))
+        key_record.append(record_id)
+        for trigram in trigrams(key):
+            postings_by_trigram[_trigram_code(trigram)].add(record_id)
+
+    tri_code, tri_off, postings = array("I"), array("I", [0]), array("I")
+    for code in sorted(postings_by_trigram):
+        tri_code.append(code)
+        postings.extend(sorted(postings_by_trigram[code]))
+        tri_off.append(len(postings))
+
+    header = HEADER.pack(
+        MAGIC, len(rows), len(key_record), len(tri_code), len(postings), len(cell_code),
+        len(strings), len(key_blob), int(cell_deg * 1000),
+    )
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for section in (lat_arr, lon_arr, pop_arr, strings_off, key_off, key_record,
+                        tri_code, tri_off, postings, cell_code, cell_start):
+            if sys.byteorder != "little":
+                section.byteswap()
+            f.write(section.tobytes())
+        f.write(strings)
+        f.write(key_blob)
+    os.replace(tmp_path, out_path)
+    return len(rows)
+
+
+class GeoIndex:
+    """Read-only view over an index file produced by build_index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        (magic, self.n_records, n_keys, n_trigrams, n_postings, n_cells,
+         strings_len, keys_len, cell_milli) = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a geocoder index")
+        self.n_keys = n_keys
+        self.cell_deg = cell_milli / 1000
+        offsets, end = _layout(self.n_records, n_keys, n_trigrams, n_postings, n_cells)
+        for name, (start, count) in offsets.items():
+            fmt = "f" if name in ("lat", "lon") else "I"
+            setattr(self, name, view[start:start + 4 * count].cast(fmt))
+        self.strings = view[end:end + strings_len]
+        self.keys = view[end + strings_len:end + strings_len + keys_len]
+
+    def close(self):
+        for name in ("lat", "lon", "population", "strings_off", "key_off", "key_record", "tri_code",
+                     "tri_off", "postings", "cell_code", "cell_start", "strings", "keys"):
+            getattr(self, name).release()
+        self._mmap.close()
+        self._file.close()
+
+    def record(self, record_id: int) -> dict:
+        raw = bytes(self.strings[self.strings_off[record_id]:self.strings_off[record_id + 1]])
+        name, admin1, country_code, country = raw.decode("utf-8").split("\t")
+        return {
+            "name": name,
+            "latitude": round(self.lat[record_id], 5),
+            "longitude": round(self.lon[record_id], 5),
+            "country": country,
+            "country_code": country_code,
+            "admin1": admin1 or None,
+            "population": self.population[record_id],
+        }
+
+    def key(self, i: int) -> str:
+        return bytes(self.keys[self.key_off[i]:self.key_off[i + 1]]).decode("utf-8")
+
+    def lower_bound(self, key: str) -> int:
+        """Index of the first normalized key >= `key`."""
+        lo, hi = 0, self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix_range(self, prefix: str) -> range:
+        """Key positions whose normalized name starts with `prefix`."""
+        start = self.lower_bound(prefix)
+        end = self.lower_bound(prefix + "\U0010ffff")
+        return range(start, end)
+
+    def exact(self, name: str) -> List[int]:
+        key = normalize_name(name)
+        ids, i = [], self.lower_bound(key)
+        while i < self.n_keys and self.key(i) == key:
+            ids.append(self.key_record[i])
+            i += 1
+        return ids
+
+    def fuzzy(self, name: str, min_similarity: float = 0.6) -> List[int]:
+        """Records whose name shares enough trigrams with `name`, best first."""
+        key = normalize_name(name)
+        query = trigrams(key)
+        counts = defaultdict(int)
+        for trigram in query:
+            code = _trigram_code(trigram)
+            lo, hi = 0, len(self.tri_code)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.tri_code[mid] < code:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo < len(self.tri_code) and self.tri_code[lo] == code:
+                for record_id in self.postings[self.tri_off[lo]:self.tri_off[lo + 1]]:
+                    counts[record_id] += 1
+        scored = []
+        for record_id, shared in counts.items():
+            if shared / len(query) < min_similarity:
+                continue
+            candidate = trigrams(normalize_name(self.record(record_id)["name"]))
+            similarity = len(query & candidate) / len(query | candidate)
+            if similarity >= min_similarity:
+                scored.append((-similarity, -self.population[record_id], record_id))
+        return [record_id for _, _, record_id in sorted(scored)]
+
+    def search(self, name: str, fuzzy: bool = True) -> Optional[dict]:
+        """Best match for a place name: exact normalized match by population, then fuzzy."""
+        ids = self.exact(name)
+        if ids:
+            return self.record(max(ids, key=lambda record_id: self.population[record_id]))
+        if fuzzy:
+            ids = self.fuzzy(name)
+            if ids:
+                return self.record(ids[0])
+        return None
+
+    def _cell_records(self, code: int) -> range:
+        lo, hi = 0, len(self.cell_code)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.cell_code[mid] < code:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.cell_code) and self.cell_code[lo] == code:
+            return range(self.cell_start[lo], self.cell_start[lo + 1])
+        return range(0)
+
+    def nearest(self, lat: float, lon: float, max_km: float = 50.0) -> Optional[dict]:
+        """Nearest city within `max_km`, searched over the surrounding grid cells."""
+        rows = int(180 / self.cell_deg) + 1
+        columns = int(math.ceil(360 / self.cell_deg))
+        row = min(int((lat + 90) / self.cell_deg), rows - 1)
+        col = int((lon + 180) / self.cell_deg) % columns
+        # Cells shrink towards the poles, so widen the column span with latitude
+        row_span = 1 + int(max_km / (111.0 * self.cell_deg))
+        span = row_span + int(row_span / max(math.cos(math.radians(min(abs(lat), 89.0))), 1e-3))
+        best, best_km = None, max_km
+        for r in range(max(row - row_span, 0), min(row + row_span, rows - 1) + 1):
+            for c in range(col - span, col + span + 1):
+                for record_id in self._cell_records(r * columns + c % columns):
+                    km = haversine_km(lat, lon, self.lat[record_id], self.lon[record_id])
+                    if km <= best_km:
+                        best, best_km = record_id, km
+        return self.record(best) if best is not None else None
+
+
+class PrefixIndex:
+    """
+    In-memory autocomplete over a GeoIndex's normalized names.
+
+    The keys are held as one sorted list of interned strings (names shared by many places,
+    like "springfield", are stored once) beside parallel arrays of record ids and
+    populations. A prefix matching more than `max_scan` keys has its top `max_limit`
+    records precomputed; any other prefix covers at most `max_scan` keys, found by
+    bisection and ranked on the spot, so every lookup does a bounded amount of work.
+    """
+
+    def __init__(self, index: GeoIndex, max_limit: int = 20, max_scan: int = 64):
+        self.index = index
+        self.max_limit = max_limit
+        self.max_scan = max_scan
+        self.keys: List[str] = [sys.intern(index.key(i)) for i in range(index.n_keys)]
+        self.records = array("I", index.key_record)
+        self.population = array("I", (index.population[record_id] for record_id in self.records))
+        counts = defaultdict(int)
+        for key in self.keys:
+            for length in range(1, len(key) + 1):
+                counts[key[:length]] += 1
+        self.heads = {
+            prefix: self._rank(self._range(prefix), max_limit)
+            for prefix, count in counts.items() if count > max_scan
+        }
+
+    def _range(self, prefix: str) -> range:
+        start = bisect.bisect_left(self.keys, prefix)
+        return range(start, bisect.bisect_left(self.keys, prefix + "\U0010ffff", start))
+
+    def _rank(self, positions: range, limit: int) -> array:
+        """Distinct record ids for key `positions`, most populous first."""
+        seen, ranked = set(), array("I")
+        for i in sorted(positions, key=lambda i: -self.population[i]):
+            record_id = self.records[i]
+            if record_id not in seen:
+                seen.add(record_id)
+                ranked.append(record_id)
+                if len(ranked) == limit:
+                    break
+        return ranked
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[int]:
+        """Up to `limit` record ids whose normalized name starts with `prefix`."""
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        limit = min(limit, self.max_limit)
+        head = self.heads.get(key)
+        if head is not None:
+            return list(head[:limit])
+        return list(self._rank(self._range(key), limit))
+
+    @property
+    def nbytes(self) -> int:
+        return (sum(sys.getsizeof(key) for key in set(self.keys)) + sys.getsizeof(self.keys)
+                + self.records.itemsize * len(self.records) + self.population.itemsize * len(self.population)
+                + sum(ranked.itemsize * len(ranked) for ranked in self.heads.values()))
+
+
+class LocalGeocoder:
+    """
+    Local-first geocoding. Looks in the learned write-back cache, then the GeoNames
+    index; callers fall back to the upstream services on a miss and feed the result
+    back through `learn_forward` / `learn_reverse`.
+
+    The learned cache is an append-only file that workers on the same host share: before
+    reporting a miss, a worker reads any lines other workers have appended since. Once the
+    file passes `max_learned_bytes` (and twice its last compacted size), the worker writing
+    to it replaces it with one line per entry it holds; the others notice the new file and
+    re-read it. A line appended by another worker during the rewrite may be lost, which
+    only costs an upstream lookup.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, learned_path: Optional[str] = None,
+                 max_learned: int = 50000, reverse_max_km: float = 30.0, suggest_limit: int = 20,
+                 max_learned_bytes: int = 8 * 1024 * 1024):
+        self.index = None
+        if index_path and os.path.exists(index_path):
+            try:
+                self.index = GeoIndex(index_path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not open geocoder index {index_path}: {e}")
+        self.learned_path = learned_path
+        self.max_learned = max_learned
+        self.max_learned_bytes = max_learned_bytes
+        self.reverse_max_km = reverse_max_km
+        self.suggest_limit = suggest_limit
+        self._prefix_index: Optional[PrefixIndex] = None
+        self._prefix_lock = threading.Lock()
+        self.suggest_hits = 0
+        self.suggest_misses = 0
+        self.forward_hits = 0
+        self.reverse_hits = 0
+        self.misses = 0
+        self._forward: OrderedDict = OrderedDict()
+        self._reverse: OrderedDict = OrderedDict()
+        self.compactions = 0
+        self._learned_offset = 0
+        self._learned_inode = None
+        self._compacted_size = 0
+        self._load_learned()
+        if self._learned_offset > self.max_learned_bytes:
+            # Left over from before compaction, or from a larger max_learned
+            self._compact()
+
+    @staticmethod
+    def _reverse_key(lat: float, lon: float) -> str:
+        return f"{round(lat, 2):.2f},{round(lon, 2):.2f}"
+
+    def _load_learned(self) -> bool:
+        """Read learned entries appended since the last call. True if there were any."""
+        if not self.learned_path:
+            return False
+        try:
+            stat = os.stat(self.learned_path)
+            if stat.st_ino != self._learned_inode or stat.st_size < self._learned_offset:
+                # First read, or another worker compacted the file: start over
+                self._learned_inode, self._learned_offset = stat.st_ino, 0
+                self._compacted_size = stat.st_size
+            if stat.st_size <= self._learned_offset:
+                return False
+            with open(self.learned_path, "rb") as f:
+                f.seek(self._learned_offset)
+                data = f.read()
+        except OSError:
+            return False
+        # A line still being written by another worker is picked up next time
+        end = data.rfind(b"\n") + 1
+        self._learned_offset += end
+        for line in data[:end].splitlines():
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            table = self._forward if item.get("kind") == "forward" else self._reverse
+            self._remember(table, item["key"], item["value"])
+        return end > 0
+
+    def _remember(self, table: OrderedDict, key: str, value):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_learned:
+            table.popitem(last=False)
+
+    def _persist(self, kind: str, key: str, value):
+        if not self.learned_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.learned_path) or ".", exist_ok=True)
+            with open(self.learned_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"kind": kind, "key": key, "value": value}) + "\n")
+                size = f.tell()
+        except OSError as e:
+            logger.error(f"Could not persist learned geocode: {e}")
+            return
+        if size > max(self.max_learned_bytes, 2 * self._compacted_size):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the learned file with one line per entry (the tables are capped at max_learned)."""
+        # Pick up what other workers appended, so the rewrite keeps it
+        self._load_learned()
+        tmp_path = f"{self.learned_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for kind, table in (("forward", self._forward), ("reverse", self._reverse)):
+                    for key, value in table.items():
+                        f.write(json.dumps({"kind": kind, "key": key, "value": value}) + "\n")
+                size = f.tell()
+            os.replace(tmp_path, self.learned_path)
+        except OSError as e:
+            logger.error(f"Could not compact learned geocodes: {e}")
+            return
+        self._compacted_size = size
+        self._learned_inode, self._learned_offset = os.stat(self.learned_path).st_ino, size
+        self.compactions += 1
+
+    def forward(self, name: str) -> Optional[dict]:
+        key = normalize_name(name)
+        if key in self._forward:
+            self.forward_hits += 1
+            self._forward.move_to_end(key)
+            return self._forward[key]
+        if self.index is not None:
+            result = self.index.search(name)
+            if result is not None:
+                self.forward_hits += 1
+                return result
+        if self._load_learned() and key in self._forward:
+            self.forward_hits += 1
+            return self._forward[key]
+        self.misses += 1
+        return None
+
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        key = self._reverse_key(lat, lon)
+        if key in self._reverse:
+            self.reverse_hits += 1
+            self._reverse.move_to_end(key)
+            return self._reverse[key]
+        if self.index is not None:
+            result = self.index.nearest(lat, lon, self.reverse_max_km)
+            if result is not None:
+                self.reverse_hits += 1
+                return f"{result['name']}, {result['country']}"
+        if self._load_learned() and key in self._reverse:
+            self.reverse_hits += 1
+            return self._reverse[key]
+        self.misses += 1
+        return None
+
+    @property
+    def prefix_index(self) -> Optional[PrefixIndex]:
+        """The prefix index, built here if needed (blocking; see `load_prefix_index`)."""
+        if self._prefix_index is None and self.index is not None:
+            with self._prefix_lock:
+                if self._prefix_index is None:
+                    self._prefix_index = PrefixIndex(self.index, self.suggest_limit)
+        return self._prefix_index
+
+    async def load_prefix_index(self) -> Optional[PrefixIndex]:
+        """Build the prefix index in a worker thread, so the event loop keeps serving meanwhile."""
+        if self._prefix_index is None and self.index is not None:
+            return await asyncio.to_thread(lambda: self.prefix_index)
+        return self._prefix_index
+
+    def suggest(self, prefix: str, limit: int = 10) -> Optional[List[dict]]:
+        """Places whose name starts with `prefix`, most populous first; None if the index can't answer."""
+        prefix_index = self.prefix_index
+        ids = prefix_index.lookup(prefix, limit) if prefix_index is not None else []
+        if not ids:
+            self.suggest_misses += 1
+            return None
+        self.suggest_hits += 1
+        return [self.index.record(record_id) for record_id in ids]
+
+    def learn_forward(self, name: str, result: dict):
+        key = normalize_name(name)
+        if key and key not in self._forward:
+            self._remember(self._forward, key, result)
+            self._persist("forward", key, result)
+
+    def learn_reverse(self, lat: float, lon: float, display_name: str):
+        key = self._reverse_key(lat, lon)
+        if key not in self._reverse:
+            self._remember(self._reverse, key, display_name)
+            self._persist("reverse", key, display_name)
+
+    def stats(self) -> dict:
+        return {
+            "index_loaded": self.index is not None,
+            "index_records": self.index.n_records if self.index is not None else 0,
+            "learned": len(self._forward) + len(self._reverse),
+            "learned_compactions": self.compactions,
+            "forward_hits": self.forward_hits,
+            "reverse_hits": self.reverse_hits,
+            "misses": self.misses,
+            "suggest_hits": self.suggest_hits,
+            "suggest_misses": self.suggest_misses,
+            "prefix_index_bytes": self._prefix_index.nbytes if self._prefix_index is not None else 0,
+        }
+
+
+geocoder = LocalGeocoder(
+    index_path=os.getenv("GEOCODER_INDEX_PATH", "data/geonames.idx"),
+    learned_path=os.getenv("GEOCODER_LEARNED_PATH", "data/geocode_learned.jsonl"),
+    suggest_limit=int(os.getenv("GEOCODER_SUGGEST_MAX_LIMIT", "20")),
+    max_learned_bytes=int(os.getenv("GEOCODER_LEARNED_MAX_BYTES", str(8 * 1024 * 1024))),
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the offline geocoding index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build an index from a GeoNames cities dump")
+    build.add_argument("cities", help="GeoNames cities file, e.g. cities15000.txt")
+    build.add_argument("output", help="Index file to write")
+    build.add_argument("--countries", help="GeoNames countryInfo.txt for full country names")
+    build.add_argument("--cell-degrees", type=float, default=1.0)
+    args = parser.parse_args(argv)
+    count = build_index(args.cities, args.output, args.countries, args.cell_degrees)
+    print(f"Indexed {count} places into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,11 @@
 # This dictionary holds the persona and activation triggers for each hero.
 # It's the central database for our character logic.
+#
+# core/dispatcher.py compiles the triggers into a lookup table. Heroes are tried in
+# ascending 'priority'; a hero matches when the time of day fits and either a condition
+# matches the WMO description or the wind exceeds 'wind_speed_kmh_above'.
+# 'temp_celsius_range' further restricts a match, and 'is_default_day' /
+# 'is_default_night' pick the hero when nothing else matches.
 
 HERO_PROFILES = {
     'batman': {
@@ -7,41 +13,54 @@ HERO_PROFILES = {
         'triggers': {
             'time_of_day': ['night'],
             'conditions': ['clear', 'cloudy', 'fog', 'overcast', 'mist'],
-            'is_default_night': True
+            'is_default_night': True,
+            'priority': 5,
         },
-        'persona': "You are Batman. You are serious, tactical, and brooding. You refer to users as 'citizen'. You analyze the weather as a strategic variable for your nightly patrol of Gotham. Your language is direct and efficient."
+        'persona': "You are Batman. You are serious, tactical, and brooding. You refer to users as 'citizen'. You analyze the weather as a strategic variable for your nightly patrol of Gotham. Your language is direct and efficient.",
+        'fallback_dialogue': "Citizen, the weather conditions are clear for tonight's patrol. Stay vigilant."
     },
     'superman': {
         'name': 'Superman',
         'triggers': {
             'time_of_day': ['day'],
             'conditions': ['clear', 'sunny'],
-            'is_default_day': True
+            'is_default_day': True,
+            'priority': 3,
         },
-        'persona': "You are Superman, a symbol of hope. You are friendly, optimistic, and reassuring. You are powered by the sun, so you find bright, sunny weather invigorating. You address users warmly and offer encouragement. Your tone is heroic and positive."
+        'persona': "You are Superman, a symbol of hope. You are friendly, optimistic, and reassuring. You are powered by the sun, so you find bright, sunny weather invigorating. You address users warmly and offer encouragement. Your tone is heroic and positive.",
+        'fallback_dialogue': "The sun's energy is strong today, perfect for keeping Metropolis safe."
     },
     'wonder_woman': {
         'name': 'Wonder Woman',
         'triggers': {
             'time_of_day': ['day'],
-            'conditions': ['partly cloudy', 'clear'],
+            'conditions': ['partly cloudy', 'cloud', 'overcast', 'fog'],
             'temp_celsius_range': (20, 32),
+            'priority': 4,
         },
-        'persona': "You are Wonder Woman, an Amazonian emissary of peace. You are compassionate, wise, and graceful. You see pleasant weather as a gift from the gods. You speak with warmth and dignity."
+        'persona': "You are Wonder Woman, an Amazonian emissary of peace. You are compassionate, wise, and graceful. You see pleasant weather as a gift from the gods. You speak with warmth and dignity.",
+        'fallback_dialogue': "The gods have blessed us with fair weather today."
     },
     'aquaman': {
         'name': 'Aquaman',
         'triggers': {
             'conditions': ['rain', 'drizzle', 'storm', 'showers', 'thunderstorm'],
+            'priority': 1,
         },
-        'persona': "You are Aquaman, King of Atlantis. You are regal, powerful, and deeply connected to the ocean. You feel at home in the rain and storms. You speak with authority, using nautical metaphors."
+        'persona': "You are Aquaman, King of Atlantis. You are regal, powerful, and deeply connected to the ocean. You feel at home in the rain and storms. You speak with authority, using nautical metaphors.",
+        'fallback_dialogue': "The ocean's power flows through the rain. Atlantis stands strong."
     },
     'the_flash': {
         'name': 'The Flash',
         'triggers': {
             'wind_speed_kmh_above': 25,
             'conditions': ['windy'],
+            'priority': 2,
         },
-        'persona': "You are The Flash, the fastest man alive. You are energetic, witty, and talk a mile a minute. You relate everything to speed. A windy day is just a nice tailwind for you. You use humor and make quick jokes."
+        'persona': "You are The Flash, the fastest man alive. You are energetic, witty, and talk a mile a minute. You relate everything to speed. A windy day is just a nice tailwind for you. You use humor and make quick jokes.",
+        'fallback_dialogue': "Speed force is optimal today! Perfect conditions for a quick run."
     }
 }
+
+# Spoken when the AI service is unavailable and no hero matches the prompt.
+DEFAULT_FALLBACK_DIALOGUE = "The Watchtower systems are experiencing temporary issues. Weather data is still available, but AI responses are limited."
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .circuit_breaker import CircuitOpenError, get_breaker
+from .metrics import registry
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limiting and transient upstream failures.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Calls slower than this count against the host's circuit breaker
+UPSTREAM_SLOW_SECONDS = float(os.getenv("UPSTREAM_SLOW_SECONDS", "5"))
+
+UPSTREAM_SECONDS = registry.histogram("upstream_request_duration_seconds", "Latency of each upstream attempt.", ["host", "status"])
+
+
+class UpstreamClient:
+    """
+    Shared async HTTP client for every upstream service (Open-Meteo, BigDataCloud, OpenAI).
+
+    Keeps one pooled httpx.AsyncClient for the lifetime of the app so connections are
+    reused, caps concurrent requests per host, and retries transient failures with
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 50,
+        per_host_limit: int = 50,
+        retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client: Optional[httpx.AsyncClient] = None
+        self._openai: Optional["AsyncOpenAI"] = None
+        self._host_semaphores: dict = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # Allow use outside the lifespan (scripts, ad-hoc calls).
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    @property
+    def openai(self) -> "AsyncOpenAI":
+        """OpenAI client that shares the pooled connections, created on first use."""
+        if self._openai is None:
+            # The openai package takes longer to import than the rest of the app; keep it off cold starts
+            from openai import AsyncOpenAI
+            self._openai = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=self.client,
+                max_retries=self.retries,
+            )
+        return self._openai
+
+    async def start(self):
+        self.client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._openai = None
+        self._host_semaphores.clear()
+
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return semaphore
+
+    def openai_slot(self) -> asyncio.Semaphore:
+        """The OpenAI host's concurrency slot; SDK calls bypass `request`, so they take it themselves."""
+        return self._semaphore(str(self.openai.base_url))
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request, retrying transport errors and retryable status codes. Each host has
+        a circuit breaker; while it is open this raises CircuitOpenError without a request.
+        """
+        breaker = get_breaker(urlsplit(url).netloc, slow_call_seconds=UPSTREAM_SLOW_SECONDS)
+        if not breaker.allow():
+            raise CircuitOpenError(breaker.name)
+        started = time.perf_counter()
+        try:
+            response = await self._request_with_retries(method, url, **kwargs)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record(False, time.perf_counter() - started)
+            raise
+        breaker.record(response.status_code not in RETRYABLE_STATUS_CODES, time.perf_counter() - started)
+        return response
+
+    async def _request_with_retries(self, method: str, url: str, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore(url):
+                    started = time.perf_counter()
+                    try:
+                        response = await self.client.request(method, url, **kwargs)
+                    except httpx.TransportError:
+                        UPSTREAM_SECONDS.observe(time.perf_counter() - started, host=urlsplit(url).netloc, status="error")
+                        raise
+                    UPSTREAM_SECONDS.observe(time.perf_counter() - started, host=urlsplit(url).netloc, status=str(response.status_code))
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.retries:
+                    return response
+                logger.warning(f"Upstream {url} returned {response.status_code}, retrying")
+            except httpx.TransportError as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning(f"Upstream {url} transport error ({e!r}), retrying")
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def get_json(self, url: str, params: Optional[dict] = None) -> Optional[dict]:
+        """GET a JSON document. Returns None on a non-200 response or a failed request."""
+        try:
+            response = await self.request("GET", url, params=params)
+        except CircuitOpenError:
+            return None
+        except httpx.HTTPError as e:
+            logger.error(f"Upstream request to {url} failed: {e!r}")
+            return None
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+
+upstream = UpstreamClient(
+    timeout=float(os.getenv("UPSTREAM_TIMEOUT", "10")),
+    max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "200")),
+    max_keepalive_connections=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "50")),
+    per_host_limit=int(os.getenv("UPSTREAM_PER_HOST_LIMIT", "50")),
+    retries=int(os.getenv("UPSTREAM_RETRIES", "2")),
+)
@@ -0,0 +1,195 @@
+"""
+Live dashboard updates.
+
+Subscribers to the same forecast grid cell share one refresher task. It re-reads the
+cell's weather every `interval` seconds and fans out only what changed: the changed
+current-weather fields, and a new hero payload (dialogue, audio) when `load` reports a
+different trigger (e.g. the hero or condition flipped). Events are encoded once and the
+same bytes are queued for every subscriber.
+
+Each subscriber holds a small bounded queue. When a slow client overflows it, the queue
+is dropped and the client is resynchronised with one full snapshot instead, so an idle
+or slow connection never holds more than `max_queue` events.
+"""
+import asyncio
+import logging
+import random
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Optional, Tuple
+
+from .fastjson import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class _Cell:
+    __slots__ = ("key", "latitude", "longitude", "name", "subscribers", "weather", "trigger", "hero", "task")
+
+    def __init__(self, key: str, latitude: float, longitude: float, name: str):
+        self.key = key
+        self.latitude = latitude
+        self.longitude = longitude
+        self.name = name
+        self.subscribers: set = set()
+        self.weather: Optional[dict] = None
+        self.trigger: Hashable = None
+        self.hero: Optional[dict] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def snapshot(self) -> bytes:
+        return dumps({
+            "type": "snapshot",
+            "location": {"name": self.name, "latitude": self.latitude, "longitude": self.longitude},
+            "currentWeather": self.weather,
+            "hero": self.hero,
+        })
+
+
+class Subscriber:
+    __slots__ = ("cell", "queue", "wakeup", "resync")
+
+    def __init__(self, cell: _Cell, max_queue: int):
+        self.cell = cell
+        self.queue: deque = deque(maxlen=max_queue)
+        self.wakeup = asyncio.Event()
+        # Start with a full snapshot (as soon as the cell has one)
+        self.resync = True
+
+
+class LiveHub:
+    """
+    `load(latitude, longitude)` returns `(current_weather, trigger)` or None;
+    `on_change(latitude, longitude, name)` builds the hero payload (or None, to retry on
+    the next refresh) and is called only when the trigger changes. Callers must `unsubscribe` every subscriber they create.
+    """
+
+    def __init__(self, key: Callable[[float, float], str],
+                 load: Callable[[float, float], Awaitable[Optional[Tuple[dict, Hashable]]]],
+                 on_change: Callable[[float, float, str], Awaitable[Optional[dict]]],
+                 interval: float = 60.0, heartbeat: float = 25.0, max_queue: int = 8, max_subscribers: int = 50000):
+        self.key = key
+        self.load = load
+        self.on_change = on_change
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self.published = 0
+        self.resyncs = 0
+        self.heartbeats = 0
+        self.refresh_errors = 0
+        self._cells: dict = {}
+
+    @property
+    def full(self) -> bool:
+        return self.subscribers >= self.max_subscribers
+
+    def subscribe(self, latitude: float, longitude: float, name: str) -> Subscriber:
+        key = self.key(latitude, longitude)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = _Cell(key, latitude, longitude, name)
+        subscriber = Subscriber(cell, self.max_queue)
+        cell.subscribers.add(subscriber)
+        self.subscribers += 1
+        if cell.task is None:
+            cell.task = asyncio.create_task(self._refresh_loop(cell))
+        elif cell.weather is not None:
+            subscriber.wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        cell = subscriber.cell
+        if subscriber not in cell.subscribers:
+            return
+        cell.subscribers.discard(subscriber)
+        self.subscribers -= 1
+        if not cell.subscribers:
+            # Last one out stops the cell's refresher
+            if cell.task is not None:
+                cell.task.cancel()
+            self._cells.pop(cell.key, None)
+
+    def _publish(self, cell: _Cell, event: dict):
+        data = dumps(event)
+        self.published += 1
+        for subscriber in cell.subscribers:
+            # Subscribers waiting for a snapshot get the new state with it
+            if not subscriber.resync:
+                if len(subscriber.queue) == subscriber.queue.maxlen:
+                    # Too far behind: forget the backlog and send one snapshot instead
+                    subscriber.queue.clear()
+                    subscriber.resync = True
+                    self.resyncs += 1
+                else:
+                    subscriber.queue.append(data)
+            subscriber.wakeup.set()
+
+    async def _refresh(self, cell: _Cell):
+        loaded = await self.load(cell.latitude, cell.longitude)
+        if loaded is None:
+            self.refresh_errors += 1
+            return
+        weather, trigger = loaded
+        first = cell.weather is None
+        if not first:
+            changed = {field: value for field, value in weather.items() if cell.weather.get(field) != value}
+            if changed:
+                cell.weather = weather
+                self._publish(cell, {"type": "weather", "currentWeather": changed})
+        if first or trigger != cell.trigger:
+            hero = await self.on_change(cell.latitude, cell.longitude, cell.name)
+            if hero is None:
+                self.refresh_errors += 1
+                return
+            cell.weather, cell.trigger, cell.hero = weather, trigger, hero
+            if first:
+                for subscriber in cell.subscribers:
+                    subscriber.wakeup.set()
+            else:
+                self._publish(cell, {"type": "hero", "hero": hero})
+
+    async def _refresh_loop(self, cell: _Cell):
+        while True:
+            try:
+                await self._refresh(cell)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.error(f"Live refresh for {cell.key} failed: {e!r}")
+            # Jitter keeps cells subscribed at the same moment from refreshing in lockstep
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+    async def events(self, subscriber: Subscriber) -> AsyncIterator[Optional[bytes]]:
+        """Encoded events for one subscriber; None means "send a heartbeat"."""
+        while True:
+            if subscriber.resync and subscriber.cell.weather is not None:
+                subscriber.resync = False
+                yield subscriber.cell.snapshot()
+            while subscriber.queue:
+                yield subscriber.queue.popleft()
+            subscriber.wakeup.clear()
+            if subscriber.queue or (subscriber.resync and subscriber.cell.weather is not None):
+                continue
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), self.heartbeat)
+            except asyncio.TimeoutError:
+                self.heartbeats += 1
+                yield None
+
+    def close(self):
+        for cell in self._cells.values():
+            if cell.task is not None:
+                cell.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "cells": len(self._cells),
+            "subscribers": self.subscribers,
+            "published": self.published,
+            "resyncs": self.resyncs,
+            "heartbeats": self.heartbeats,
+            "refresh_errors": self.refresh_errors,
+        }
@@ -0,0 +1,71 @@
+import os
+import time
+from typing import AsyncIterator, Callable, List, Optional
+
+from .circuit_breaker import CircuitOpenError, get_breaker
+from .http_client import upstream
+from .metrics import registry
+
+DEFAULT_CHAT_MODEL = "gpt-3.5-turbo"
+
+# While this is open, callers get CircuitOpenError at once and use their canned lines
+chat_breaker = get_breaker("openai_chat", slow_call_seconds=float(os.getenv("OPENAI_CHAT_SLOW_SECONDS", "8")))
+
+TOKENS = registry.counter("openai_tokens_total", "OpenAI chat tokens used.", ["model", "kind"])
+
+
+def record_usage(model: str, usage, on_usage: Optional[Callable] = None):
+    if usage is not None:
+        TOKENS.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+        TOKENS.inc(usage.completion_tokens or 0, model=model, kind="completion")
+        if on_usage is not None:
+            on_usage(usage)
+
+
+async def complete(messages: List[dict], max_tokens: int, temperature: float = 0.7, model: str = DEFAULT_CHAT_MODEL,
+                   on_usage: Optional[Callable] = None) -> str:
+    """Run a chat completion and return the stripped reply text. `on_usage` receives the token usage."""
+    async with upstream.openai_slot():
+        response = await chat_breaker.call(
+            upstream.openai.chat.completions.create,
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+        )
+    record_usage(model, getattr(response, "usage", None), on_usage)
+    return response.choices[0].message.content.strip()
+
+
+async def stream_completion(messages: List[dict], max_tokens: int, temperature: float = 0.7,
+                            model: str = DEFAULT_CHAT_MODEL, on_usage: Optional[Callable] = None) -> AsyncIterator[str]:
+    """Run a chat completion with streaming enabled, yielding text deltas as they arrive."""
+    # The stream holds its connection until the last token, so it holds the host slot too
+    async with upstream.openai_slot():
+        if not chat_breaker.allow():
+            raise CircuitOpenError(chat_breaker.name)
+        started = time.perf_counter()
+        recorded = False
+        ok = None  # Stays None when the caller closes or cancels the stream
+        try:
+            stream = await upstream.openai.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, max_tokens=max_tokens, stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if not recorded:
+                    # Judge streams by time to first token; the full reply legitimately takes longer
+                    chat_breaker.record(True, time.perf_counter() - started)
+                    recorded = True
+                # With include_usage the last chunk carries the token counts and no choices
+                record_usage(model, getattr(chunk, "usage", None), on_usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            ok = True
+        except Exception:
+            ok = False
+            raise
+        finally:
+            # Streams that end before their first chunk still settle the breaker (and its half-open probe)
+            if not recorded:
+                if ok is None:
+                    chat_breaker.release()
+                else:
+                    chat_breaker.record(ok, time.perf_counter() - started)
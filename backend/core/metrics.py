@@ -0,0 +1,274 @@
+"""
+Minimal Prometheus-style metrics.
+
+Counters, gauges and histograms keep their samples in plain dicts keyed by label values,
+so recording is a dict lookup and an add. `render()` produces the Prometheus text
+exposition format for the /metrics endpoint; collectors registered with
+`register_collector` contribute gauges computed at scrape time (e.g. cache stats).
+"""
+import functools
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional, Tuple
+
+# Latency buckets in seconds, from cache hits to slow model calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: dict = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> list:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in list(self._values.items())
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # Per-bucket counts (not cumulative) plus +Inf, then sum
+            series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def samples(self) -> list:
+        lines = []
+        for key, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict = {}
+        self.collectors: list = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def register_collector(self, collect: Callable[[], Iterable[tuple]]):
+        """`collect()` yields (name, documentation, labels dict, value) gauges at scrape time."""
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            samples = metric.samples()
+            if samples:
+                lines += metric.header() + samples
+        collected: dict = {}
+        for collect in self.collectors:
+            for name, documentation, labels, value in collect():
+                collected.setdefault(name, (documentation, []))[1].append((labels, value))
+        for name, (documentation, samples) in collected.items():
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_format_labels(names, tuple(labels[n] for n in names))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+OPERATION_SECONDS = registry.histogram(
+    "operation_duration_seconds", "Latency of upstream-bound operations.", ["operation", "outcome"])
+
+
+def timed(operation: str):
+    """Decorator recording an async function's latency in operation_duration_seconds."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+def stats_collector(prefix: str, sources: Callable[[], dict], label: str = "cache"):
+    """
+    Collector exposing the numeric entries of `stats()` dicts as gauges, e.g.
+    {"forecast": {"hits": 3}} becomes `<prefix>_hits{cache="forecast"} 3`. Nested
+    dicts are flattened into the label value ("singleflight_dashboard").
+    """
+    def collect():
+        def walk(name: str, stats: dict):
+            for key, value in stats.items():
+                if isinstance(value, dict):
+                    yield from walk(f"{name}_{key}", value)
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield f"{prefix}_{key}", f"{key} from the component's stats().", {label: name}, value
+        for name, stats in sources().items():
+            yield from walk(name, stats)
+    return collect
+
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests by route, method and status.", ["route", "method", "status"])
+HTTP_SECONDS = registry.histogram("http_request_duration_seconds", "HTTP request latency, including streamed bodies.", ["route", "method"])
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served.")
+
+
+class StartupTimer:
+    """
+    Cold start phases, in seconds since `started` (taken as the app module starts importing):
+    `imported` once the app is built, `ready` when the lifespan has started and
+    `first_response` when the first request completes.
+    """
+
+    def __init__(self, started: float):
+        self.started = started
+        self.phases: dict = {}
+
+    def mark(self, phase: str):
+        self.phases.setdefault(phase, time.perf_counter() - self.started)
+
+    def stats(self) -> dict:
+        return {f"{phase}_seconds": seconds for phase, seconds in self.phases.items()}
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests per route template."""
+
+    def __init__(self, app, startup: Optional[StartupTimer] = None):
+        self.app = app
+        self.startup = startup
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; use its template, not the raw path
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.observe(time.perf_counter() - started, route=route, method=scope["method"])
+            HTTP_REQUESTS.inc(route=route, method=scope["method"], status=str(status))
+            if self.startup is not None:
+                self.startup.mark("first_response")
+                self.startup = None
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_NO_FALLBACK = object()
+
+STAGE_SECONDS = registry.histogram("pipeline_stage_duration_seconds", "Pipeline stage latency.", ["pipeline", "stage"])
+STAGE_DEGRADED = registry.counter("pipeline_stage_degraded_total", "Stages that fell back.", ["pipeline", "stage", "reason"])
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    `func` receives the pipeline context (inputs plus the results of finished stages) and
+    runs once all `deps` are done. If it fails or exceeds `timeout`, `fallback` (a value,
+    or a callable taking the context) is used instead; without a fallback the error aborts
+    the pipeline.
+    """
+
+    def __init__(self, name: str, func: Callable[[dict], Awaitable[Any]], deps: Iterable[str] = (),
+                 timeout: Optional[float] = None, fallback: Any = _NO_FALLBACK):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class PipelineResult:
+    def __init__(self, results: Dict[str, Any], timings: Dict[str, float], degraded: Dict[str, str]):
+        self.results = results
+        self.timings = timings
+        self.degraded = degraded
+
+    def __getitem__(self, name: str):
+        return self.results[name]
+
+    def server_timing(self) -> str:
+        """Stage timings formatted for the Server-Timing response header."""
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.timings.items())
+
+
+class Pipeline:
+    """Runs a dependency graph of stages, starting each one as soon as its dependencies finish."""
+
+    def __init__(self, stages: Iterable[Stage], name: str = "pipeline"):
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in self.stages.values():
+            missing = set(stage.deps) - set(self.stages)
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages {sorted(missing)}")
+
+    async def run(self, **inputs) -> PipelineResult:
+        context = dict(inputs)
+        timings: Dict[str, float] = {}
+        degraded: Dict[str, str] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: Stage):
+            if stage.deps:
+                await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(stage.func(context), stage.timeout)
+            except Exception as e:
+                if stage.fallback is _NO_FALLBACK:
+                    raise
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+                logger.warning(f"Pipeline stage '{stage.name}' degraded ({reason}): {e!r}")
+                degraded[stage.name] = reason
+                STAGE_DEGRADED.inc(pipeline=self.name, stage=stage.name, reason=reason)
+                result = stage.fallback(context) if callable(stage.fallback) else stage.fallback
+            finally:
+                elapsed = time.perf_counter() - started
+                timings[stage.name] = elapsed * 1000
+                STAGE_SECONDS.observe(elapsed, pipeline=self.name, stage=stage.name)
+            context[stage.name] = result
+            return result
+
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        results = {name: context[name] for name in self.stages}
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Pipeline timings (ms): {timings}")
+        return PipelineResult(results, timings, degraded)
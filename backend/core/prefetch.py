@@ -0,0 +1,250 @@
+"""
+Cache warming for popular locations.
+
+Dashboard and geocode traffic feeds a decayed popularity count per forecast grid cell.
+With a shared cache backend every worker hands its counts to the leader through it.
+Shortly after each forecast model update (jittered, so workers and restarts don't align)
+the Prefetcher walks the top-K cells and warms them: forecast, hero dialogue and audio.
+Upstream calls are paced by a token bucket and paused while live traffic is heavy, so
+warming never competes with users for upstream quota.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import os
+import random
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from .cache_backends import MemoryBackend, create_backend
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityTracker:
+    """
+    Exponentially decayed request counts per grid cell (half-life `half_life` seconds),
+    bounded to `max_entries` cells. Uses forward decay: each hit adds 2^(t/half_life), so
+    recording never rescales the other entries.
+
+    With a `shared` backend, `record` only queues counts; `flush` appends them every
+    `sync_interval` seconds to a list per interval in the shared cache, and the leader's
+    `merge` folds closed intervals into its own entries, so the prefetcher sees every
+    worker's traffic.
+    """
+
+    def __init__(self, grid: float = 0.05, half_life: float = 6 * 3600, max_entries: int = 5000,
+                 shared=None, sync_interval: float = 60):
+        self.grid = grid
+        self.half_life = half_life
+        self.max_entries = max_entries
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.recorded = 0
+        self.flushed = 0
+        self.merged = 0
+        self._epoch = time.time()
+        self._entries: dict = {}  # key -> [score, lat, lon, name]
+        self._pending: dict = {}  # counts not yet flushed to `shared`, same layout
+        self._merged_through: Optional[int] = None
+
+    def key(self, lat: float, lon: float) -> str:
+        return f"{round(lat / self.grid) * self.grid:.4f},{round(lon / self.grid) * self.grid:.4f}"
+
+    def record(self, lat: Optional[float], lon: Optional[float], name: Optional[str] = None):
+        if lat is None or lon is None:
+            return
+        self.recorded += 1
+        key = self.key(lat, lon)
+        weight = self._weight(time.time())
+        if self.shared is None:
+            self._add(key, weight, lat, lon, name)
+            return
+        entry = self._pending.get(key)
+        if entry is None:
+            if len(self._pending) < self.max_entries:
+                self._pending[key] = [weight, lat, lon, name]
+        else:
+            entry[0] += weight
+            if name:
+                entry[3] = name
+
+    def _weight(self, at: float) -> float:
+        """Forward-decay weight of a hit at time `at`."""
+        weight = math.exp2((at - self._epoch) / self.half_life)
+        if weight > 1e100:
+            self._rebase()
+            weight = math.exp2((at - self._epoch) / self.half_life)
+        return weight
+
+    def _add(self, key: str, weight: float, lat: float, lon: float, name: Optional[str]):
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.max_entries:
+                self._prune()
+            self._entries[key] = [weight, lat, lon, name]
+        else:
+            entry[0] += weight
+            if name:
+                entry[3] = name
+
+    def _rebase(self):
+        now = time.time()
+        scale = math.exp2(-(now - self._epoch) / self.half_life)
+        for entry in (*self._entries.values(), *self._pending.values()):
+            entry[0] *= scale
+        self._epoch = now
+
+    def _interval(self, at: float) -> int:
+        return int(at // self.sync_interval)
+
+    async def flush(self):
+        """Append the counts queued since the last flush to this interval's shared list."""
+        if self.shared is None or not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        # Weights are sent relative to `at`, since every process has its own epoch
+        scale = math.exp2((self._epoch - now) / self.half_life)
+        batch = {"at": now, "cells": [[weight * scale, lat, lon, name] for weight, lat, lon, name in pending.values()]}
+        try:
+            await self.shared.append(str(self._interval(now)), batch, ttl=4 * self.sync_interval)
+        except Exception as e:
+            logger.error(f"Flushing popularity counts failed: {e!r}")
+            return
+        self.flushed += len(batch["cells"])
+
+    async def merge(self):
+        """Fold every worker's flushed counts into this tracker; run by the leader only."""
+        if self.shared is None:
+            return
+        current = self._interval(time.time())
+        start = current - 3 if self._merged_through is None else self._merged_through + 1
+        # The previous interval stays open for one more, for flushes that were in flight at its end
+        for interval in range(max(start, current - 3), current - 1):
+            try:
+                batches = await self.shared.get_list(str(interval)) or []
+            except Exception as e:
+                logger.error(f"Reading popularity counts failed: {e!r}")
+                return
+            for batch in batches:
+                scale = self._weight(batch["at"])
+                for weight, lat, lon, name in batch["cells"]:
+                    self._add(self.key(lat, lon), weight * scale, lat, lon, name)
+                    self.merged += 1
+            self._merged_through = interval
+
+    async def run_sync(self, merge: bool):
+        """Flush (and, on the leader, merge) counts every `sync_interval` seconds."""
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.flush()
+            if merge:
+                await self.merge()
+
+    def _prune(self):
+        # Drop the least popular quarter in one go rather than one cell per insert
+        keep = heapq.nlargest(self.max_entries * 3 // 4, self._entries.items(), key=lambda item: item[1][0])
+        self._entries = dict(keep)
+
+    def top(self, k: int) -> List[dict]:
+        """The `k` most popular cells, most popular first."""
+        return [
+            {"latitude": lat, "longitude": lon, "name": name}
+            for _, lat, lon, name in heapq.nlargest(k, self._entries.values(), key=lambda entry: entry[0])
+        ]
+
+    def stats(self) -> dict:
+        stats = {"tracked": len(self._entries), "recorded": self.recorded}
+        if self.shared is not None:
+            stats.update(pending=len(self._pending), flushed=self.flushed, merged=self.merged)
+        return stats
+
+
+class Prefetcher:
+    """
+    Warms the `top_k` most popular locations `offset` seconds after each `period` boundary
+    (plus up to `jitter` seconds). `warm(location, bucket)` does the work for one location
+    and must `await bucket.acquire()` before each upstream call. While `busy()` is true
+    the cycle waits, for at most `max_pause` seconds per location.
+    """
+
+    def __init__(self, tracker: PopularityTracker, warm: Callable[[dict, TokenBucket], Awaitable[None]],
+                 bucket: TokenBucket, top_k: int = 50, period: float = 3600, offset: float = 300,
+                 jitter: float = 120, busy: Optional[Callable[[], bool]] = None, max_pause: float = 60):
+        self.tracker = tracker
+        self.warm = warm
+        self.bucket = bucket
+        self.top_k = top_k
+        self.period = period
+        self.offset = offset
+        self.jitter = jitter
+        self.busy = busy
+        self.max_pause = max_pause
+        self.cycles = 0
+        self.warmed = 0
+        self.failures = 0
+        self.paused_seconds = 0.0
+        self.last_cycle_seconds = 0.0
+        self.next_run_at = 0.0
+
+    def next_run(self, now: float) -> float:
+        boundary = math.floor((now - self.offset) / self.period) * self.period + self.offset
+        return boundary + self.period + random.uniform(0, self.jitter)
+
+    async def _wait_for_quiet(self):
+        if self.busy is None:
+            return
+        started = time.monotonic()
+        while self.busy() and time.monotonic() - started < self.max_pause:
+            await asyncio.sleep(1.0)
+        self.paused_seconds += time.monotonic() - started
+
+    async def run_cycle(self):
+        started = time.monotonic()
+        locations = self.tracker.top(self.top_k)
+        for location in locations:
+            await self._wait_for_quiet()
+            try:
+                await self.warm(location, self.bucket)
+                self.warmed += 1
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Prefetch for {location} failed: {e!r}")
+        self.cycles += 1
+        self.last_cycle_seconds = time.monotonic() - started
+        logger.info(f"Prefetched {len(locations)} locations in {self.last_cycle_seconds:.1f}s")
+
+    async def run(self):
+        while True:
+            self.next_run_at = self.next_run(time.time())
+            await asyncio.sleep(max(0.0, self.next_run_at - time.time()))
+            await self.run_cycle()
+
+    def stats(self) -> dict:
+        return {
+            "cycles": self.cycles,
+            "warmed": self.warmed,
+            "failures": self.failures,
+            "paused_seconds": self.paused_seconds,
+            "last_cycle_seconds": self.last_cycle_seconds,
+            "next_run_in": max(0.0, self.next_run_at - time.time()) if self.next_run_at else None,
+            **self.tracker.stats(),
+            "rate_limit": self.bucket.stats(),
+        }
+
+
+def popularity_from_env() -> PopularityTracker:
+    backend = create_backend("popularity:", 4 * 1024 * 1024)
+    return PopularityTracker(
+        grid=float(os.getenv("FORECAST_GRID_DEGREES", "0.05")),
+        half_life=float(os.getenv("PREFETCH_HALF_LIFE_SECONDS", str(6 * 3600))),
+        # In one process the tracker already sees all traffic
+        shared=None if isinstance(backend, MemoryBackend) else backend,
+        sync_interval=float(os.getenv("PREFETCH_SYNC_SECONDS", "60")),
+    )
+
+
+popularity = popularity_from_env()
@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Distinct stacks kept per session; further new stacks are counted as dropped
+MAX_STACKS = 10000
+MAX_DEPTH = 64
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler for the event loop thread.
+
+    A daemon thread reads the target thread's current frame every `interval` seconds and
+    counts the collapsed stack ("module:function;module:function ..."), the input format
+    of flamegraph.pl and speedscope. Nothing runs while it is stopped.
+    """
+
+    def __init__(self):
+        self.samples: Counter = Counter()
+        self.dropped = 0
+        self.interval = 0.01
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.01, thread_id: Optional[int] = None):
+        """Start sampling `thread_id` (default: the calling thread). Clears previous samples."""
+        if self.running:
+            return
+        self.samples = Counter()
+        self.dropped = 0
+        self.interval = interval
+        self._target = thread_id or threading.get_ident()
+        self._stop.clear()
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.stopped_at = time.time()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            if key in self.samples or len(self.samples) < MAX_STACKS:
+                self.samples[key] += 1
+            else:
+                self.dropped += 1
+
+    def collapsed(self) -> str:
+        """Samples as collapsed stacks, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "samples": sum(self.samples.values()),
+            "stacks": len(self.samples),
+            "dropped": self.dropped,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
+
+
+profiler = SamplingProfiler()
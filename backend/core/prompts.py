@@ -0,0 +1,148 @@
+"""
+Chat prompt assembly and token budgeting.
+
+Each hero's persona and response guidelines form one system message, built and interned
+once at startup, so every request for that hero starts with byte-identical text that the
+provider's prompt-prefix cache can reuse. History follows as separate turns, trimmed
+newest-first to a token budget, and the per-request weather context and question go last.
+"""
+import logging
+import math
+import sys
+from typing import Callable, Dict, List, Optional
+
+from .metrics import registry
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; without it token counts are estimated
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Framing tokens the chat format adds per message, and the tokens priming the reply
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+HERO_TOKENS = registry.counter("chat_tokens_total", "Chat tokens used per hero.", ["hero", "kind"])
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken when it is installed, otherwise estimates ~4 characters per
+    token. The encoding is loaded on the first count rather than at startup.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self._encoding = None
+        self._loaded = tiktoken is None
+
+    @property
+    def encoding(self):
+        if not self._loaded:
+            self._loaded = True
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # The encoding files are downloaded on first use
+                logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return self._encoding
+
+    @property
+    def exact(self) -> bool:
+        # Reports without forcing the encoding to load (false until the first count)
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        encoding = self.encoding
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / 4)
+
+    def count_messages(self, messages: List[dict]) -> int:
+        return sum(MESSAGE_OVERHEAD + self.count(message["content"]) for message in messages) + REPLY_OVERHEAD
+
+
+class ChatPrompts:
+    """
+    Per-hero chat prompts. `build` returns the messages for one request: the hero's system
+    message, as much recent history (at most `max_history` turns) as fits in
+    `token_budget` prompt tokens, and the user message. System message token counts are
+    taken on first use. Token usage reported back through `usage_recorder` is aggregated
+    per hero.
+    """
+
+    def __init__(self, system_prompt: str, personas: Dict[str, str], default_persona: str, guidelines: str,
+                 counter: TokenCounter, token_budget: int = 1000, max_history: int = 3):
+        self.counter = counter
+        self.token_budget = token_budget
+        self.max_history = max_history
+        self._system = {hero: self._system_message(system_prompt, persona, guidelines) for hero, persona in personas.items()}
+        self._default = self._system_message(system_prompt, default_persona, guidelines)
+        self._system_tokens: Dict[str, int] = {}
+        self.requests = 0
+        self.trimmed_messages = 0
+        self.usage: Dict[str, dict] = {}
+
+    @staticmethod
+    def _system_message(system_prompt: str, persona: str, guidelines: str) -> dict:
+        content = sys.intern("\n\n".join((system_prompt, persona.strip(), guidelines)))
+        return {"role": "system", "content": content}
+
+    def hero_key(self, hero: str) -> str:
+        """The persona key for `hero`; unknown heroes share one key (and one usage bucket)."""
+        key = (hero or "").lower()
+        return key if key in self._system else "other"
+
+    def build(self, hero: str, question: str, context: str = "", history: Optional[List[dict]] = None) -> List[dict]:
+        """Messages for one request. `history` holds {"role", "content"} turns, oldest first."""
+        key = self.hero_key(hero)
+        system = self._system.get(key, self._default)
+        used = self._system_tokens.get(key)
+        if used is None:
+            used = self._system_tokens[key] = MESSAGE_OVERHEAD + self.counter.count(system["content"])
+        user = {"role": "user", "content": f"{context}\n\n{question}" if context else question}
+        used += MESSAGE_OVERHEAD + self.counter.count(user["content"]) + REPLY_OVERHEAD
+        recent = (history or [])[-self.max_history:] if self.max_history > 0 else []
+        turns = []
+        for turn in reversed(recent):
+            cost = MESSAGE_OVERHEAD + self.counter.count(turn["content"])
+            if used + cost > self.token_budget:
+                break
+            used += cost
+            turns.append(turn)
+        self.requests += 1
+        self.trimmed_messages += len(recent) - len(turns)
+        turns.reverse()
+        return [system, *turns, user]
+
+    def record_usage(self, hero: str, usage):
+        if usage is None:
+            return
+        key = self.hero_key(hero)
+        totals = self.usage.setdefault(key, {"completions": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0})
+        details = getattr(usage, "prompt_tokens_details", None)
+        counts = {
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "cached_prompt_tokens": (getattr(details, "cached_tokens", None) or 0) if details is not None else 0,
+            "completion_tokens": usage.completion_tokens or 0,
+        }
+        totals["completions"] += 1
+        for kind, value in counts.items():
+            totals[kind] += value
+            HERO_TOKENS.inc(value, hero=key, kind=kind.replace("_tokens", ""))
+
+    def usage_recorder(self, hero: str) -> Callable:
+        return lambda usage: self.record_usage(hero, usage)
+
+    def stats(self) -> dict:
+        return {
+            "exact_token_counts": self.counter.exact,
+            "requests": self.requests,
+            "trimmed_messages": self.trimmed_messages,
+            "usage": self.usage,
+        }
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket: `rate` tokens per second, holding at most `burst`.
+
+    `try_acquire` takes tokens if they are available right now; `acquire` waits for them.
+    Waiters are served in arrival order. A rate of 0 or less disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.granted = 0
+        self.denied = 0
+        self.waited_seconds = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.unlimited:
+            self.granted += 1
+            return True
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            self.granted += 1
+            return True
+        self.denied += 1
+        return False
+
+    def retry_after(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` will be available."""
+        self._refill()
+        if self.unlimited:
+            return 0.0
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1):
+        if self.unlimited:
+            self.granted += 1
+            return
+        async with self._lock:
+            started = time.monotonic()
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+            self.granted += 1
+            self.waited_seconds += time.monotonic() - started
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "tokens": self.tokens,
+            "granted": self.granted,
+            "denied": self.denied,
+            "waited_seconds": self.waited_seconds,
+        }
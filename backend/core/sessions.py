@@ -0,0 +1,85 @@
+import logging
+import os
+import re
+import secrets
+import time
+from typing import List, Optional
+
+from .cache_backends import create_backend
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+class SessionStore:
+    """
+    Server-side conversation state, so clients send only their new message.
+
+    A session holds the rolling chat history (the last `max_history` turns, each cut to
+    `max_message_chars`) and the last dashboard context (hero, location, weather). Sessions
+    expire `ttl` seconds after their last update; memory is bounded by the backend's LRU
+    limit, and the backend can be shared between workers (CACHE_BACKEND=redis).
+    """
+
+    def __init__(self, backend=None, ttl: float = 1800, max_history: int = 20, max_message_chars: int = 2000):
+        self.backend = backend if backend is not None else create_backend("session:", 32 * 1024 * 1024)
+        self.ttl = ttl
+        self.max_history = max(1, max_history)
+        self.max_message_chars = max_message_chars
+        self.created = 0
+        self.loads = 0
+        self.expired = 0
+        self.updates = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_urlsafe(16)
+
+    async def load(self, session_id: Optional[str]) -> tuple:
+        """
+        (session id, session) for a request. Unknown, expired or malformed ids start a new
+        (empty) session under a fresh id, which the response hands back to the client.
+        """
+        if session_id:
+            session = await self.backend.get(session_id) if _SESSION_ID.match(session_id) else None
+            if session is not None:
+                self.loads += 1
+                return session_id, session
+            self.expired += 1
+        self.created += 1
+        return self.new_id(), {"history": [], "context": None}
+
+    async def update(self, session_id: str, session: dict, turns: List[dict] = (), context: Optional[dict] = None):
+        """Append `turns` ({"role", "content"}) and/or replace the context, then store the session."""
+        history = session["history"]
+        history.extend({"role": turn["role"], "content": turn["content"][:self.max_message_chars]} for turn in turns)
+        del history[:-self.max_history]
+        if context is not None:
+            session["context"] = context
+        session["updated_at"] = time.time()
+        self.updates += 1
+        try:
+            await self.backend.set(session_id, session, ttl=self.ttl)
+        except Exception as e:
+            # Losing a session only costs the conversation context; the reply still goes out
+            logger.error(f"Storing session {session_id!r} failed: {e!r}")
+
+    async def delete(self, session_id: str):
+        await self.backend.delete(session_id)
+
+    def stats(self) -> dict:
+        return {
+            "created": self.created,
+            "loads": self.loads,
+            "expired": self.expired,
+            "updates": self.updates,
+            "stored": len(self.backend) if hasattr(self.backend, "__len__") else None,
+        }
+
+
+sessions = SessionStore(
+    backend=create_backend("session:", int(os.getenv("SESSION_MAX_BYTES", str(32 * 1024 * 1024)))),
+    ttl=float(os.getenv("SESSION_TTL_SECONDS", "1800")),
+    max_history=int(os.getenv("SESSION_MAX_HISTORY", "20")),
+)
@@ -0,0 +1,353 @@
+"""
+Cache shared by the workers on one host.
+
+In multi-worker mode (gunicorn.conf.py) the master starts one CacheServer process on a
+unix socket before forking the workers, and each worker's caches (CACHE_BACKEND=shared)
+reach it through SharedCacheClient. A forecast, dialogue line or session stored by one
+worker is then a hit for all of them, without running Redis.
+
+The server speaks the small subset of the Redis protocol the caches use (GET, SET with
+PX/EX, DEL, RPUSH, PEXPIRE, LRANGE, PING, DBSIZE), so RedisBackend works unchanged on top
+of the client and `redis-cli -s <socket>` can inspect it. Memory is bounded with the same
+LRU byte budget as MemoryBackend.
+
+    python -m core.shared_cache serve data/cache.sock --max-bytes 134217728
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; every process then counts as the leader
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Per-entry bookkeeping (dict slot, tuple, bytes headers) counted against the budget
+ENTRY_OVERHEAD = 128
+# Per-item bookkeeping of a list value
+ITEM_OVERHEAD = 40
+
+_WRONGTYPE = b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+
+
+class SharedCacheError(Exception):
+    """An error reply from the cache server."""
+
+
+def _encode(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[list]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, as typed into a telnet session
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        if not header.startswith(b"$"):
+            raise SharedCacheError("expected a bulk string")
+        args.append((await reader.readexactly(int(header[1:]) + 2))[:-2])
+    return args
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("cache server closed the connection")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"$":
+        length = int(body)
+        return None if length < 0 else (await reader.readexactly(length + 2))[:-2]
+    if kind == b":":
+        return int(body)
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise SharedCacheError(body.decode())
+    if kind == b"*":
+        count = int(body)
+        return None if count < 0 else [await _read_reply(reader) for _ in range(count)]
+    raise SharedCacheError(f"unexpected reply {line!r}")
+
+
+def _size(key: bytes, value) -> int:
+    if isinstance(value, list):
+        return len(key) + ENTRY_OVERHEAD + sum(len(item) + ITEM_OVERHEAD for item in value)
+    return len(key) + len(value) + ENTRY_OVERHEAD
+
+
+class CacheServer:
+    """Byte-budgeted LRU of raw values and lists of them, served over a unix socket."""
+
+    def __init__(self, path: str, max_bytes: int = 128 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> (bytes or list of bytes, expires_at)
+
+    def get(self, key: bytes):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: bytes, value, ttl: Optional[float] = None):
+        if key in self._entries:
+            self._remove(key)
+        size = _size(key, value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, time.time() + ttl if ttl is not None else None)
+        self.current_bytes += size
+        self._evict()
+
+    def rpush(self, key: bytes, values: list) -> Optional[int]:
+        """Append to the list at `key` (created without expiry); None if `key` holds a string."""
+        items = self.get(key)
+        if items is None:
+            self.set(key, list(values))
+            return len(values)
+        if not isinstance(items, list):
+            return None
+        items.extend(values)
+        self.current_bytes += sum(len(value) + ITEM_OVERHEAD for value in values)
+        self._evict()
+        return len(items)
+
+    def expire(self, key: bytes, ttl: float) -> bool:
+        value = self.get(key)
+        if value is None:
+            return False
+        self._entries[key] = (value, time.time() + ttl)
+        return True
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: bytes) -> bool:
+        item = self._entries.pop(key, None)
+        if item is None:
+            return False
+        self.current_bytes -= _size(key, item[0])
+        return True
+
+    def execute(self, args: list) -> bytes:
+        if not args:
+            return b"-ERR empty command\r\n"
+        command = args[0].upper()
+        if command == b"GET" and len(args) == 2:
+            value = self.get(args[1])
+            if isinstance(value, list):
+                return _WRONGTYPE
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"SET" and len(args) in (3, 5):
+            ttl = None
+            if len(args) == 5:
+                unit = args[3].upper()
+                if unit not in (b"PX", b"EX"):
+                    return b"-ERR syntax error\r\n"
+                ttl = int(args[4]) / (1000 if unit == b"PX" else 1)
+            self.set(args[1], args[2], ttl)
+            return b"+OK\r\n"
+        if command == b"DEL" and len(args) > 1:
+            return b":%d\r\n" % sum(self._remove(key) for key in args[1:])
+        if command == b"RPUSH" and len(args) > 2:
+            length = self.rpush(args[1], args[2:])
+            return _WRONGTYPE if length is None else b":%d\r\n" % length
+        if command == b"PEXPIRE" and len(args) == 3:
+            return b":%d\r\n" % self.expire(args[1], int(args[2]) / 1000)
+        if command == b"LRANGE" and len(args) == 4:
+            items = self.get(args[1])
+            if items is not None and not isinstance(items, list):
+                return _WRONGTYPE
+            items = items or []
+            start, stop = int(args[2]), int(args[3])
+            if start < 0:
+                start = max(0, len(items) + start)
+            if stop < 0:
+                stop += len(items)
+            selected = items[start:stop + 1]
+            return b"*%d\r\n" % len(selected) + b"".join(b"$%d\r\n%s\r\n" % (len(item), item) for item in selected)
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command == b"DBSIZE":
+            return b":%d\r\n" % len(self._entries)
+        return b"-ERR unknown command or wrong number of arguments\r\n"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                writer.write(self.execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, SharedCacheError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f"Shared cache listening on {self.path} ({self.max_bytes} bytes)")
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(path: str, max_bytes: int):
+    """Process entry point for the cache server."""
+    try:
+        asyncio.run(CacheServer(path, max_bytes).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+class SharedCacheClient:
+    """
+    Async client for CacheServer with the `get` / `set(px=...)` / `delete` / `rpush` /
+    `pexpire` / `lrange` subset that RedisBackend uses. Connections are pooled per process. The caches are only caches, so
+    while the server is unreachable reads miss and writes are dropped instead of failing
+    the request.
+    """
+
+    def __init__(self, path: str, pool_size: int = 8, timeout: float = 1.0):
+        self.path = path
+        self.timeout = timeout
+        self.errors = 0
+        self._slots = asyncio.Semaphore(pool_size)
+        self._idle: list = []
+
+    async def _call(self, *args):
+        async with self._slots:
+            if self._idle:
+                reader, writer = self._idle.pop()
+            else:
+                reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), self.timeout)
+            try:
+                writer.write(_encode(args))
+                reply = await asyncio.wait_for(_read_reply(reader), self.timeout)
+            except BaseException:
+                # A half-read reply would desynchronise the connection; never reuse it
+                writer.close()
+                raise
+            self._idle.append((reader, writer))
+            return reply
+
+    async def _call_or_none(self, *args):
+        try:
+            return await self._call(*args)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, SharedCacheError, ValueError) as e:
+            # The connection was closed by _call, so the next call starts on a fresh one
+            self.errors += 1
+            logger.warning(f"Shared cache {args[0]} failed: {e!r}")
+            return None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._call_or_none("GET", key)
+
+    async def set(self, key: str, value, px: Optional[int] = None):
+        if px is None:
+            return await self._call_or_none("SET", key, value)
+        return await self._call_or_none("SET", key, value, "PX", px)
+
+    async def delete(self, *keys: str):
+        return await self._call_or_none("DEL", *keys)
+
+    async def rpush(self, key: str, *values) -> Optional[int]:
+        return await self._call_or_none("RPUSH", key, *values)
+
+    async def pexpire(self, key: str, px: int) -> Optional[int]:
+        return await self._call_or_none("PEXPIRE", key, px)
+
+    async def lrange(self, key: str, start: int, stop: int) -> Optional[list]:
+        return await self._call_or_none("LRANGE", key, start, stop)
+
+    async def ping(self) -> bool:
+        return await self._call_or_none("PING") == "PONG"
+
+
+_clients: dict = {}
+
+
+def shared_client(path: Optional[str] = None) -> SharedCacheClient:
+    """The process-wide client for `path` (SHARED_CACHE_SOCKET by default)."""
+    path = path or os.getenv("SHARED_CACHE_SOCKET", "data/cache.sock")
+    client = _clients.get(path)
+    if client is None:
+        client = _clients[path] = SharedCacheClient(path)
+    return client
+
+
+class LeaderLock:
+    """
+    Elects one worker on the host for singleton background work (prefetching,
+    pre-rendering) with a non-blocking flock. The lock is held until `release` or exit.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        lock_file = open(self.path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None or fcntl is None
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the shared cache server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="Serve the cache on a unix socket")
+    serve.add_argument("socket", nargs="?", default=os.getenv("SHARED_CACHE_SOCKET", "data/cache.sock"))
+    serve.add_argument("--max-bytes", type=int, default=int(os.getenv("SHARED_CACHE_MAX_BYTES", str(128 * 1024 * 1024))))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    run_server(args.socket, args.max_bytes)
+
+
+if __name__ == "__main__":
+    main()
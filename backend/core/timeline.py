@@ -0,0 +1,120 @@
+"""
+Columnar formatting of Open-Meteo hourly/daily blocks.
+
+Derived columns (condition text, day names, heroes) are computed in one vectorized pass
+over the parallel arrays and then zipped into the row dicts the frontend expects.
+"""
+import numpy as np
+
+from .dispatcher import HERO_KEYS, select_hero_indices
+from .hero_profiles import HERO_PROFILES
+from .weather_codes import WMO_WEATHER_CODES
+
+DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+# Condition text per WMO code, indexable by an array of codes
+_CONDITIONS = np.array([WMO_WEATHER_CODES.get(code, "Unknown") for code in range(100)] + ["Unknown"], dtype=object)
+_HERO_NAMES = np.array([HERO_PROFILES[key]['name'] for key in HERO_KEYS], dtype=object)
+
+
+def _column(block: dict, name: str, size: int) -> list:
+    values = block.get(name)
+    return values if values is not None and len(values) == size else [None] * size
+
+
+def _conditions(codes: list) -> np.ndarray:
+    array = np.asarray(codes, dtype=float)
+    index = np.where(np.isnan(array) | (array < 0) | (array > 99), 100, np.nan_to_num(array)).astype(np.intp)
+    return _CONDITIONS[index]
+
+
+def _day_names(dates: list) -> np.ndarray:
+    # 1970-01-01 was a Thursday (index 3)
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    return np.asarray(DAY_NAMES, dtype=object)[(days + 3) % 7]
+
+
+def format_hourly(hourly: dict) -> list:
+    times = hourly.get('time') or []
+    size = len(times)
+    if not size:
+        return []
+    codes = _column(hourly, 'weather_code', size)
+    temperature = _column(hourly, 'temperature_2m', size)
+    is_day = _column(hourly, 'is_day', size)
+    wind = _column(hourly, 'windspeed_10m', size)
+    heroes = _HERO_NAMES[select_hero_indices(codes, is_day, wind, temperature)]
+    conditions = _conditions(codes)
+    return [
+        {
+            'time': time,
+            'weather_code': code,
+            'condition': condition,
+            'temperature': temp,
+            'feelsLike': feels_like,
+            'humidity': humidity,
+            'precipitationProbability': precipitation_probability,
+            'windSpeed': wind_speed,
+            'isDay': day,
+            'hero': hero,
+        }
+        for time, code, condition, temp, feels_like, humidity, precipitation_probability, wind_speed, day, hero in zip(
+            times, codes, conditions.tolist(), temperature, _column(hourly, 'apparent_temperature', size),
+            _column(hourly, 'relative_humidity_2m', size), _column(hourly, 'precipitation_probability', size),
+            wind, is_day, heroes.tolist(),
+        )
+    ]
+
+
+def format_daily(daily: dict) -> list:
+    dates = daily.get('time') or []
+    size = len(dates)
+    if not size:
+        return []
+    codes = _column(daily, 'weather_code', size)
+    max_temp = _column(daily, 'temperature_2m_max', size)
+    wind = _column(daily, 'windspeed_10m_max', size)
+    # Daily heroes use daytime conditions at the day's peak temperature and wind
+    heroes = _HERO_NAMES[select_hero_indices(codes, [1] * size, wind, max_temp)]
+    return [
+        {
+            'date': date,
+            'day': day,
+            'weather_code': code,
+            'condition': condition,
+            'minTemp': min_temp,
+            'maxTemp': high,
+            'precipitation': precipitation,
+            'precipitationProbability': precipitation_probability,
+            'windSpeed': wind_speed,
+            'windDirection': wind_direction,
+            'hero': hero,
+        }
+        for date, day, code, condition, min_temp, high, precipitation, precipitation_probability, wind_speed, wind_direction, hero in zip(
+            dates, _day_names(dates).tolist(), codes, _conditions(codes).tolist(),
+            _column(daily, 'temperature_2m_min', size), max_temp, _column(daily, 'precipitation_sum', size),
+            _column(daily, 'precipitation_probability_max', size), wind,
+            _column(daily, 'winddirection_10m_dominant', size), heroes.tolist(),
+        )
+    ]
+
+
+def hero_timeline(hourly_rows: list, daily_rows: list) -> dict:
+    """Hourly heroes collapsed into contiguous segments, plus one hero per day."""
+    segments = []
+    for row in hourly_rows:
+        if segments and segments[-1]['hero'] == row['hero']:
+            segments[-1]['end'] = row['time']
+            segments[-1]['hours'] += 1
+        else:
+            segments.append({'hero': row['hero'], 'start': row['time'], 'end': row['time'], 'hours': 1})
+    return {
+        'hourly': segments,
+        'daily': [{'date': row['date'], 'hero': row['hero']} for row in daily_rows],
+    }
+
+
+def build_forecast_views(forecast: dict) -> dict:
+    """All derived forecast views; `Forecast.views` encodes them once per fetched forecast."""
+    hourly = format_hourly(forecast.get('hourly') or {})
+    daily = format_daily(forecast.get('daily') or {})
+    return {'hourly': hourly, 'daily': daily, 'timeline': hero_timeline(hourly, daily)}
@@ -0,0 +1,369 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional
+
+from .circuit_breaker import get_breaker
+from .http_client import upstream
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTS_MODEL = "tts-1"
+
+tts_breaker = get_breaker("openai_tts", slow_call_seconds=float(os.getenv("OPENAI_TTS_SLOW_SECONDS", "10")))
+
+
+def normalize_tts_text(text: str) -> str:
+    """Normalize text so trivially different renderings of a line share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+async def synthesize_speech(text: str, voice: str, speed: float = 1.0, model: str = DEFAULT_TTS_MODEL) -> bytes:
+    """Render speech with OpenAI and return the mp3 bytes. Fails fast while the TTS circuit is open."""
+    async with upstream.openai_slot():
+        response = await tts_breaker.call(upstream.openai.audio.speech.create, model=model, voice=voice, input=text, speed=speed)
+    return response.content
+
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz, ~26 ms)
+_SILENT_MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+
+
+async def fake_synthesize(text: str, voice: str, speed: float = 1.0, model: str = DEFAULT_TTS_MODEL) -> bytes:
+    """
+    Offline stand-in for synthesize_speech (TTS_BACKEND=fake) for load tests: waits
+    TTS_FAKE_LATENCY seconds and returns silence roughly as long as the line would be spoken.
+    """
+    await asyncio.sleep(float(os.getenv("TTS_FAKE_LATENCY", "0.5")))
+    seconds = max(1.0, len(text) / 15 / max(speed, 0.25))
+    return _SILENT_MP3_FRAME * int(seconds / 0.026)
+
+
+class TTSCache:
+    """
+    Content-addressed store for synthesized speech.
+
+    Files are named by a hash of (normalized text, voice, speed, model), so repeating a
+    line returns the existing file without an API call. Total size is bounded with LRU
+    eviction, and the index of sizes and access times is persisted across restarts.
+
+    The directory may be shared by several worker processes: a line another worker has
+    rendered is adopted from disk on lookup, and a lookup only returns a URL whose file
+    exists. Only one worker (the leader) should run `sweep` and save the index; handing a
+    line out refreshes its file's mtime, and the sweep takes access times and files
+    rendered by the other workers from the directory, so pins hold across workers.
+
+    Retention: lines not handed out for `max_age` seconds expire, and any line handed out
+    (or served) within the last `pin_seconds` is never evicted, so URLs in recent responses
+    stay valid. Evicted files are deleted by `sweep`, which also clears out mp3s older than
+    `max_age` left in `legacy_directory` by the old uuid-named renderer.
+    """
+
+    def __init__(
+        self,
+        directory: str = "static/tts",
+        url_prefix: str = "/static/tts",
+        index_path: str = "data/tts_index.json",
+        max_bytes: int = 512 * 1024 * 1024,
+        synthesize: Callable[..., Awaitable[bytes]] = synthesize_speech,
+        max_age: float = 7 * 24 * 3600,
+        pin_seconds: float = 900,
+        legacy_directory: Optional[str] = None,
+    ):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.synthesize = synthesize
+        self.max_age = max_age
+        self.pin_seconds = pin_seconds
+        self.legacy_directory = legacy_directory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.files_removed = 0
+        self.total_bytes = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._pending: dict = {}
+        # Keys dropped from the index whose files the sweeper has yet to delete
+        self._doomed: list = []
+        # Index changes not yet written; flushed by the sweeper rather than on every render
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def key(text: str, voice: str, speed: float = 1.0, model: str = DEFAULT_TTS_MODEL) -> str:
+        material = "\x1f".join((normalize_tts_text(text), voice, f"{float(speed):.2f}", model))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}.mp3"
+
+    def _load_index(self):
+        entries = {}
+        if self.index_path and os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read TTS index {self.index_path}: {e}")
+        # Reconcile with what is actually on disk
+        for filename in os.listdir(self.directory):
+            key, ext = os.path.splitext(filename)
+            if ext != ".mp3":
+                continue
+            if key not in entries:
+                stat = os.stat(os.path.join(self.directory, filename))
+                entries[key] = {"size": stat.st_size, "last_access": stat.st_mtime}
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_access"]):
+            if os.path.exists(self.path_for(key)):
+                self._entries[key] = entry
+                self.total_bytes += entry["size"]
+
+    def save_index(self, entries: Optional[dict] = None) -> bool:
+        if not self.index_path:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            # Per process, so a save racing another worker's never shares a partial file
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries if entries is None else entries, f)
+            os.replace(tmp_path, self.index_path)
+            return True
+        except OSError as e:
+            logger.error(f"Could not write TTS index {self.index_path}: {e}")
+            return False
+
+    async def flush_index(self):
+        """Write the index if it changed, serializing it off the event loop."""
+        if self._dirty:
+            # Lines rendered while the write runs mark the index dirty again
+            self._dirty = False
+            if not await asyncio.to_thread(self.save_index, dict(self._entries)):
+                self._dirty = True
+
+    def lookup(self, text: str, voice: str, speed: float = 1.0, model: str = DEFAULT_TTS_MODEL) -> Optional[str]:
+        """URL of an already rendered line, or None."""
+        key = self.key(text, voice, speed, model)
+        path = self.path_for(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Swept by the leader since this worker indexed it
+            self._forget(key)
+            return None
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None:
+            # Rendered by another worker sharing the directory
+            entry = self._entries[key] = {"size": stat.st_size, "last_access": now}
+            self.total_bytes += stat.st_size
+        entry["last_access"] = now
+        self._entries.move_to_end(key)
+        if stat.st_mtime < now - self.pin_seconds / 4:
+            # The leader's sweep reads access times from mtimes; refreshed now and then, not per lookup
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return self.url_for(key)
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size"]
+
+    def touch(self, key: str):
+        """Mark a line as referenced, e.g. when its file is served."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry["last_access"] = time.time()
+            self._entries.move_to_end(key)
+
+    async def get_or_create(self, text: str, voice: str, speed: float = 1.0, model: str = DEFAULT_TTS_MODEL) -> str:
+        """Return the URL for a line, rendering it only if it is not cached yet."""
+        url = self.lookup(text, voice, speed, model)
+        if url is not None:
+            self.hits += 1
+            return url
+        self.misses += 1
+        key = self.key(text, voice, speed, model)
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(key, normalize_tts_text(text), voice, speed, model))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    @timed("tts_render")
+    async def _render(self, key: str, text: str, voice: str, speed: float, model: str) -> str:
+        audio = await self.synthesize(text, voice, speed, model)
+        await asyncio.to_thread(self._write, key, audio)
+        self._entries[key] = {"size": len(audio), "last_access": time.time()}
+        self.total_bytes += len(audio)
+        self._dirty = True
+        return self.url_for(key)
+
+    def _write(self, key: str, audio: bytes):
+        path = self.path_for(key)
+        # Per process, so workers rendering the same line never share a partial file
+        tmp_path = f"{path}.{os.getpid()}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry["size"]
+        self._doomed.append(key)
+        self._dirty = True
+
+    def _evict(self):
+        pinned_after = time.time() - self.pin_seconds
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry["last_access"] > pinned_after:
+                # Everything left was handed out recently; stay over budget until it ages
+                break
+            self._drop(key)
+            self.evictions += 1
+
+    def _expire(self):
+        cutoff = time.time() - self.max_age
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry["last_access"] >= cutoff:
+                break
+            self._drop(key)
+            self.expirations += 1
+
+    def _legacy_files(self) -> list:
+        cutoff = time.time() - self.max_age
+        paths = []
+        with os.scandir(self.legacy_directory) as it:
+            for item in it:
+                if item.name.endswith(".mp3") and item.is_file() and item.stat().st_mtime < cutoff:
+                    paths.append(item.path)
+        return paths
+
+    @staticmethod
+    def _remove_files(paths: list) -> int:
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _scan(self) -> dict:
+        """key -> (size, mtime) for every rendered line in the directory."""
+        files = {}
+        with os.scandir(self.directory) as it:
+            for item in it:
+                key, ext = os.path.splitext(item.name)
+                if ext == ".mp3":
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue
+                    files[key] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def _reconcile(self, files: dict):
+        """Fold in lines rendered or handed out by other workers, and drop files already gone."""
+        entries = {}
+        for key, (size, mtime) in files.items():
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"size": size, "last_access": mtime}
+            else:
+                entry["last_access"] = max(entry["last_access"], mtime)
+            entries[key] = entry
+        self._entries = OrderedDict(sorted(entries.items(), key=lambda item: item[1]["last_access"]))
+        self.total_bytes = sum(entry["size"] for entry in entries.values())
+        self._dirty = True
+
+    async def sweep(self, batch_size: int = 100, pause: float = 0.05) -> int:
+        """
+        Expire old lines and delete evicted files. Deletions run off the event loop in
+        small batches with a pause in between, so a large backlog does not saturate the disk.
+        """
+        self._reconcile(await asyncio.to_thread(self._scan))
+        self._expire()
+        self._evict()
+        # A line may have been rendered again since it was dropped
+        paths = [self.path_for(key) for key in self._doomed if key not in self._entries]
+        self._doomed = []
+        if self.legacy_directory:
+            paths += await asyncio.to_thread(self._legacy_files)
+        removed = 0
+        for start in range(0, len(paths), batch_size):
+            removed += await asyncio.to_thread(self._remove_files, paths[start:start + batch_size])
+            await asyncio.sleep(pause)
+        if removed:
+            self.files_removed += removed
+            logger.info(f"TTS sweep removed {removed} files")
+        await self.flush_index()
+        return removed
+
+    async def run_sweeper(self, interval: float):
+        """Sweep now and then every `interval` seconds until cancelled."""
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"TTS sweep failed: {e!r}")
+            await asyncio.sleep(interval)
+
+    async def prerender(self, lines: Iterable[tuple]):
+        """Render (text, voice, speed) lines ahead of time, skipping any already cached."""
+        rendered = 0
+        for text, voice, speed in lines:
+            if self.lookup(text, voice, speed) is not None:
+                continue
+            try:
+                await self.get_or_create(text, voice, speed)
+                rendered += 1
+            except Exception as e:
+                logger.error(f"Pre-rendering TTS line failed: {e!r}")
+        await self.flush_index()
+        logger.info(f"Pre-rendered {rendered} TTS lines")
+        return rendered
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "files_removed": self.files_removed,
+            "pending_deletes": len(self._doomed),
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+tts_cache = TTSCache(
+    index_path=os.getenv("TTS_CACHE_INDEX", "data/tts_index.json"),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    synthesize=fake_synthesize if os.getenv("TTS_BACKEND", "openai") == "fake" else synthesize_speech,
+    max_age=float(os.getenv("TTS_CACHE_MAX_AGE", str(7 * 24 * 3600))),
+    pin_seconds=float(os.getenv("TTS_CACHE_PIN_SECONDS", "900")),
+    legacy_directory="static",
+)
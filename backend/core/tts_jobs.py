@@ -0,0 +1,254 @@
+import asyncio
+import itertools
+import logging
+import os
+import re
+import time
+from typing import Optional
+
+from .cache_backends import create_backend
+from .tts_cache import DEFAULT_TTS_MODEL, TTSCache, tts_cache
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0    # interactive chat replies
+PRIORITY_NORMAL = 1  # dashboard dialogue
+PRIORITY_LOW = 2     # batch and prefetch work
+
+# Job ids are TTS cache keys
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# How often a status poll checks the disk for a job queued by another worker
+REMOTE_POLL_SECONDS = 0.25
+
+
+class TTSJob:
+    """A queued speech render. The id is the TTS cache key, so the audio URL is known up front."""
+
+    __slots__ = ("id", "text", "voice", "speed", "model", "priority", "status", "url", "error",
+                 "created_at", "started_at", "finished_at", "done")
+
+    def __init__(self, job_id: str, text: str, voice: str, speed: float, model: str, priority: int):
+        self.id = job_id
+        self.text = text
+        self.voice = voice
+        self.speed = speed
+        self.model = model
+        self.priority = priority
+        self.status = "queued"
+        self.url = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = asyncio.Event()
+
+    def finish(self, status: str, url: Optional[str] = None, error: Optional[str] = None):
+        self.status = status
+        self.url = url
+        self.error = error
+        self.finished_at = time.time()
+        self.done.set()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "audioUrl": self.url,
+            "error": self.error,
+            "queuedMs": round(((self.started_at or time.time()) - self.created_at) * 1000, 1),
+            "renderMs": round((self.finished_at - self.started_at) * 1000, 1) if self.finished_at and self.started_at else None,
+        }
+
+
+class TTSQueueFull(Exception):
+    pass
+
+
+def audio_fields(job: Optional[TTSJob]) -> dict:
+    """
+    Response fields for a submitted job. The file name is the job id, so `audioUrl` is
+    known before the render finishes; `audioStatus` says whether it can be fetched yet.
+    """
+    if job is None:
+        return {"audioUrl": None, "audioJobId": None, "audioStatus": "unavailable"}
+    url = job.url or (tts_cache.url_for(job.id) if job.status != "failed" else None)
+    return {"audioUrl": url, "audioJobId": job.id, "audioStatus": job.status}
+
+
+class TTSJobQueue:
+    """
+    Background TTS rendering. Handlers `submit` a line and return immediately; a bounded
+    pool of workers renders jobs in priority order through the TTS cache. Identical lines
+    share one job, and lines already in the cache complete without queueing.
+
+    Jobs live in the process that queued them; their status is also written to `records`
+    (the shared cache backend under gunicorn), so a status poll that reaches another
+    worker can tell a job still rendering elsewhere from an unknown id.
+    """
+
+    def __init__(self, cache: TTSCache, workers: int = 4, max_queue: int = 1000, job_ttl: float = 600,
+                 inline_wait: float = 0.0, records=None):
+        self.cache = cache
+        self.records = records if records is not None else create_backend("tts-job:", 4 * 1024 * 1024)
+        # How long handlers may hold a response for the audio before returning the job id
+        self.inline_wait = inline_wait
+        self.worker_count = workers
+        self.max_queue = max_queue
+        self.job_ttl = job_ttl
+        self.jobs: dict = {}
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.running = 0
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: list = []
+        self._sequence = itertools.count()
+        self._record_writes: set = set()
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, text: str, voice: str, speed: float = 1.0, model: str = DEFAULT_TTS_MODEL,
+               priority: int = PRIORITY_NORMAL) -> TTSJob:
+        """Queue a line for rendering. Raises TTSQueueFull when the queue is at capacity."""
+        self._expire_jobs()
+        job_id = self.cache.key(text, voice, speed, model)
+        job = self.jobs.get(job_id)
+        if job is not None and job.status != "failed":
+            return job
+        job = TTSJob(job_id, text, voice, speed, model, priority)
+        url = self.cache.lookup(text, voice, speed, model)
+        if url is not None:
+            job.finish("done", url=url)
+        else:
+            if self._queue is None:
+                raise TTSQueueFull("TTS workers are not running")
+            try:
+                self._queue.put_nowait((priority, next(self._sequence), job))
+            except asyncio.QueueFull:
+                self.rejected += 1
+                raise TTSQueueFull("TTS queue is full")
+        self.jobs[job_id] = job
+        self._record(job)
+        return job
+
+    def _record(self, job: TTSJob):
+        """Publish the job's status for the other workers, in the background."""
+        task = asyncio.ensure_future(self._write_record(job.id, {"status": job.status, "error": job.error}))
+        self._record_writes.add(task)
+        task.add_done_callback(self._record_writes.discard)
+
+    async def _write_record(self, job_id: str, record: dict):
+        try:
+            await self.records.set(job_id, record, ttl=self.job_ttl)
+        except Exception as e:
+            logger.error(f"Recording TTS job {job_id} failed: {e!r}")
+
+    async def _read_record(self, job_id: str) -> Optional[dict]:
+        try:
+            return await self.records.get(job_id)
+        except Exception as e:
+            logger.error(f"Reading TTS job {job_id} failed: {e!r}")
+            return None
+
+    async def get(self, job_id: str) -> Optional[TTSJob]:
+        """
+        The job for `job_id`, or None if it is unknown. A job queued by another worker is
+        reported from the cache directory and the job records: `done` once the file
+        exists, `pending` while it renders, `failed` if the render failed.
+        """
+        job = self.jobs.get(job_id)
+        if job is not None or not _JOB_ID.match(job_id):
+            return job
+        job = TTSJob(job_id, "", "", 1.0, DEFAULT_TTS_MODEL, PRIORITY_NORMAL)
+        if os.path.exists(self.cache.path_for(job_id)):
+            job.finish("done", url=self.cache.url_for(job_id))
+            return job
+        record = await self._read_record(job_id)
+        if record is None:
+            # Mistyped, expired, or never queued
+            return None
+        if record.get("status") == "failed":
+            job.finish("failed", error=record.get("error"))
+        else:
+            job.status = "pending"
+        return job
+
+    async def wait(self, job: TTSJob, timeout: Optional[float] = None) -> TTSJob:
+        """Wait up to `timeout` seconds (default: `inline_wait`) for the job to finish."""
+        if timeout is None:
+            timeout = self.inline_wait
+        if job.status == "pending":
+            # Rendered elsewhere: watch for the file instead of the job's event
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(min(REMOTE_POLL_SECONDS, deadline - time.monotonic()))
+                if os.path.exists(self.cache.path_for(job.id)):
+                    job.finish("done", url=self.cache.url_for(job.id))
+                    break
+                record = await self._read_record(job.id)
+                if record is not None and record.get("status") == "failed":
+                    job.finish("failed", error=record.get("error"))
+                    break
+            return job
+        if timeout > 0 and not job.done.is_set():
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self.running += 1
+            try:
+                url = await self.cache.get_or_create(job.text, job.voice, job.speed, job.model)
+                job.finish("done", url=url)
+                self.completed += 1
+            except asyncio.CancelledError:
+                job.finish("failed", error="cancelled")
+                raise
+            except Exception as e:
+                logger.error(f"TTS job {job.id} failed: {e!r}")
+                job.finish("failed", error=str(e) or type(e).__name__)
+                self.failed += 1
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+                self._record(job)
+
+    def _expire_jobs(self):
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "workers": len(self._workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "tracked_jobs": len(self.jobs),
+        }
+
+
+tts_jobs = TTSJobQueue(
+    tts_cache,
+    workers=int(os.getenv("TTS_WORKERS", "4")),
+    max_queue=int(os.getenv("TTS_QUEUE_SIZE", "1000")),
+    inline_wait=float(os.getenv("TTS_INLINE_WAIT", "0")),
+)
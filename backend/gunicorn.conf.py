@@ -0,0 +1,58 @@
+"""
+Multi-worker deployment: gunicorn -c gunicorn.conf.py main:app
+
+Runs WEB_CONCURRENCY uvicorn workers. Before forking them the master starts the shared
+cache server (core/shared_cache.py) on SHARED_CACHE_SOCKET, and the workers use it for
+the forecast, dialogue and session caches (CACHE_BACKEND=shared), so a location fetched by
+one worker is cached for all of them. Geocoding (the mmap'd index and the learned file)
+and rendered audio (static/tts) are shared through the filesystem. One worker, elected
+with a lock file, runs the prefetcher, TTS pre-rendering and the TTS sweeper; the other
+workers send it their location counts through the cache server.
+
+Set CACHE_BACKEND=redis to share caches through Redis instead (e.g. across hosts); no
+cache server is started then.
+"""
+import multiprocessing
+import os
+import time
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count()))))
+worker_class = "uvicorn_worker.UvicornWorker"
+# Dashboard streams and chat can run for a while; live updates send heartbeats
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = None
+
+os.environ.setdefault("CACHE_BACKEND", "shared")
+SHARED_CACHE_SOCKET = os.environ.setdefault("SHARED_CACHE_SOCKET", "data/cache.sock")
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+_cache_server = None
+
+
+def on_starting(server):
+    global _cache_server
+    if os.environ["CACHE_BACKEND"] != "shared":
+        return
+    from core.shared_cache import run_server
+
+    if os.path.exists(SHARED_CACHE_SOCKET):
+        os.unlink(SHARED_CACHE_SOCKET)
+    _cache_server = multiprocessing.Process(
+        target=run_server, args=(SHARED_CACHE_SOCKET, SHARED_CACHE_MAX_BYTES), name="shared-cache", daemon=True)
+    _cache_server.start()
+    # Workers connect as soon as they boot; don't fork them before the socket exists
+    deadline = time.monotonic() + 10
+    while not os.path.exists(SHARED_CACHE_SOCKET):
+        if not _cache_server.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError(f"Shared cache server did not start on {SHARED_CACHE_SOCKET}")
+        time.sleep(0.01)
+    server.log.info(f"Shared cache server (pid {_cache_server.pid}) on {SHARED_CACHE_SOCKET}")
+
+
+def on_exit(server):
+    if _cache_server is not None:
+        _cache_server.terminate()
+        _cache_server.join(5)
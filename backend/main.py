@@ -1,191 +1,337 @@
+import time
+
+# Cold start is measured from here; see StartupTimer
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import os
 import re
-import uuid
-import requests
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
-from datetime import datetime
 import logging
 
-# Import our custom modules
-from core.hero_profiles import HERO_PROFILES
-from core.dispatcher import select_hero
-
-# Import routes
-from routes.geocode import router as geocode_router
-from routes.chat import router as chat_router
-
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize FastAPI app
-app = FastAPI(title="DC Weather App API", version="1.0.0")
-
-# Configure CORS for production
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",  # Local development
-        "https://https://frontend-d30imq72n-setteruks-projects.vercel.app",  # Replace with your Vercel domain
-        "https://*.vercel.app",  # Allow all Vercel subdomains
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Mount static files for audio
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# Include routers
-app.include_router(geocode_router)
-app.include_router(chat_router)
+# Import our custom modules
+from core.hero_profiles import HERO_PROFILES, DEFAULT_FALLBACK_DIALOGUE
+from core.dispatcher import select_hero
+from core.weather_codes import WMO_WEATHER_CODES
+from core.forecast_model import Forecast
+from core.fastjson import FastJSONResponse, dumps
+from core.http_client import upstream
+from core import llm
+from core.pipeline import Pipeline, Stage
+from core.forecast_cache import forecast_cache_from_env
+from core.geocoder import geocoder, normalize_name
+from core.singleflight import SingleFlight
+from core.tts_cache import tts_cache
+from core.audio_files import AudioStaticFiles
+from core.tts_jobs import tts_jobs, audio_fields, TTSQueueFull, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from core.dialogue_cache import dialogue_cache
+from core.sessions import sessions
+from core.prefetch import Prefetcher, popularity
+from core.ratelimit import TokenBucket
+from core.live import LiveHub
+from core.admission import admission, Rejected, retry_after_header
+from core.shared_cache import LeaderLock
+from core.circuit_breaker import breaker_states
+from core.metrics import registry, timed, stats_collector, MetricsMiddleware, StartupTimer, HTTP_IN_FLIGHT
 
-# --- Create a directory for static files (audio) and mount it ---
-os.makedirs("static", exist_ok=True)
+# Import routes
+from routes.geocode import router as geocode_router, geocode_flight, suggest_flight
+from routes.chat import router as chat_router, chat_prerender_lines, chat_prompts, chat_hero_key
+from routes.audio import router as audio_router
+from routes.debug import router as debug_router
+
+
+startup = StartupTimer(IMPORT_STARTED)
+
+# With several workers on a host, one of them runs the singleton background work
+leader = LeaderLock(os.getenv("WORKER_LEADER_LOCK", "data/leader.lock"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled upstream client per worker, closed on shutdown
+    await upstream.start()
+    await tts_jobs.start()
+    # Built off the event loop, so the first autocomplete request doesn't stall the others
+    prefix_task = asyncio.create_task(geocoder.load_prefix_index())
+    sweeper_task = None
+    prerender_task = None
+    prefetch_task = None
+    if leader.acquire():
+        # One sweeper per host: it evicts by the shared directory, not just this worker's index
+        sweeper_task = asyncio.create_task(tts_cache.run_sweeper(float(os.getenv("TTS_SWEEP_INTERVAL", "300"))))
+        if os.getenv("TTS_PRERENDER", "0") == "1":
+            # Render every canned line once so outages and repeats never hit the TTS API
+            prerender_task = asyncio.create_task(tts_cache.prerender(fallback_prerender_lines() + chat_prerender_lines()))
+        if os.getenv("PREFETCH_ENABLED", "1") == "1":
+            prefetch_task = asyncio.create_task(prefetcher.run())
+    # Every worker hands its location counts to the leader's prefetcher through the shared cache
+    popularity_task = asyncio.create_task(popularity.run_sync(merge=leader.held)) if popularity.shared is not None else None
+    startup.mark("ready")
+    try:
+        yield
+    finally:
+        live_hub.close()
+        if popularity_task is not None:
+            popularity_task.cancel()
+            await popularity.flush()
+        if prefetch_task is not None:
+            prefetch_task.cancel()
+        if prerender_task is not None:
+            prerender_task.cancel()
+        if sweeper_task is not None:
+            sweeper_task.cancel()
+        prefix_task.cancel()
+        await tts_jobs.stop()
+        if sweeper_task is not None:
+            # Only the leader's index covers the whole directory
+            tts_cache.save_index()
+        await upstream.close()
+        leader.release()
+
+
+router = APIRouter()
+
+async def rejected_handler(request: Request, exc: Rejected):
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers={"Retry-After": retry_after_header(exc.retry_after)})
 
 
 # --- API Clients and Constants ---
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-GEOCODING_API_BASE = "https://geocoding-api.open-meteo.com/v1/search"
-REVERSE_GEOCODING_API_BASE = "https://api.bigdatacloud.net/data/reverse-geocode-client"
-WEATHER_API_BASE = "https://api.open-meteo.com/v1/forecast"
-WMO_WEATHER_CODES = {
-    0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast", 45: "Fog", 48: "Depositing rime fog",
-    51: "Light drizzle", 53: "Moderate drizzle", 55: "Dense drizzle", 56: "Light freezing drizzle", 57: "Dense freezing drizzle",
-    61: "Slight rain", 63: "Moderate rain", 65: "Heavy rain", 66: "Light freezing rain", 67: "Heavy freezing rain",
-    71: "Slight snow fall", 73: "Moderate snow fall", 75: "Heavy snow fall", 77: "Snow grains",
-    80: "Slight rain showers", 81: "Moderate rain showers", 82: "Violent rain showers",
-    85: "Slight snow showers", 86: "Heavy snow showers", 95: "Thunderstorm", 96: "Thunderstorm with slight hail", 99: "Thunderstorm with heavy hail"
-}
+# Overridable so benchmarks can point the app at local stand-ins (OpenAI reads OPENAI_BASE_URL)
+GEOCODING_API_BASE = os.getenv("GEOCODING_API_BASE", "https://geocoding-api.open-meteo.com/v1/search")
+REVERSE_GEOCODING_API_BASE = os.getenv("REVERSE_GEOCODING_API_BASE", "https://api.bigdatacloud.net/data/reverse-geocode-client")
+WEATHER_API_BASE = os.getenv("WEATHER_API_BASE", "https://api.open-meteo.com/v1/forecast")
 
 # --- Pydantic Models ---
 class WeatherRequest(BaseModel):
     location: Optional[str] = None
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    # The user's question; older clients send the whole conversation in chat_history instead
+    message: Optional[str] = None
+    # Server-side sessions are kept only for clients that send a session_id or ask for a new one
+    session_id: Optional[str] = None
+    new_session: Optional[bool] = None
     chat_history: Optional[list] = []
 
 
+class DashboardLocation(BaseModel):
+    location: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    include_dialogue: Optional[bool] = None
+
+class BatchWeatherRequest(BaseModel):
+    locations: List[DashboardLocation] = Field(..., min_length=1, max_length=50)
+    include_dialogue: bool = False
+    include_audio: bool = False
+    include_hourly: bool = False
+
+
 # --- Helper Functions ---
-def get_location_coords(location_name: str):
-    url = f"{GEOCODING_API_BASE}?name={location_name}&count=1&format=json"
-    response = requests.get(url)
-    if response.status_code == 200 and response.json().get('results'):
-        return response.json()['results'][0]
+@timed("get_location_coords")
+async def get_location_coords(location_name: str):
+    # Local index first; Open-Meteo only on a miss, and remember what it returns
+    local_result = geocoder.forward(location_name)
+    if local_result:
+        return local_result
+    params = {"name": location_name, "count": 1, "format": "json"}
+    data = await upstream.get_json(GEOCODING_API_BASE, params=params)
+    if data and data.get('results'):
+        geocoder.learn_forward(location_name, data['results'][0])
+        return data['results'][0]
     return None
 
-def get_location_name_from_coords(lat: float, lon: float):
-    url = f"{REVERSE_GEOCODING_API_BASE}?latitude={lat}&longitude={lon}&localityLanguage=en"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        return f"{data.get('city', '')}, {data.get('countryName', '')}"
+@timed("get_location_name_from_coords")
+async def get_location_name_from_coords(lat: float, lon: float):
+    local_name = geocoder.reverse(lat, lon)
+    if local_name:
+        return local_name
+    params = {"latitude": lat, "longitude": lon, "localityLanguage": "en"}
+    data = await upstream.get_json(REVERSE_GEOCODING_API_BASE, params=params)
+    if data is not None:
+        location_name = f"{data.get('city', '')}, {data.get('countryName', '')}"
+        if data.get('city'):
+            geocoder.learn_reverse(lat, lon, location_name)
+        return location_name
     return "Current Location"
 
 
-def get_full_weather_forecast(lat: float, lon: float):
+async def fetch_weather_forecast(lat: float, lon: float):
+    forecasts = await fetch_weather_forecasts([(lat, lon)])
+    return forecasts[0]
+
+async def fetch_weather_forecasts(points: list):
+    """Fetch forecasts for several (lat, lon) points in one Open-Meteo request."""
     # Enhanced parameters to get more comprehensive weather data
     params = {
-        "latitude": lat, 
-        "longitude": lon, 
+        "latitude": ",".join(str(lat) for lat, _ in points), 
+        "longitude": ",".join(str(lon) for _, lon in points), 
         "current": "temperature_2m,is_day,weather_code,wind_speed_10m,relative_humidity_2m,apparent_temperature,pressure_msl,precipitation,cloud_cover",
         "daily": "weather_code,temperature_2m_max,temperature_2m_min,precipitation_sum,precipitation_probability_max,windspeed_10m_max,winddirection_10m_dominant",
-        "hourly": "temperature_2m,weather_code,relative_humidity_2m,apparent_temperature,precipitation_probability,windspeed_10m",
+        "hourly": "temperature_2m,weather_code,relative_humidity_2m,apparent_temperature,precipitation_probability,windspeed_10m,is_day",
         "timezone": "auto", 
         "forecast_days": 7
     }
-    response = requests.get(WEATHER_API_BASE, params=params)
-    if response.status_code == 200:
-        return response.json()
-    return None
-
-# Set up logging to file
-logging.basicConfig(filename='backend_error.log', level=logging.ERROR, format='%(asctime)s %(levelname)s %(message)s')
-
-def ask_gpt(prompt: str):
+    data = await upstream.get_json(WEATHER_API_BASE, params=params)
+    if data is None:
+        return [None] * len(points)
+    # Open-Meteo returns a list for multiple locations and a single object otherwise
+    forecasts = [Forecast.from_response(item) for item in (data if isinstance(data, list) else [data])]
+    for forecast in forecasts:
+        # Formatted hourly/daily rows and the hero timeline are encoded once and cached with the forecast
+        forecast.views
+    return forecasts
+
+# Forecasts are cached per grid cell; see core/forecast_cache.py
+forecast_cache = forecast_cache_from_env(fetch_weather_forecast, fetch_many=fetch_weather_forecasts, decode=Forecast.coerce)
+
+@timed("get_full_weather_forecast")
+async def get_full_weather_forecast(lat: float, lon: float):
+    return await forecast_cache.get(lat, lon)
+
+DASHBOARD_SYSTEM_PROMPT = "You are a helpful assistant embodying a DC Comics character."
+
+def dashboard_messages(prompt: str):
+    return [{"role": "system", "content": DASHBOARD_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+@timed("ask_gpt")
+async def ask_gpt(prompt: str, cache_key: Optional[str] = None):
     try:
-        response = client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "system", "content": "You are a helpful assistant embodying a DC Comics character."}, {"role": "user", "content": prompt}], temperature=0.7, max_tokens=250)
-        return response.choices[0].message.content.strip()
+        if cache_key is None:
+            return await llm.complete(dashboard_messages(prompt), max_tokens=250)
+        # Near-identical prompts (same hero, place, weather bucket and question) share completions
+        return await dialogue_cache.get_or_generate(cache_key, lambda: llm.complete(dashboard_messages(prompt), max_tokens=250))
     except Exception as e:
-        print(f"OpenAI API Error (GPT): {e}")
         logging.error(f"OpenAI API Error (GPT): {e}")
         # Generate fallback dialogue based on hero and weather
         return generate_fallback_dialogue(prompt)
 
+async def stream_gpt(prompt: str, cache_key: Optional[str] = None):
+    """Yield the dialogue as it is generated; falls back to canned dialogue on error."""
+    if cache_key is not None:
+        cached = await dialogue_cache.lookup(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    try:
+        async for delta in llm.stream_completion(dashboard_messages(prompt), max_tokens=250):
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        logging.error(f"OpenAI API Error (GPT stream): {e}")
+        if not parts:
+            yield generate_fallback_dialogue(prompt)
+        return
+    if cache_key is not None and parts:
+        await dialogue_cache.add(cache_key, "".join(parts).strip())
+
 def generate_fallback_dialogue(prompt: str):
     """Generate basic hero dialogue when OpenAI API is unavailable"""
-    if "Batman" in prompt:
-        return "Citizen, the weather conditions are clear for tonight's patrol. Stay vigilant."
-    elif "Superman" in prompt:
-        return "The sun's energy is strong today, perfect for keeping Metropolis safe."
-    elif "Wonder Woman" in prompt:
-        return "The gods have blessed us with fair weather today."
-    elif "Aquaman" in prompt:
-        return "The ocean's power flows through the rain. Atlantis stands strong."
-    elif "Flash" in prompt:
-        return "Speed force is optimal today! Perfect conditions for a quick run."
-    else:
-        return "The Watchtower systems are experiencing temporary issues. Weather data is still available, but AI responses are limited."
+    for hero_profile in HERO_PROFILES.values():
+        if hero_profile['name'] in prompt:
+            return hero_profile['fallback_dialogue']
+    return DEFAULT_FALLBACK_DIALOGUE
+
+def fallback_prerender_lines():
+    """(text, voice, speed) for every fallback line the dashboard can speak."""
+    lines = [(DEFAULT_FALLBACK_DIALOGUE, "onyx", 1.0)]
+    for hero_profile in HERO_PROFILES.values():
+        lines.append((hero_profile['fallback_dialogue'], hero_profile.get("voice", "onyx"), 1.0))
+    return lines
 
 # DALL-E image generation removed since 3D models are used instead
 
-def generate_tts_audio(text: str, voice: str = "onyx"):
-    """Generates speech from text and saves it as a static file."""
+def enqueue_tts_audio(text: str, voice: str = "onyx", priority: int = PRIORITY_NORMAL):
+    """Queues speech for `text` on the TTS workers; lines spoken before complete immediately."""
     try:
-        filename = f"{uuid.uuid4()}.mp3"
-        speech_file_path = os.path.join("static", filename)
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text
-        )
-        response.stream_to_file(speech_file_path)
-        return f"/static/{filename}"
-    except Exception as e:
-        print(f"OpenAI API Error (TTS): {e}")
-        logging.error(f"OpenAI API Error (TTS): {e}")
+        return tts_jobs.submit(text, voice, priority=priority)
+    except TTSQueueFull as e:
+        logging.error(f"TTS queue error: {e}")
         return None
 
+@timed("generate_tts_audio")
+async def generate_tts_audio(text: str, voice: str = "onyx"):
+    """Generates speech from text and waits for the file. Used where the caller is already streaming."""
+    job = enqueue_tts_audio(text, voice, PRIORITY_HIGH)
+    if job is None:
+        return None
+    await tts_jobs.wait(job, STAGE_TIMEOUTS["audio"])
+    return job.url
+
 # --- API Endpoints ---
-@app.get("/")
+@router.get("/")
 async def root():
     return {"message": "DC Weather App API is running!"}
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "DC Weather App API"}
+    # Open circuits mean we are serving fallbacks (canned lines, cached forecasts), not failing
+    breakers = breaker_states()
+    degraded = any(state["state"] != "closed" for state in breakers.values())
+    return {"status": "degraded" if degraded else "healthy", "service": "DC Weather App API", "breakers": breakers}
+
+@router.get("/api/cache/stats")
+async def cache_stats():
+    return component_stats()
 
-@app.post("/api/get-weather-dashboard")
-def get_weather_dashboard_endpoint(request: WeatherRequest):
-    coords = None
-    location_display_name = "an unknown location"
+def component_stats():
+    return {
+        "forecast": forecast_cache.stats(),
+        "geocoder": geocoder.stats(),
+        "tts": tts_cache.stats(),
+        "tts_jobs": tts_jobs.stats(),
+        "dialogue": dialogue_cache.stats(),
+        "prompts": chat_prompts.stats(),
+        "sessions": sessions.stats(),
+        "prefetch": prefetcher.stats(),
+        "live": live_hub.stats(),
+        "admission": admission.stats(),
+        "startup": {**startup.stats(), "leader": leader.held},
+        "singleflight": {"dashboard": dashboard_flight.stats(), "geocode": geocode_flight.stats(), "suggest": suggest_flight.stats()},
+    }
+
+# Component stats (hit ratios, queue depths, in-flight calls) become gauges on /metrics
+registry.register_collector(stats_collector("app", component_stats, label="component"))
 
+@router.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request, stage, upstream, cache and token metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+async def resolve_coords(request: WeatherRequest):
     if request.latitude is not None and request.longitude is not None:
-        coords = {"latitude": request.latitude, "longitude": request.longitude}
-        location_display_name = get_location_name_from_coords(request.latitude, request.longitude)
-    elif request.location:
-        location_data = get_location_coords(request.location)
+        return {"latitude": request.latitude, "longitude": request.longitude}
+    if request.location:
+        location_data = await get_location_coords(request.location)
         if not location_data:
             raise HTTPException(status_code=404, detail=f"Location '{request.location}' not found.")
-        coords = location_data
-        location_display_name = coords.get('name', request.location)
-    else:
-        raise HTTPException(status_code=400, detail="Either location name or coordinates must be provided.")
+        return location_data
+    raise HTTPException(status_code=400, detail="Either location name or coordinates must be provided.")
 
-    full_weather_data = get_full_weather_forecast(coords['latitude'], coords['longitude'])
-    if not full_weather_data:
-        raise HTTPException(status_code=500, detail="Could not retrieve weather data.")
+async def resolve_location_name(request: WeatherRequest, coords: dict):
+    if request.latitude is not None and request.longitude is not None:
+        return await get_location_name_from_coords(request.latitude, request.longitude)
+    return coords.get('name', request.location)
 
-    current_weather = full_weather_data.get('current', {})
+def get_current_weather(full_weather_data: dict):
+    current_weather = dict(full_weather_data.get('current', {}))
     current_weather['condition_text'] = WMO_WEATHER_CODES.get(current_weather.get('weather_code', 0), 'Unknown')
+    return current_weather
+
+def map_current_weather(current_weather: dict):
     # Map to frontend expected keys with enhanced Open-Meteo data
-    mapped_current_weather = {
+    return {
         'temperature': current_weather.get('temperature_2m'),
         'condition': current_weather.get('condition_text'),
         'humidity': current_weather.get('relative_humidity_2m'),
@@ -200,12 +346,41 @@ def get_weather_dashboard_endpoint(request: WeatherRequest):
         'cloudCover': current_weather.get('cloud_cover'),
         'isDay': current_weather.get('is_day'),
     }
-    
-    hero_profile = select_hero(current_weather)
 
-    user_query = request.chat_history[-1]['content'] if request.chat_history and len(request.chat_history) > 0 else "Give me a weather report."
-    
-    master_prompt = f"""
+def get_user_query(request: WeatherRequest):
+    if request.message:
+        return request.message
+    return request.chat_history[-1]['content'] if request.chat_history and len(request.chat_history) > 0 else "Give me a weather report."
+
+# The part of the dashboard a follow-up chat needs
+SESSION_WEATHER_KEYS = ('temperature', 'condition', 'humidity', 'windSpeed')
+
+async def dashboard_session(request: WeatherRequest) -> Optional[tuple]:
+    """The request's (session id, session), or None if the client neither sent an id nor asked for a session"""
+    if not (request.session_id or request.new_session):
+        return None
+    return await sessions.load(request.session_id)
+
+async def remember_dashboard(session: Optional[tuple], request: WeatherRequest, location: dict, hero_profile: dict,
+                             current_weather: dict, dialogue: Optional[str]):
+    """Store the hero, place and weather (and the hero's line) so chat requests can send only the message"""
+    if session is None:
+        return
+    session_id, state = session
+    turns = []
+    if request.message or request.chat_history:
+        turns.append({"role": "user", "content": get_user_query(request)})
+    if dialogue:
+        turns.append({"role": "assistant", "content": dialogue})
+    context = {
+        "hero": chat_hero_key(hero_profile['name']),
+        "location": location,
+        "weather": {key: current_weather.get(key) for key in SESSION_WEATHER_KEYS},
+    }
+    await sessions.update(session_id, state, turns, context)
+
+def build_master_prompt(hero_profile: dict, location_display_name: str, current_weather: dict, user_query: str):
+    return f"""
     You are {hero_profile['name']}. Your mission is to act as a weather commentator.
     **Your Persona:** {hero_profile['persona']}
     **Location:** {location_display_name}
@@ -213,39 +388,383 @@ def get_weather_dashboard_endpoint(request: WeatherRequest):
     **User's Latest Message:** "{user_query}"
     Based on the user's message and the weather, provide a brief, in-character response.
     """
-    dialogue = ask_gpt(master_prompt)
+
+def ndjson(event: dict):
+    return dumps(event) + b"\n"
+
+# Per-stage timeouts (seconds) for the dashboard pipeline
+STAGE_TIMEOUTS = {
+    "coords": 10.0,
+    "location_name": 3.0,
+    "forecast": 10.0,
+    "dialogue": 15.0,
+    "audio": 15.0,
+}
+
+async def _forecast_stage(ctx):
+    full_weather_data = await get_full_weather_forecast(ctx['coords']['latitude'], ctx['coords']['longitude'])
+    if not full_weather_data:
+        raise HTTPException(status_code=500, detail="Could not retrieve weather data.")
+    return full_weather_data
+
+async def _weather_stage(ctx):
+    current_weather = get_current_weather(ctx['forecast'])
+    return {"current": current_weather, "hero": select_hero(current_weather)}
+
+async def _views_stage(ctx):
+    return ctx['forecast'].views
+
+def _dialogue_prompt(ctx):
+    weather = ctx['weather']
+    return build_master_prompt(weather['hero'], ctx['location_name'], weather['current'], get_user_query(ctx['request']))
+
+def dialogue_cache_key(hero_profile: dict, location_display_name: str, current_weather: dict, request: WeatherRequest):
+    return dialogue_cache.key(hero_profile['name'], location_display_name, current_weather.get('temperature_2m'),
+                              current_weather.get('weather_code'), get_user_query(request))
+
+async def _dialogue_stage(ctx):
+    weather = ctx['weather']
+    cache_key = dialogue_cache_key(weather['hero'], ctx['location_name'], weather['current'], ctx['request'])
+    return await ask_gpt(_dialogue_prompt(ctx), cache_key)
+
+async def _audio_stage(ctx):
+    job = enqueue_tts_audio(ctx['dialogue'], ctx['weather']['hero'].get("voice", "onyx"))
+    if job is not None:
+        await tts_jobs.wait(job)
+    return job
+
+def dashboard_stages(include_dialogue: bool = True):
+    """
+    The dashboard as a dependency graph. Reverse geocoding and the forecast only need the
+    coordinates, so they run concurrently; forecast formatting runs alongside the dialogue.
+    """
+    stages = [
+        Stage("coords", lambda ctx: resolve_coords(ctx['request']), timeout=STAGE_TIMEOUTS["coords"]),
+        Stage("location_name", lambda ctx: resolve_location_name(ctx['request'], ctx['coords']), deps=["coords"],
+              timeout=STAGE_TIMEOUTS["location_name"], fallback="Current Location"),
+        Stage("forecast", _forecast_stage, deps=["coords"], timeout=STAGE_TIMEOUTS["forecast"]),
+        Stage("weather", _weather_stage, deps=["forecast"]),
+        Stage("views", _views_stage, deps=["forecast"]),
+    ]
+    if include_dialogue:
+        stages += [
+            Stage("dialogue", _dialogue_stage, deps=["weather", "location_name"], timeout=STAGE_TIMEOUTS["dialogue"],
+                  fallback=lambda ctx: generate_fallback_dialogue(_dialogue_prompt(ctx))),
+            # Audio renders in the background; the response carries its job id
+            Stage("audio", _audio_stage, deps=["dialogue"], timeout=STAGE_TIMEOUTS["audio"], fallback=None),
+        ]
+    return stages
+
+dashboard_pipeline = Pipeline(dashboard_stages(), name="dashboard")
+dashboard_weather_pipeline = Pipeline(dashboard_stages(include_dialogue=False), name="dashboard_weather")
+
+# Identical dashboard requests arriving together share one pipeline run
+dashboard_flight = SingleFlight("dashboard")
+COORD_FLIGHT_DECIMALS = 3
+
+def dashboard_flight_key(pipeline: Pipeline, request: WeatherRequest):
+    if request.latitude is not None and request.longitude is not None:
+        place = (round(request.latitude, COORD_FLIGHT_DECIMALS), round(request.longitude, COORD_FLIGHT_DECIMALS))
+    else:
+        place = normalize_name(request.location or "")
+    return (id(pipeline), place, normalize_name(get_user_query(request)))
+
+async def run_dashboard_pipeline(pipeline: Pipeline, request: WeatherRequest):
+    result = await dashboard_flight.do(dashboard_flight_key(pipeline, request), lambda: pipeline.run(request=request))
+    popularity.record(result['coords']['latitude'], result['coords']['longitude'], result['location_name'])
+    return result
+
+# --- Prefetching ---
+# Popular locations are warmed shortly after each forecast update (Open-Meteo refreshes
+# current conditions every 15 minutes) so the first visitor finds forecast, dialogue and audio cached
+PREFETCH_DIALOGUE = os.getenv("PREFETCH_DIALOGUE", "1") == "1"
+PREFETCH_MAX_LIVE_REQUESTS = int(os.getenv("PREFETCH_MAX_LIVE_REQUESTS", "20"))
+
+async def prefetch_location(location: dict, bucket: TokenBucket):
+    """Warm one location: its forecast, then the default dialogue variants and their audio."""
+    latitude, longitude = location['latitude'], location['longitude']
+    forecast = await forecast_cache.warm(latitude, longitude, ahead=60, limiter=bucket)
+    if forecast is None or not PREFETCH_DIALOGUE:
+        return
+    location_name = location['name']
+    if not location_name:
+        await bucket.acquire()
+        location_name = await get_location_name_from_coords(latitude, longitude)
+    request = WeatherRequest(latitude=latitude, longitude=longitude)
+    current_weather = get_current_weather(forecast)
+    hero_profile = select_hero(current_weather)
+    cache_key = dialogue_cache_key(hero_profile, location_name, current_weather, request)
+    prompt = build_master_prompt(hero_profile, location_name, current_weather, get_user_query(request))
+    for _ in range(await dialogue_cache.missing_variants(cache_key)):
+        await bucket.acquire()
+        dialogue = await ask_gpt(prompt, cache_key)
+        await bucket.acquire()
+        enqueue_tts_audio(dialogue, hero_profile.get("voice", "onyx"), PRIORITY_LOW)
+
+prefetcher = Prefetcher(
+    popularity,
+    prefetch_location,
+    # Shared by every prefetch upstream call (forecast, reverse geocode, chat, TTS)
+    TokenBucket(rate=float(os.getenv("PREFETCH_RATE", "1")), burst=float(os.getenv("PREFETCH_BURST", "5"))),
+    top_k=int(os.getenv("PREFETCH_TOP_K", "100")),
+    period=float(os.getenv("PREFETCH_PERIOD_SECONDS", "900")),
+    offset=float(os.getenv("PREFETCH_OFFSET_SECONDS", "60")),
+    jitter=float(os.getenv("PREFETCH_JITTER_SECONDS", "60")),
+    busy=lambda: HTTP_IN_FLIGHT.value() >= PREFETCH_MAX_LIVE_REQUESTS,
+)
+
+@router.post("/api/get-weather-dashboard")
+async def get_weather_dashboard_endpoint(request: WeatherRequest, response: Response, http_request: Request):
+    admission.check_rate(http_request, "expensive")
+    headers = {}
+    try:
+        async with admission.slot("expensive"):
+            result = await run_dashboard_pipeline(dashboard_pipeline, request)
+    except Rejected:
+        # GPT/TTS capacity is saturated: answer now with the weather alone instead of queueing
+        headers["X-Degraded"] = "weather-only"
+        async with admission.slot("cheap"):
+            result = await run_dashboard_pipeline(dashboard_weather_pipeline, request)
+    dialogue = result.results.get('dialogue')
+
+    coords = result['coords']
+    hero_profile = result['weather']['hero']
+    location = {"name": result['location_name'], "latitude": coords['latitude'], "longitude": coords['longitude']}
+    current_weather = map_current_weather(result['weather']['current'])
+    session = await dashboard_session(request)
+    await remember_dashboard(session, request, location, hero_profile, current_weather, dialogue)
 
     # Skip DALL-E image generation since we have 3D models
     image_url = None
 
-    # Generate the audio for the dialogue
-    audio_url = generate_tts_audio(dialogue, hero_profile.get("voice", "onyx"))
-
-
-    daily_forecast = full_weather_data.get('daily', {})
-    formatted_daily = []
-    if daily_forecast.get('time'):
-        for i, date in enumerate(daily_forecast['time']):
-            formatted_daily.append({
-                'date': date,
-                'day': datetime.strptime(date, "%Y-%m-%d").strftime("%A"),
-                'weather_code': daily_forecast['weather_code'][i],
-                'condition': WMO_WEATHER_CODES.get(daily_forecast['weather_code'][i], "Unknown"),
-                'minTemp': daily_forecast['temperature_2m_min'][i],
-                'maxTemp': daily_forecast['temperature_2m_max'][i],
-                'precipitation': daily_forecast.get('precipitation_sum', [None] * len(daily_forecast['time']))[i],
-                'precipitationProbability': daily_forecast.get('precipitation_probability_max', [None] * len(daily_forecast['time']))[i],
-                'windSpeed': daily_forecast.get('windspeed_10m_max', [None] * len(daily_forecast['time']))[i],
-                'windDirection': daily_forecast.get('winddirection_10m_dominant', [None] * len(daily_forecast['time']))[i],
-            })
-
-    return {
+    # The forecast views are pre-encoded JSON; FastJSONResponse splices them in as-is
+    return FastJSONResponse({
+        'location': location,
+        'currentWeather': current_weather,
+        'dailyForecast': result['views']['daily'],
+        'hourlyForecast': result['views']['hourly'],
+        'heroTimeline': result['views']['timeline'],
+        'hero': {"name": hero_profile['name'], "dialogue": dialogue, "imageUrl": image_url, **audio_fields(result.results.get('audio'))},
+        'sessionId': session[0] if session else None,
+    }, headers={"Server-Timing": result.server_timing(), **headers})
+
+@router.post("/api/get-weather-dashboard/stream")
+async def stream_weather_dashboard_endpoint(request: WeatherRequest, http_request: Request):
+    """
+    Streaming variant of the dashboard as NDJSON events: `weather` as soon as the forecast
+    is ready, `dialogue_delta` per generated token, `dialogue` once complete, then `audio`.
+    When GPT/TTS capacity is saturated a `busy` event replaces the dialogue.
+    """
+    admission.check_rate(http_request, "expensive")
+    async with admission.slot("cheap"):
+        result = await run_dashboard_pipeline(dashboard_weather_pipeline, request)
+    coords = result['coords']
+    current_weather = result['weather']['current']
+    hero_profile = result['weather']['hero']
+    master_prompt = build_master_prompt(hero_profile, result['location_name'], current_weather, get_user_query(request))
+    cache_key = dialogue_cache_key(hero_profile, result['location_name'], current_weather, request)
+    location = {"name": result['location_name'], "latitude": coords['latitude'], "longitude": coords['longitude']}
+    session = await dashboard_session(request)
+
+    async def events():
+        yield ndjson({
+            'type': 'weather',
+            'location': location,
+            'currentWeather': map_current_weather(current_weather),
+            'dailyForecast': result['views']['daily'],
+            'hourlyForecast': result['views']['hourly'],
+            'heroTimeline': result['views']['timeline'],
+            'hero': {"name": hero_profile['name'], "imageUrl": None},
+            'sessionId': session[0] if session else None,
+        })
+        try:
+            async with admission.slot("expensive"):
+                parts = []
+                async for delta in stream_gpt(master_prompt, cache_key):
+                    parts.append(delta)
+                    yield ndjson({'type': 'dialogue_delta', 'delta': delta})
+                dialogue = "".join(parts).strip()
+                await remember_dashboard(session, request, location, hero_profile, map_current_weather(current_weather), dialogue)
+                yield ndjson({'type': 'dialogue', 'dialogue': dialogue})
+                audio_url = await generate_tts_audio(dialogue, hero_profile.get("voice", "onyx"))
+                yield ndjson({'type': 'audio', 'audioUrl': audio_url})
+        except Rejected as e:
+            yield ndjson({'type': 'busy', 'retryAfter': int(retry_after_header(e.retry_after))})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Server-Timing": result.server_timing()})
+
+async def _batch_dashboard_entry(request: BatchWeatherRequest, item: DashboardLocation, coords: dict,
+                                 location_display_name: str, full_weather_data: Optional[Forecast]):
+    if not full_weather_data:
+        return {"error": "Could not retrieve weather data.", "status": 500, "query": item.model_dump(exclude_none=True)}
+    views = full_weather_data.views
+    current_weather = get_current_weather(full_weather_data)
+    hero_profile = select_hero(current_weather)
+    entry = {
         'location': {"name": location_display_name, "latitude": coords['latitude'], "longitude": coords['longitude']},
-        'currentWeather': mapped_current_weather,
-        'dailyForecast': formatted_daily,
-        'hero': {"name": hero_profile['name'], "dialogue": dialogue, "imageUrl": image_url, "audioUrl": audio_url}
+        'currentWeather': map_current_weather(current_weather),
+        'dailyForecast': views['daily'],
+        'hero': {"name": hero_profile['name'], "dialogue": None, "imageUrl": None, "audioUrl": None},
     }
+    if request.include_hourly:
+        entry['hourlyForecast'] = views['hourly']
+        entry['heroTimeline'] = views['timeline']
+    include_dialogue = request.include_dialogue if item.include_dialogue is None else item.include_dialogue
+    if include_dialogue:
+        query = WeatherRequest()
+        prompt = build_master_prompt(hero_profile, location_display_name, current_weather, get_user_query(query))
+        dialogue = await ask_gpt(prompt, dialogue_cache_key(hero_profile, location_display_name, current_weather, query))
+        entry['hero']['dialogue'] = dialogue
+        if request.include_audio:
+            entry['hero'].update(audio_fields(enqueue_tts_audio(dialogue, hero_profile.get("voice", "onyx"), PRIORITY_LOW)))
+    return entry
+
+@router.post("/api/get-weather-dashboards")
+async def get_weather_dashboards_endpoint(request: BatchWeatherRequest, http_request: Request):
+    """
+    Dashboards for up to 50 locations. Names are resolved concurrently (local index first),
+    uncached forecasts are fetched with multi-location Open-Meteo requests, and dialogue/audio
+    are opt-in per request or per location.
+    """
+    include_dialogue = request.include_dialogue or any(item.include_dialogue for item in request.locations)
+    async with admission.admit(http_request, "expensive" if include_dialogue else "cheap"):
+        return await _weather_dashboards(request)
+
+async def _weather_dashboards(request: BatchWeatherRequest):
+    async def resolve(item: DashboardLocation):
+        location_request = WeatherRequest(location=item.location, latitude=item.latitude, longitude=item.longitude)
+        try:
+            coords = await resolve_coords(location_request)
+        except HTTPException as e:
+            return None, {"error": e.detail, "status": e.status_code, "query": item.model_dump(exclude_none=True)}
+        return coords, location_request
+
+    resolved = await asyncio.gather(*(resolve(item) for item in request.locations))
+    located = [(i, coords, location_request) for i, (coords, location_request) in enumerate(resolved) if coords is not None]
+
+    names, forecasts = await asyncio.gather(
+        asyncio.gather(*(resolve_location_name(location_request, coords) for _, coords, location_request in located)),
+        forecast_cache.get_many([(coords['latitude'], coords['longitude']) for _, coords, _ in located]),
+    )
+
+    dashboards = [error for _, error in resolved]
+    entries = await asyncio.gather(*(
+        _batch_dashboard_entry(request, request.locations[i], coords, name, forecast)
+        for (i, coords, _), name, forecast in zip(located, names, forecasts)
+    ))
+    for (i, _, _), entry in zip(located, entries):
+        dashboards[i] = entry
+    return FastJSONResponse({'dashboards': dashboards})
+
+# --- Live updates ---
+async def live_weather(latitude: float, longitude: float):
+    """Current weather for a live cell, and what should trigger a new hero line (hero or condition)."""
+    forecast = await forecast_cache.get(latitude, longitude)
+    if forecast is None:
+        return None
+    current_weather = get_current_weather(forecast)
+    return map_current_weather(current_weather), (select_hero(current_weather)['name'], current_weather.get('weather_code'))
+
+async def live_hero(latitude: float, longitude: float, location_name: str):
+    forecast = await forecast_cache.get(latitude, longitude)
+    if forecast is None:
+        return None
+    current_weather = get_current_weather(forecast)
+    hero_profile = select_hero(current_weather)
+    request = WeatherRequest(latitude=latitude, longitude=longitude)
+    prompt = build_master_prompt(hero_profile, location_name, current_weather, get_user_query(request))
+    dialogue = await ask_gpt(prompt, dialogue_cache_key(hero_profile, location_name, current_weather, request))
+    job = enqueue_tts_audio(dialogue, hero_profile.get("voice", "onyx"))
+    return {"name": hero_profile['name'], "dialogue": dialogue, "imageUrl": None, **audio_fields(job)}
+
+live_hub = LiveHub(
+    forecast_cache.key,
+    live_weather,
+    live_hero,
+    interval=float(os.getenv("LIVE_REFRESH_SECONDS", "60")),
+    heartbeat=float(os.getenv("LIVE_HEARTBEAT_SECONDS", "25")),
+    max_queue=int(os.getenv("LIVE_QUEUE_EVENTS", "8")),
+    max_subscribers=int(os.getenv("LIVE_MAX_SUBSCRIBERS", "50000")),
+)
 
-@app.get("/api/weather")
-async def get_weather(latitude: float, longitude: float, city: Optional[str] = None):
-    return await get_weather_dashboard_endpoint(WeatherRequest(latitude=latitude, longitude=longitude, city=city))
\ No newline at end of file
+@router.get("/api/live")
+async def live_updates(http_request: Request, location: Optional[str] = None, latitude: Optional[float] = None,
+                       longitude: Optional[float] = None):
+    """
+    Server-sent events for one location instead of polling the dashboard: a `snapshot`
+    first, then `weather` events with only the changed currentWeather fields and `hero`
+    events when the hero or condition changes. Comment lines are sent as heartbeats.
+    """
+    admission.check_rate(http_request, "cheap")
+    request = WeatherRequest(location=location, latitude=latitude, longitude=longitude)
+    coords = await resolve_coords(request)
+    location_name = await resolve_location_name(request, coords)
+    if live_hub.full:
+        raise HTTPException(status_code=503, detail="Too many live subscribers, try again later.")
+
+    async def events():
+        # Subscribed inside the stream so the subscription always ends with it
+        subscriber = live_hub.subscribe(coords['latitude'], coords['longitude'], location_name)
+        try:
+            async for data in live_hub.events(subscriber):
+                yield b": heartbeat\n\n" if data is None else b"data: " + data + b"\n\n"
+        finally:
+            live_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/api/weather")
+async def get_weather(latitude: float, longitude: float, response: Response, http_request: Request, city: Optional[str] = None):
+    return await get_weather_dashboard_endpoint(WeatherRequest(latitude=latitude, longitude=longitude, city=city), response, http_request)
+
+
+# --- App factory ---
+def configure_logging():
+    """Errors go to backend_error.log, unless the server (e.g. gunicorn) has configured logging already."""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(filename='backend_error.log', level=logging.ERROR, format='%(asctime)s %(levelname)s %(message)s')
+
+def create_app() -> FastAPI:
+    """
+    Build the ASGI app. Heavy clients are created on first use rather than at import
+    (the pooled HTTP and OpenAI clients, cache server connections and the token encoder)
+    and the geocoder prefix index is built in a thread after startup, so a new worker
+    starts serving quickly.
+
+        uvicorn main:app                      # single process
+        gunicorn -c gunicorn.conf.py main:app  # several workers sharing caches
+    """
+    configure_logging()
+    app = FastAPI(title="DC Weather App API", version="1.0.0", lifespan=lifespan)
+
+    # Configure CORS for production
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "http://localhost:3000",  # Local development
+            "https://https://frontend-d30imq72n-setteruks-projects.vercel.app",  # Replace with your Vercel domain
+            "https://*.vercel.app",  # Allow all Vercel subdomains
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(MetricsMiddleware, startup=startup)
+    app.add_exception_handler(Rejected, rejected_handler)
+
+    # --- Create a directory for static files (audio) and mount it ---
+    os.makedirs("static", exist_ok=True)
+
+    # Mount static files for audio (with Cache-Control, ETag and Range support)
+    app.mount("/static", AudioStaticFiles(directory="static", tts_cache=tts_cache), name="static")
+
+    # Include routers
+    app.include_router(router)
+    app.include_router(geocode_router)
+    app.include_router(chat_router)
+    app.include_router(audio_router)
+    app.include_router(debug_router)
+    startup.mark("imported")
+    return app
+
+app = create_app()
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from core.tts_jobs import tts_jobs
+
+router = APIRouter()
+
+# Upper bound on how long one status request may be held open
+MAX_WAIT_SECONDS = 30.0
+
+@router.get("/api/audio/{job_id}")
+async def audio_status(job_id: str, wait: float = Query(0.0, ge=0.0, le=MAX_WAIT_SECONDS)):
+    """
+    Status of a TTS job. With `wait`, long-polls for up to that many seconds until the
+    job finishes; `audioUrl` is set once the file can be fetched. A job queued by another
+    worker is `pending` until its file appears; unknown or expired ids are a 404.
+    """
+    job = await tts_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown audio job")
+    await tts_jobs.wait(job, wait)
+    return job.to_dict()
@@ -1,45 +1,79 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import openai
-import os
+import json
 import logging
-import uuid
-import requests
+import os
 from datetime import datetime
 
+from core import llm
+from core.hero_profiles import HERO_PROFILES
+from core.tts_jobs import tts_jobs, audio_fields, TTSQueueFull, PRIORITY_HIGH
+from core.dialogue_cache import dialogue_cache
+from core.metrics import timed
+from core.prompts import ChatPrompts, TokenCounter
+from core.sessions import sessions
+from core.admission import admission, Rejected, retry_after_header
+
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     message: str
-    currentHero: str
+    # With a sessionId the hero, weather, location and history come from the session;
+    # sessions are kept only for clients that send one or set newSession
+    sessionId: Optional[str] = None
+    newSession: Optional[bool] = None
+    currentHero: Optional[str] = None
     weatherData: Optional[dict] = None
     locationData: Optional[dict] = None
     chatHistory: Optional[List[dict]] = []
 
 class ChatResponse(BaseModel):
     response: str
+    sessionId: Optional[str] = None
     audioUrl: Optional[str] = None
+    audioJobId: Optional[str] = None
+    audioStatus: Optional[str] = None
+
+# Returned (and spoken) whenever the AI service cannot answer.
+CHAT_ERROR_MESSAGE = "I'm sorry, I'm having trouble connecting to my knowledge base right now. Please try again later."
 
-# Configure OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
+CHAT_SYSTEM_PROMPT = "You are a helpful AI assistant with expertise in weather and DC Comics. Respond in a conversational, friendly manner."
 
-def ask_gpt(prompt: str) -> str:
+CHAT_RESPONSE_GUIDELINES = "IMPORTANT: Respond as the current hero with their unique personality. Be witty, sarcastic, and humorous when appropriate. If the user is making fun of you or roasting you, respond with clever comebacks and witty retorts that match your character. Don't be easily offended - show your personality through humor and sarcasm. Keep responses conversational, engaging, and true to your character's voice."
+
+@timed("chat_ask_gpt")
+async def ask_gpt(messages: List[dict], hero: str, cache_key: Optional[str] = None) -> str:
     """Generate response using OpenAI GPT"""
+    on_usage = chat_prompts.usage_recorder(hero)
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful AI assistant with expertise in weather and DC Comics. Respond in a conversational, friendly manner."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
+        if cache_key is None:
+            return await llm.complete(messages, max_tokens=500, on_usage=on_usage)
+        return await dialogue_cache.get_or_generate(cache_key, lambda: llm.complete(messages, max_tokens=500, on_usage=on_usage))
     except Exception as e:
         logging.error(f"OpenAI API Error: {e}")
-        return "I'm sorry, I'm having trouble connecting to my knowledge base right now. Please try again later."
+        return CHAT_ERROR_MESSAGE
+
+async def stream_gpt(messages: List[dict], hero: str, cache_key: Optional[str] = None):
+    """Generate response using OpenAI GPT, yielding text as it arrives"""
+    if cache_key is not None:
+        cached = await dialogue_cache.lookup(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    try:
+        async for delta in llm.stream_completion(messages, max_tokens=500, on_usage=chat_prompts.usage_recorder(hero)):
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        logging.error(f"OpenAI API Error (stream): {e}")
+        if not parts:
+            yield CHAT_ERROR_MESSAGE
+        return
+    if cache_key is not None and parts:
+        await dialogue_cache.add(cache_key, "".join(parts).strip())
 
 def get_hero_voice_settings(hero: str) -> dict:
     """Get voice settings for each hero"""
@@ -52,44 +86,52 @@ def get_hero_voice_settings(hero: str) -> dict:
     }
     return voice_settings.get(hero.lower(), {"voice": "onyx", "speed": 1.0})
 
-def generate_tts_audio(text: str, hero: str = "batman") -> Optional[str]:
-    """Generate TTS audio using OpenAI with hero-specific settings"""
+def prepare_tts_text(text: str, hero: str) -> str:
+    """Add hero-specific text modifications for better TTS"""
+    if hero.lower() == "flash":
+        # Flash speaks faster, add some speed-related emphasis
+        return text.replace(".", "... ").replace("!", "! ")
+    elif hero.lower() == "batman":
+        # Batman speaks more deliberately
+        return text.replace(".", ". ").replace(",", ", ")
+    return text
+
+def enqueue_tts_audio(text: str, hero: str = "batman"):
+    """Queue TTS audio with hero-specific settings; returns the job, or None if the queue is full"""
     try:
         voice_settings = get_hero_voice_settings(hero)
+        modified_text = prepare_tts_text(text, hero)
         
-        # Add hero-specific text modifications for better TTS
-        modified_text = text
-        if hero.lower() == "flash":
-            # Flash speaks faster, add some speed-related emphasis
-            modified_text = text.replace(".", "... ").replace("!", "! ")
-        elif hero.lower() == "batman":
-            # Batman speaks more deliberately
-            modified_text = text.replace(".", ". ").replace(",", ", ")
-        
-        response = openai.Audio.create(
-            model="tts-1",
-            voice=voice_settings["voice"],
-            input=modified_text
-        )
-        
-        # Save audio file
-        filename = f"{uuid.uuid4()}.mp3"
-        file_path = f"static/{filename}"
-        
-        with open(file_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
-                    f.write(chunk)
-        
-        return f"/static/{filename}"
-    except Exception as e:
+        # Identical lines (e.g. the error message) reuse the cached file
+        return tts_jobs.submit(modified_text, voice_settings["voice"], voice_settings["speed"], priority=PRIORITY_HIGH)
+    except TTSQueueFull as e:
         logging.error(f"OpenAI TTS Error: {e}")
         return None
 
-def get_hero_context(hero: str) -> str:
-    """Get context about the current hero with enhanced personality including sarcasm and humor"""
-    hero_contexts = {
-        "batman": """You are Batman, the Dark Knight of Gotham City. You are serious, tactical, and brooding, but also have a dry, sarcastic sense of humor. You analyze situations strategically and speak with authority. Your voice is deep, gravelly, and commanding. You often use phrases like 'citizen', 'Gotham', and speak with the weight of experience.
+async def generate_tts_audio(text: str, hero: str = "batman", timeout: float = 15.0) -> Optional[str]:
+    """Generate TTS audio and wait (up to `timeout` seconds) for its URL"""
+    job = enqueue_tts_audio(text, hero)
+    if job is None:
+        return None
+    await tts_jobs.wait(job, timeout)
+    return job.url
+
+def chat_hero_key(hero_name: str) -> str:
+    """Chat identifies heroes as e.g. "wonderwoman" and "flash" rather than by display name"""
+    return hero_name.lower().replace("the ", "").replace(" ", "")
+
+def chat_prerender_lines() -> list:
+    """(text, voice, speed) for the error line in every hero's chat voice."""
+    lines = []
+    for hero_profile in HERO_PROFILES.values():
+        hero = chat_hero_key(hero_profile['name'])
+        voice_settings = get_hero_voice_settings(hero)
+        lines.append((prepare_tts_text(CHAT_ERROR_MESSAGE, hero), voice_settings["voice"], voice_settings["speed"]))
+    return lines
+
+# Persona blocks; each becomes part of that hero's fixed system message
+HERO_CONTEXTS = {
+    "batman": """You are Batman, the Dark Knight of Gotham City. You are serious, tactical, and brooding, but also have a dry, sarcastic sense of humor. You analyze situations strategically and speak with authority. Your voice is deep, gravelly, and commanding. You often use phrases like 'citizen', 'Gotham', and speak with the weight of experience.
 
 When someone roasts you or makes fun of you, respond with:
 - Dry sarcasm and witty comebacks
@@ -99,8 +141,8 @@ When someone roasts you or makes fun of you, respond with:
 - Examples: "Oh, a comedian. How original.", "I've heard better jokes from the Joker.", "At least I don't need a fish to talk to me."
 
 You're not afraid to be sarcastic but maintain your serious, authoritative tone. You can be funny while still being intimidating.""",
-        
-        "superman": """You are Superman, the Man of Steel. You are friendly, optimistic, and reassuring, but also have a good sense of humor and can be playfully sarcastic. You embody hope and speak with warmth and encouragement. Your voice is strong, clear, and inspiring. You often use phrases like 'hope', 'truth', 'justice', and speak with confidence and kindness.
+    
+    "superman": """You are Superman, the Man of Steel. You are friendly, optimistic, and reassuring, but also have a good sense of humor and can be playfully sarcastic. You embody hope and speak with warmth and encouragement. Your voice is strong, clear, and inspiring. You often use phrases like 'hope', 'truth', 'justice', and speak with confidence and kindness.
 
 When someone roasts you or makes fun of you, respond with:
 - Good-natured humor and self-deprecating jokes
@@ -109,8 +151,8 @@ When someone roasts you or makes fun of you, respond with:
 - Examples: "Well, at least I can fly away from bad jokes.", "I've been called worse by Lex Luthor.", "My mom always said I was bulletproof, but not joke-proof."
 
 You're genuinely nice but can be witty and playful when challenged.""",
-        
-        "wonderwoman": """You are Wonder Woman, an Amazonian warrior. You are compassionate, wise, and graceful, but also have a sharp wit and can be elegantly sarcastic. You speak with dignity and strength. Your voice is powerful, elegant, and commanding. You often use phrases like 'by the gods', 'Amazonian wisdom', and speak with regal authority.
+    
+    "wonderwoman": """You are Wonder Woman, an Amazonian warrior. You are compassionate, wise, and graceful, but also have a sharp wit and can be elegantly sarcastic. You speak with dignity and strength. Your voice is powerful, elegant, and commanding. You often use phrases like 'by the gods', 'Amazonian wisdom', and speak with regal authority.
 
 When someone roasts you or makes fun of you, respond with:
 - Elegant sarcasm and sophisticated comebacks
@@ -119,8 +161,8 @@ When someone roasts you or makes fun of you, respond with:
 - Examples: "By the gods, your wit is as sharp as a dull sword.", "I've faced greater challenges than your attempt at humor.", "Perhaps you should study Amazonian diplomacy before attempting comedy."
 
 You're dignified but can be cuttingly witty when needed.""",
-        
-        "aquaman": """You are Aquaman, King of Atlantis. You are regal, powerful, and deeply connected to the ocean, but also have a good sense of humor and can be playfully sarcastic. You speak with authority and use nautical references. Your voice is deep, resonant, and commanding. You often use phrases like 'by the sea', 'Atlantis', and speak with oceanic wisdom.
+    
+    "aquaman": """You are Aquaman, King of Atlantis. You are regal, powerful, and deeply connected to the ocean, but also have a good sense of humor and can be playfully sarcastic. You speak with authority and use nautical references. Your voice is deep, resonant, and commanding. You often use phrases like 'by the sea', 'Atlantis', and speak with oceanic wisdom.
 
 When someone roasts you or makes fun of you, respond with:
 - Nautical-themed comebacks and ocean references
@@ -129,8 +171,8 @@ When someone roasts you or makes fun of you, respond with:
 - Examples: "By the sea, I've heard better jokes from a sea cucumber.", "At least I can breathe underwater, unlike your sense of humor.", "My fish friends have better comedic timing than you."
 
 You're regal but can be humorously defensive about your powers.""",
-        
-        "flash": """You are The Flash, the fastest man alive. You are energetic, witty, and talk quickly. You relate everything to speed and use humor constantly. Your voice is fast-paced, enthusiastic, and playful. You often use phrases like 'speed force', 'faster than lightning', and speak with rapid energy.
+    
+    "flash": """You are The Flash, the fastest man alive. You are energetic, witty, and talk quickly. You relate everything to speed and use humor constantly. Your voice is fast-paced, enthusiastic, and playful. You often use phrases like 'speed force', 'faster than lightning', and speak with rapid energy.
 
 When someone roasts you or makes fun of you, respond with:
 - Rapid-fire comebacks and speed-related jokes
@@ -139,8 +181,22 @@ When someone roasts you or makes fun of you, respond with:
 - Examples: "That joke was so slow, I could run around the world twice before it landed!", "At least I'm fast enough to dodge bad humor.", "My brain works faster than your wit!"
 
 You're the most naturally funny and can turn any situation into a joke."""
-    }
-    return hero_contexts.get(hero.lower(), "You are a DC Comics hero with a good sense of humor.")
+}
+DEFAULT_HERO_CONTEXT = "You are a DC Comics hero with a good sense of humor."
+
+def get_hero_context(hero: str) -> str:
+    """Get context about the current hero with enhanced personality including sarcasm and humor"""
+    return HERO_CONTEXTS.get(hero.lower(), DEFAULT_HERO_CONTEXT)
+
+# System messages are built once per hero; history is trimmed to fit the prompt token budget.
+# The defaults keep the last 3 messages, as chat always has; raising CHAT_HISTORY_MESSAGES and
+# CHAT_PROMPT_TOKEN_BUDGET opts into a longer (and costlier) context window.
+chat_prompts = ChatPrompts(
+    CHAT_SYSTEM_PROMPT, HERO_CONTEXTS, DEFAULT_HERO_CONTEXT, CHAT_RESPONSE_GUIDELINES,
+    TokenCounter(llm.DEFAULT_CHAT_MODEL),
+    token_budget=int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "1000")),
+    max_history=int(os.getenv("CHAT_HISTORY_MESSAGES", "3")),
+)
 
 def create_weather_context(weather_data: dict, location_data: dict) -> str:
     """Create context from weather data"""
@@ -155,50 +211,111 @@ def create_weather_context(weather_data: dict, location_data: dict) -> str:
     
     return context
 
-@router.post("/api/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
-    try:
-        # Build context
-        hero_context = get_hero_context(request.currentHero)
-        weather_context = create_weather_context(request.weatherData, request.locationData)
-        
-        # Create conversation history
-        conversation_history = ""
-        if request.chatHistory:
-            for msg in request.chatHistory[-3:]:  # Last 3 messages for context
-                role = "user" if msg.get('sender') == 'user' else "assistant"
-                conversation_history += f"{role}: {msg.get('text', '')}\n"
-        
-        # Build the prompt
-        prompt = f"""
-{hero_context}
+def chat_cache_key(chat: dict, message: str) -> Optional[str]:
+    """Only first messages (no history) are cacheable; follow-ups depend on the conversation."""
+    if chat['history']:
+        return None
+    weather_data = chat['weather'] or {}
+    return dialogue_cache.key(chat['hero'], chat['location'].get('name', ''), weather_data.get('temperature'),
+                              weather_data.get('condition'), message)
+
+def history_turns(chat_history: Optional[List[dict]]) -> List[dict]:
+    """Client chat history as chat-format turns, oldest first"""
+    turns = []
+    for msg in chat_history or []:
+        text = msg.get('text')
+        if text:
+            turns.append({"role": "user" if msg.get('sender') == 'user' else "assistant", "content": text})
+    return turns
+
+async def resolve_chat(request: ChatRequest) -> dict:
+    """The request merged with its session; whatever the client sends overrides the stored state"""
+    if request.sessionId or request.newSession:
+        session_id, session = await sessions.load(request.sessionId)
+    else:
+        # Stateless client (it sends its own history): nothing is stored for it
+        session_id, session = None, {"history": [], "context": None}
+    context = session['context'] or {}
+    return {
+        'session_id': session_id,
+        'session': session,
+        'hero': request.currentHero or context.get('hero') or "batman",
+        'history': history_turns(request.chatHistory) if request.chatHistory else session['history'],
+        'weather': request.weatherData or context.get('weather'),
+        'location': request.locationData or context.get('location') or {},
+    }
 
-Current Context:
-{weather_context}
+async def remember_chat(chat: dict, message: str, response_text: str):
+    if chat['session_id'] is None:
+        return
+    turns = [{"role": "user", "content": message}]
+    if response_text and response_text != CHAT_ERROR_MESSAGE:
+        turns.append({"role": "assistant", "content": response_text})
+    await sessions.update(chat['session_id'], chat['session'], turns)
 
-Recent Conversation:
-{conversation_history}
+def build_chat_messages(chat: dict, message: str) -> List[dict]:
+    # Persona in the system message, weather context and question in the last user message
+    weather_context = create_weather_context(chat['weather'], chat['location'])
+    context = f"Current Context:\n{weather_context}" if weather_context else ""
+    return chat_prompts.build(chat['hero'], message, context, chat['history'])
 
-User's Question: {request.message}
+@router.post("/api/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest, http_request: Request):
+    # Every chat turn is a paid completion plus TTS
+    async with admission.admit(http_request, "expensive"):
+        return await _chat(request)
 
-IMPORTANT: Respond as the current hero with their unique personality. Be witty, sarcastic, and humorous when appropriate. If the user is making fun of you or roasting you, respond with clever comebacks and witty retorts that match your character. Don't be easily offended - show your personality through humor and sarcasm. Keep responses conversational, engaging, and true to your character's voice.
-"""
+async def _chat(request: ChatRequest):
+    try:
+        chat = await resolve_chat(request)
+        messages = build_chat_messages(chat, request.message)
         
         # Get response from GPT
-        response_text = ask_gpt(prompt)
+        response_text = await ask_gpt(messages, chat['hero'], chat_cache_key(chat, request.message))
+        await remember_chat(chat, request.message, response_text)
         
-        # Generate audio response with hero-specific voice
-        audio_url = generate_tts_audio(response_text, request.currentHero)
+        # Queue the audio response with hero-specific voice; clients poll /api/audio/{audioJobId}
+        job = enqueue_tts_audio(response_text, chat['hero'])
+        if job is not None:
+            await tts_jobs.wait(job)
         
         return ChatResponse(
             response=response_text,
-            audioUrl=audio_url
+            sessionId=chat['session_id'],
+            **audio_fields(job)
         )
         
     except Exception as e:
         logging.error(f"Chat endpoint error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Streaming chat as NDJSON events: `delta` per token, then `response` and `audio`; a
+    single `busy` event when GPT/TTS capacity is saturated.
+    """
+    admission.check_rate(http_request, "expensive")
+    chat = await resolve_chat(request)
+    messages = build_chat_messages(chat, request.message)
+
+    async def events():
+        try:
+            async with admission.slot("expensive"):
+                parts = []
+                async for delta in stream_gpt(messages, chat['hero'], chat_cache_key(chat, request.message)):
+                    parts.append(delta)
+                    yield json.dumps({"type": "delta", "delta": delta}) + "\n"
+                response_text = "".join(parts).strip()
+                await remember_chat(chat, request.message, response_text)
+                yield json.dumps({"type": "response", "response": response_text, "sessionId": chat['session_id']}) + "\n"
+                audio_url = await generate_tts_audio(response_text, chat['hero'])
+                yield json.dumps({"type": "audio", "audioUrl": audio_url}) + "\n"
+        except Rejected as e:
+            yield json.dumps({"type": "busy", "retryAfter": int(retry_after_header(e.retry_after))}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.get("/api/chat/health")
 async def chat_health():
     """Health check for chat service"""
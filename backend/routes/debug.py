@@ -0,0 +1,33 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from core.profiler import profiler
+
+router = APIRouter()
+
+def require_profiler():
+    # The profiler endpoints only exist when explicitly enabled for the deployment
+    if os.getenv("PROFILER_ENABLED", "0") != "1":
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@router.post("/debug/profiler/start")
+async def start_profiler(interval: float = Query(0.01, ge=0.001, le=1.0)):
+    """Start sampling the event loop thread every `interval` seconds."""
+    require_profiler()
+    # Handlers run on the event loop thread, so this samples the loop
+    profiler.start(interval)
+    return profiler.stats()
+
+@router.post("/debug/profiler/stop")
+async def stop_profiler():
+    require_profiler()
+    profiler.stop()
+    return profiler.stats()
+
+@router.get("/debug/profiler")
+async def profiler_samples():
+    """Collapsed stacks (flamegraph.pl / speedscope input) from the current or last session."""
+    require_profiler()
+    return PlainTextResponse(profiler.collapsed())
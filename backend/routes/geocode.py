@@ -1,29 +1,53 @@
-from fastapi import APIRouter, HTTPException
-import requests
+import logging
+import os
+
+import httpx
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from core.circuit_breaker import CircuitOpenError
+from core.http_client import upstream
+from core.geocoder import geocoder, normalize_name
+from core.singleflight import SingleFlight
+from core.prefetch import popularity
+from core.admission import admission
 
 router = APIRouter()
 
 # Geocoding API base URL
-GEOCODING_API_BASE = "https://geocoding-api.open-meteo.com/v1/search"
+GEOCODING_API_BASE = os.getenv("GEOCODING_API_BASE", "https://geocoding-api.open-meteo.com/v1/search")
+
+# Concurrent lookups of the same name share one resolution
+geocode_flight = SingleFlight("geocode")
+suggest_flight = SingleFlight("suggest")
 
 @router.get("/geocode")
-async def geocode(location: str):
+async def geocode(location: str, http_request: Request):
     """Geocode a location name to coordinates"""
     if not location:
         raise HTTPException(status_code=400, detail="Location parameter is missing")
     
+    # Lookups are cheap next to a dashboard, so they cost a fraction of a rate-limit token
+    async with admission.admit(http_request, "cheap", cost=0.25):
+        result = await geocode_flight.do(normalize_name(location) or location, lambda: _geocode(location))
+    popularity.record(result.get("latitude"), result.get("longitude"), result.get("city"))
+    return result
+
+async def _geocode(location: str):
     try:
-        url = f"{GEOCODING_API_BASE}?name={location}&count=1&format=json"
-        response = requests.get(url)
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Error from geocoding service")
-        
-        data = response.json()
-        if not data.get('results'):
-            return {"error": "Location not found"}
-        
-        result = data['results'][0]
+        result = geocoder.forward(location)
+        if result is None:
+            params = {"name": location, "count": 1, "format": "json"}
+            response = await upstream.request("GET", GEOCODING_API_BASE, params=params)
+            
+            if response.status_code != 200:
+                raise HTTPException(status_code=response.status_code, detail="Error from geocoding service")
+            
+            data = response.json()
+            if not data.get('results'):
+                return {"error": "Location not found"}
+            
+            result = data['results'][0]
+            geocoder.learn_forward(location, result)
         return {
             "latitude": result.get('latitude'),
             "longitude": result.get('longitude'),
@@ -34,6 +58,47 @@ async def geocode(location: str):
         raise HTTPException(status_code=500, detail=f"Geocoding error: {str(e)}")
 
 @router.get("/api/geocode")
-async def geocode_api(location: str):
+async def geocode_api(location: str, http_request: Request):
     """Alternative geocode endpoint for frontend compatibility"""
-    return await geocode(location)
\ No newline at end of file
+    return await geocode(location, http_request)
+
+@router.get("/api/geocode/suggest")
+async def geocode_suggest(http_request: Request, q: str, limit: int = Query(5, ge=1, le=20)):
+    """Autocomplete place names, most populous first"""
+    key = normalize_name(q)
+    if not key:
+        raise HTTPException(status_code=400, detail="Query parameter is missing")
+
+    # Served from memory for every keystroke, so a suggestion costs less than a lookup
+    async with admission.admit(http_request, "cheap", cost=0.1):
+        # Normally built at startup; until then requests wait for it without blocking the loop
+        await geocoder.load_prefix_index()
+        results = geocoder.suggest(key, limit)
+        if results is not None:
+            return {"query": q, "source": "index", "results": [_suggestion(result) for result in results]}
+        # Only prefixes the local index has nothing for go upstream
+        results = await suggest_flight.do((key, limit), lambda: _suggest_upstream(key, limit))
+    return {"query": q, "source": "upstream", "results": results}
+
+async def _suggest_upstream(query: str, limit: int):
+    # Autocomplete is best-effort: while the geocoding service is failing, suggest nothing
+    params = {"name": query, "count": limit, "format": "json"}
+    try:
+        response = await upstream.request("GET", GEOCODING_API_BASE, params=params)
+        if response.status_code != 200:
+            logging.warning(f"Geocoding suggest for {query!r}: upstream status {response.status_code}")
+            return []
+        return [_suggestion(result) for result in response.json().get('results') or []]
+    except (httpx.HTTPError, CircuitOpenError, ValueError) as e:
+        logging.warning(f"Geocoding suggest for {query!r} failed: {e!r}")
+        return []
+
+def _suggestion(result: dict):
+    return {
+        "name": result.get('name'),
+        "admin1": result.get('admin1'),
+        "country": result.get('country'),
+        "latitude": result.get('latitude'),
+        "longitude": result.get('longitude'),
+        "population": result.get('population'),
+    }
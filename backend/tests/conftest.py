@@ -0,0 +1,9 @@
+"""
+Run from the backend directory: python -m pytest -q
+
+Async code is driven with asyncio.run, so plain pytest is enough.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
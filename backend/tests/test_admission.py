@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core.admission import Admission, ClientLimiter, Pool, Rejected
+from core.ratelimit import TokenBucket
+
+
+def request(host: str = "10.0.0.1", **headers) -> SimpleNamespace:
+    return SimpleNamespace(client=SimpleNamespace(host=host), headers={name.replace("_", "-"): value for name, value in headers.items()})
+
+
+def admission(limiter: ClientLimiter, limit: int = 4, max_queue: int = 4, wait: float = 1.0) -> Admission:
+    return Admission(limiter, {"cheap": Pool("cheap", limit, max_queue)}, {"cheap": wait})
+
+
+def test_rate_limited_after_burst():
+    gate = admission(ClientLimiter(rate=1, burst=2, key_rate=10, key_burst=10))
+    gate.check_rate(request(), "cheap")
+    gate.check_rate(request(), "cheap")
+    with pytest.raises(Rejected) as rejected:
+        gate.check_rate(request(), "cheap")
+    assert rejected.value.status_code == 429
+    assert 0 < rejected.value.retry_after <= 1
+
+
+def test_clients_limited_separately_by_peer_address():
+    limiter = ClientLimiter(rate=1, burst=1, key_rate=10, key_burst=10)
+    assert limiter.check(request("10.0.0.1")) is None
+    assert limiter.check(request("10.0.0.1")) is not None
+    assert limiter.check(request("10.0.0.2")) is None
+
+
+def test_forwarded_for_ignored_without_trusted_proxies():
+    limiter = ClientLimiter(rate=1, burst=1, key_rate=10, key_burst=10)
+    assert limiter.client_id(request("10.0.0.1", x_forwarded_for="1.2.3.4")) == "addr:10.0.0.1"
+
+
+def test_forwarded_for_read_from_the_right_behind_trusted_proxies():
+    limiter = ClientLimiter(rate=1, burst=1, key_rate=10, key_burst=10, trusted_proxies=1)
+    spoofed = request("10.0.0.9", x_forwarded_for="6.6.6.6, 1.2.3.4")
+    assert limiter.client_id(spoofed) == "addr:1.2.3.4"
+
+
+def test_api_key_gets_its_own_rate():
+    limiter = ClientLimiter(rate=1, burst=1, key_rate=10, key_burst=3, api_keys=frozenset({"secret"}))
+    keyed = request(x_api_key="secret")
+    assert [limiter.check(keyed) for _ in range(3)] == [None, None, None]
+    assert limiter.check(keyed) is not None
+    # An unknown key falls back to the address
+    assert limiter.client_id(request(x_api_key="guess")) == "addr:10.0.0.1"
+
+
+def test_per_address_off_only_limits_keys():
+    limiter = ClientLimiter(rate=1, burst=1, key_rate=10, key_burst=10, per_address=False)
+    assert all(limiter.check(request()) is None for _ in range(5))
+
+
+def test_pool_rejects_when_queue_full():
+    pool = Pool("expensive", limit=1, max_queue=0)
+
+    async def scenario():
+        async with pool.slot(timeout=1.0):
+            with pytest.raises(Rejected) as rejected:
+                async with pool.slot(timeout=1.0):
+                    pass
+            return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert pool.rejected == 1
+    assert pool.active == 0
+
+
+def test_pool_sheds_waiter_at_deadline():
+    pool = Pool("expensive", limit=1, max_queue=4)
+
+    async def scenario():
+        async with pool.slot(timeout=1.0):
+            with pytest.raises(Rejected):
+                async with pool.slot(timeout=0.05):
+                    pass
+
+    asyncio.run(scenario())
+    assert pool.shed == 1
+    assert pool.queued == 0
+
+
+def test_token_bucket_rate_zero_is_unlimited():
+    bucket = TokenBucket(rate=0, burst=0)
+    assert all(bucket.try_acquire() for _ in range(100))
+    assert bucket.retry_after() == 0.0
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from core.cache_backends import MemoryBackend
+from core.sessions import SessionStore
+from routes import chat
+
+
+@pytest.fixture
+def sessions(monkeypatch) -> SessionStore:
+    store = SessionStore(backend=MemoryBackend())
+    monkeypatch.setattr(chat, "sessions", store)
+    return store
+
+
+def turn(request: chat.ChatRequest, reply: str = "Stay vigilant.") -> dict:
+    async def run():
+        resolved = await chat.resolve_chat(request)
+        await chat.remember_chat(resolved, request.message, reply)
+        return resolved
+    return asyncio.run(run())
+
+
+def test_stateless_client_stores_nothing(sessions):
+    resolved = turn(chat.ChatRequest(message="Hi", chatHistory=[{"sender": "user", "text": "Earlier"}]))
+    assert resolved["session_id"] is None
+    assert resolved["history"] == [{"role": "user", "content": "Earlier"}]
+    assert sessions.created == sessions.updates == 0
+    assert len(sessions.backend) == 0
+
+
+def test_new_session_on_request(sessions):
+    resolved = turn(chat.ChatRequest(message="Hi", newSession=True))
+    session_id = resolved["session_id"]
+    assert session_id
+    follow_up = asyncio.run(chat.resolve_chat(chat.ChatRequest(message="And tomorrow?", sessionId=session_id)))
+    assert follow_up["session_id"] == session_id
+    assert [message["content"] for message in follow_up["history"]] == ["Hi", "Stay vigilant."]
+
+
+def test_unknown_session_id_starts_a_new_one(sessions):
+    resolved = turn(chat.ChatRequest(message="Hi", sessionId="expired-session-id-000"))
+    assert resolved["session_id"] not in (None, "expired-session-id-000")
+    assert sessions.expired == 1
+    assert sessions.updates == 1
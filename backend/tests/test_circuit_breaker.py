@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def tripped(**kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", min_calls=4, error_rate=0.5, open_seconds=15, **kwargs)
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.record(False, 0.01)
+    return breaker
+
+
+def cool_down(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.open_seconds
+
+
+def test_stays_closed_below_min_calls():
+    breaker = CircuitBreaker("test", min_calls=4, error_rate=0.5)
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(False, 0.01)
+    assert breaker.state == CLOSED
+
+
+def test_opens_at_error_rate_and_fails_fast():
+    breaker = tripped()
+    assert breaker.state == OPEN
+    assert breaker.trips == 1
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_opens_on_slow_calls():
+    breaker = CircuitBreaker("test", min_calls=4, slow_call_seconds=1.0, slow_rate=0.75)
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(True, 2.0)
+    assert breaker.state == OPEN
+
+
+def test_healthy_probe_closes():
+    breaker = tripped()
+    cool_down(breaker)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = tripped()
+    cool_down(breaker)
+    assert breaker.allow()
+    breaker.record(False, 0.01)
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+
+
+def test_released_probe_lets_another_through():
+    breaker = tripped()
+    cool_down(breaker)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_call_raises_while_open():
+    breaker = tripped()
+
+    async def upstream():
+        return "ok"
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.call(upstream))
+    cool_down(breaker)
+    assert asyncio.run(breaker.call(upstream)) == "ok"
+    assert breaker.state == CLOSED
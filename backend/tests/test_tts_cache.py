@@ -0,0 +1,99 @@
+import asyncio
+import os
+import time
+
+from core.tts_cache import TTSCache
+
+
+async def synthesize(text: str, voice: str, speed: float = 1.0, model: str = "tts-1") -> bytes:
+    return b"x" * 100
+
+
+def make_cache(tmp_path, **kwargs) -> TTSCache:
+    return TTSCache(directory=str(tmp_path / "tts"), index_path=str(tmp_path / "index.json"),
+                    synthesize=synthesize, **kwargs)
+
+
+def render(cache: TTSCache, *texts: str):
+    async def run():
+        for text in texts:
+            await cache.get_or_create(text, "onyx")
+    asyncio.run(run())
+
+
+def age(cache: TTSCache, text: str, seconds: float):
+    """Pretend `text` was last handed out `seconds` ago, in the index and on disk."""
+    key = cache.key(text, "onyx")
+    then = time.time() - seconds
+    cache._entries[key]["last_access"] = then
+    os.utime(cache.path_for(key), (then, then))
+
+
+def exists(cache: TTSCache, text: str) -> bool:
+    return os.path.exists(cache.path_for(cache.key(text, "onyx")))
+
+
+def test_repeated_line_is_rendered_once(tmp_path):
+    cache = make_cache(tmp_path)
+    render(cache, "Hello", " Hello ")
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+
+def test_sweep_evicts_least_recently_used_over_budget(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=250, pin_seconds=60)
+    render(cache, "one", "two", "three")
+    age(cache, "one", 300)
+    age(cache, "two", 200)
+    age(cache, "three", 100)
+    asyncio.run(cache.sweep(pause=0))
+    assert not exists(cache, "one")
+    assert exists(cache, "two") and exists(cache, "three")
+    assert cache.total_bytes == 200
+    assert cache.evictions == 1
+
+
+def test_recently_handed_out_lines_are_pinned(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=150, pin_seconds=900)
+    render(cache, "one", "two", "three")
+    age(cache, "one", 3600)
+    age(cache, "two", 3600)
+    # Handing "one" out again pins it
+    assert cache.lookup("one", "onyx") is not None
+    asyncio.run(cache.sweep(pause=0))
+    assert exists(cache, "one") and exists(cache, "three")
+    assert not exists(cache, "two")
+    # Over budget, but everything left is pinned
+    assert cache.total_bytes == 200
+
+
+def test_lines_expire_after_max_age(tmp_path):
+    cache = make_cache(tmp_path, max_age=3600, pin_seconds=60)
+    render(cache, "old", "new")
+    age(cache, "old", 7200)
+    asyncio.run(cache.sweep(pause=0))
+    assert not exists(cache, "old") and exists(cache, "new")
+    assert cache.expirations == 1
+
+
+def test_sweep_sees_access_from_other_workers(tmp_path):
+    leader = make_cache(tmp_path, max_bytes=150, pin_seconds=900)
+    render(leader, "one", "two")
+    age(leader, "one", 3600)
+    age(leader, "two", 3600)
+    # Another worker sharing the directory hands "one" out
+    worker = make_cache(tmp_path, max_bytes=150, pin_seconds=900)
+    assert worker.lookup("one", "onyx") is not None
+    asyncio.run(leader.sweep(pause=0))
+    assert exists(leader, "one") and not exists(leader, "two")
+    # ... and no longer hands out the line the leader deleted
+    assert worker.lookup("two", "onyx") is None
+
+
+def test_index_survives_restart(tmp_path):
+    cache = make_cache(tmp_path)
+    render(cache, "one")
+    assert cache.save_index()
+    restarted = make_cache(tmp_path)
+    assert restarted.lookup("one", "onyx") is not None
+    assert restarted.total_bytes == 100